@@ -0,0 +1,125 @@
+"""
+Time what nose2 itself does for each test it runs.
+
+Runs ``--tests`` passing tests, that do nothing, through a result with
+nose2's default plugins registered, as ``nose2`` would, and prints the
+time each test took on average. Most of it is spent dispatching the
+``startTest``, ``setTestOutcome``, ``testOutcome`` and ``stopTest``
+hooks::
+
+  python benchmarks/hook_dispatch.py --tests 20000 --repeat 5
+
+The same tests are also run through a baseline: hooks dispatched the
+way nose2 used to, looking up each plugin's method on every call, and
+events made for every hook whether any plugin listens or not. Both
+times are printed, the baseline first.
+
+"""
+import argparse
+import os
+import sys
+import time
+import timeit
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import six  # noqa: E402
+
+from nose2 import events, result, session, util  # noqa: E402
+from nose2.main import PluggableTestProgram  # noqa: E402
+
+
+class Test(unittest.TestCase):
+
+    def test(self):
+        pass
+
+
+class BaselineHook(events.Hook):
+
+    # a plain list, as before hooks kept their plugins' methods
+    plugins = None
+
+    def __call__(self, event):
+        for plugin in self.plugins[:]:
+            result = getattr(plugin, self.method)(event)
+            if event.handled:
+                return result
+
+    def append(self, plugin):
+        if plugin not in self.plugins:
+            self.plugins.append(plugin)
+
+    def isActive(self):
+        return True
+
+
+class BaselinePluginInterface(events.PluginInterface):
+    hookClass = BaselineHook
+
+    def _hook(self, method):
+        return self.hooks.setdefault(method, self.hookClass(method))
+
+
+class BaselineResult(result.PluggableTestResult):
+
+    def startTest(self, test):
+        with self._lock:
+            self.session.hooks.startTest(
+                events.StartTestEvent(test, self, time.time()))
+
+    def stopTest(self, test):
+        with self._lock:
+            self.session.hooks.stopTest(
+                events.StopTestEvent(test, self, time.time()))
+
+    def _outcome(self, test, outcome, exc_info=None, **kw):
+        with self._lock:
+            event = events.TestOutcomeEvent(
+                test, self, outcome, exc_info, **kw)
+            self.session.hooks.setTestOutcome(event)
+            self.session.hooks.testOutcome(event)
+
+
+def make_result(baseline=False):
+    ssn = session.Session()
+    if baseline:
+        ssn.hooks = BaselinePluginInterface()
+    ssn.loadPlugins(PluggableTestProgram.defaultPlugins)
+    for plugin in ssn.plugins:
+        if hasattr(plugin, 'stream'):
+            plugin.stream = util._WritelnDecorator(six.StringIO())
+    resultClass = BaselineResult if baseline else result.PluggableTestResult
+    res = resultClass(ssn)
+    ssn.hooks.startTestRun(events.StartTestRunEvent(
+        None, unittest.TestSuite(), res, 0, None))
+    return res
+
+
+def run_tests(res, tests):
+    for test in tests:
+        res.startTest(test)
+        res.addSuccess(test)
+        res.stopTest(test)
+
+
+def benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--tests', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    tests = [Test('test')] * args.tests
+    perTest = []
+    for baseline in (True, False):
+        res = make_result(baseline)
+        times = timeit.repeat(lambda: run_tests(res, tests),
+                              number=1, repeat=args.repeat)
+        perTest.append(min(times) / args.tests * 1e6)
+    print("baseline %.2f us, now %.2f us per test "
+          "(best of %s runs of %s tests)"
+          % (perTest[0], perTest[1], args.repeat, args.tests))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -212,7 +212,9 @@ class Hook(object):
 
     .. attribute :: plugins
 
-       The list of plugin instances bound to this hook.
+       The list of plugin instances bound to this hook. The plugins'
+       methods are looked up on the first call after the list changes,
+       not each time the hook is called.
 
     """
 
@@ -221,14 +223,70 @@ class Hook(object):
         self.plugins = []
 
     def __call__(self, event):
-        for plugin in self.plugins[:]:
-            result = getattr(plugin, self.method)(event)
+        methods = self._methods
+        if methods is None:
+            methods = self._lookup()
+        for method in methods:
+            result = method(event)
             if event.handled:
                 return result
 
+    @property
+    def plugins(self):
+        return self._plugins
+
+    @plugins.setter
+    def plugins(self, plugins):
+        self._plugins = _PluginList(plugins, self._changed)
+        self._methods = None
+
     def append(self, plugin):
-        if plugin not in self.plugins:
-            self.plugins.append(plugin)
+        if plugin not in self._plugins:
+            self._plugins.append(plugin)
+
+    def isActive(self):
+        """Would calling this hook do anything?
+
+        Callers can skip making an event for a hook that is not active.
+
+        """
+        return bool(self._plugins)
+
+    def _lookup(self):
+        self._methods = tuple(getattr(plugin, self.method)
+                              for plugin in self._plugins)
+        return self._methods
+
+    def _changed(self):
+        self._methods = None
+
+
+class _PluginList(list):
+
+    """A hook's list of plugins, that tells the hook when it changes"""
+
+    def __init__(self, plugins, changed):
+        super(_PluginList, self).__init__(plugins)
+        self._changed = changed
+
+
+def _changes(name):
+    method = getattr(list, name)
+
+    def change(self, *args, **kw):
+        try:
+            return method(self, *args, **kw)
+        finally:
+            self._changed()
+    change.__name__ = name
+    return change
+
+for _name in ('append', 'extend', 'insert', 'remove', 'pop', 'sort',
+              'reverse', 'clear', '__setitem__', '__delitem__', '__iadd__',
+              '__imul__', '__setslice__', '__delslice__'):
+    if hasattr(list, _name):
+        setattr(_PluginList, _name, _changes(_name))
+del _name
 
 
 class PluginInterface(object):
@@ -299,10 +357,18 @@ class PluginInterface(object):
         :param plugin: A plugin instance
 
         """
-        self.hooks.setdefault(method, self.hookClass(method)).append(plugin)
+        self._hook(method).append(plugin)
 
     def __getattr__(self, attr):
-        return self.hooks.setdefault(attr, self.hookClass(attr))
+        return self._hook(attr)
+
+    def _hook(self, method):
+        # only make a hook the first time it is asked for
+        try:
+            return self.hooks[method]
+        except KeyError:
+            hook = self.hooks[method] = self.hookClass(method)
+            return hook
 
 
 class Event(object):
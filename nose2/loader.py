@@ -10,6 +10,7 @@ import six
 import unittest
 
 from nose2 import events
+from nose2.suite import LazySuite
 
 
 log = logging.getLogger(__name__)
@@ -70,6 +71,9 @@ class PluggableTestLoader(object):
                 suites = self.loadTestsFromModule(module)
         if event.extraTests:
             suites.extend(event.extraTests)
+        if isinstance(suites, LazySuite):
+            # wrapping would load every test before the first one runs
+            return suites
         return self.suiteClass(suites)
 
     def loadTestsFromName(self, name, module=None):
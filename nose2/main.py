@@ -76,6 +76,7 @@ class PluggableTestProgram(unittest.TestProgram):
                       'nose2.plugins.loader.functions',
                       'nose2.plugins.loader.testclasses',
                       'nose2.plugins.loader.generators',
+                      'nose2.plugins.loader.coroutines',
                       'nose2.plugins.loader.parameters',
                       'nose2.plugins.loader.loadtests',
                       'nose2.plugins.dundertest',
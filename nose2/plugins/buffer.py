@@ -10,11 +10,13 @@ This plugin implements :func:`startTest`, :func:`stopTest`,
 and :func:`afterInteraction` to manage capturing sys.stdout and/or
 sys.stderr into buffers, attaching the buffered output to test error
 report detail, and getting out of the way when other plugins want to
-talk to the user.
+talk to the user. When tests run in :doc:`threads <threads>`, each
+thread's output is buffered separately.
 
 """
 
 import sys
+import threading
 import traceback
 
 from six import StringIO
@@ -54,6 +56,33 @@ class _Buffer(object):
         return repr(self._buffer.getvalue())
 
 
+class _ThreadStream(object):
+
+    # stands in for sys.stdout or sys.stderr while tests run in
+    # threads, sending each thread's output to its own buffer
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._local = threading.local()
+
+    def setBuffer(self, buf):
+        self._local.buffer = buf
+
+    def _target(self):
+        buf = getattr(self._local, 'buffer', None)
+        if buf is None:
+            return self.stream
+        return buf
+
+    def write(self, data):
+        self._target().write(data)
+
+    def __getattr__(self, attr):
+        if attr in ('stream', '_local'):
+            raise AttributeError(attr)
+        return getattr(self._target(), attr)
+
+
 class OutputBufferPlugin(events.Plugin):
 
     """Buffer output during test execution"""
@@ -63,10 +92,28 @@ class OutputBufferPlugin(events.Plugin):
     def __init__(self):
         self.captureStdout = self.config.as_bool('stdout', default=True)
         self.captureStderr = self.config.as_bool('stderr', default=False)
+        self._local = threading.local()
         self.bufStdout = self.bufStderr = None
         self.realStdout = sys.__stdout__
         self.realStderr = sys.__stderr__
         self._disable = False
+        self._threadStreams = {}
+
+    @property
+    def bufStdout(self):
+        return getattr(self._local, 'bufStdout', None)
+
+    @bufStdout.setter
+    def bufStdout(self, buf):
+        self._local.bufStdout = buf
+
+    @property
+    def bufStderr(self):
+        return getattr(self._local, 'bufStderr', None)
+
+    @bufStderr.setter
+    def bufStderr(self, buf):
+        self._local.bufStderr = buf
 
     def registerInSubprocess(self, event):
         event.pluginClasses.append(self.__class__)
@@ -148,22 +195,57 @@ class OutputBufferPlugin(events.Plugin):
     def stopSubprocess(self, event):
         self._restore()
 
+    def startThreadPool(self, event):
+        """Buffer the output of each test thread separately"""
+        if self._disable:
+            return
+        for name in self._streamNames():
+            self._threadStreams[name] = _ThreadStream(getattr(sys, name))
+            setattr(sys, name, self._threadStreams[name])
+
+    def stopThreadPool(self, event):
+        """Stop buffering the output of test threads"""
+        for name, stream in self._threadStreams.items():
+            setattr(sys, name, stream.stream)
+        self._threadStreams = {}
+
+    def _streamNames(self):
+        names = []
+        if self.captureStdout:
+            names.append('stdout')
+        if self.captureStderr:
+            names.append('stderr')
+        return names
+
     def _restore(self):
         if self._disable:
             return
         if self.captureStdout:
-            sys.stdout = self.realStdout
+            self._redirect('stdout', self.realStdout, None)
         if self.captureStderr:
-            sys.stderr = self.realStderr
+            self._redirect('stderr', self.realStderr, None)
 
     def _buffer(self, fresh=True):
         if self._disable:
             return
         if self.captureStdout:
             if fresh or self.bufStdout is None:
-                self.bufStdout = _Buffer(sys.stdout)
-            sys.stdout = self.bufStdout
+                self.bufStdout = _Buffer(self._stream('stdout'))
+            self._redirect('stdout', self.bufStdout, self.bufStdout)
         if self.captureStderr:
             if fresh or self.bufStderr is None:
-                self.bufStderr = _Buffer(sys.stderr)
-            sys.stderr = self.bufStderr
+                self.bufStderr = _Buffer(self._stream('stderr'))
+            self._redirect('stderr', self.bufStderr, self.bufStderr)
+
+    def _stream(self, name):
+        # the stream that is being buffered
+        if name in self._threadStreams:
+            return self._threadStreams[name].stream
+        return getattr(sys, name)
+
+    def _redirect(self, name, stream, threadBuffer):
+        # in a test thread, only that thread's output is redirected
+        if name in self._threadStreams:
+            self._threadStreams[name].setBuffer(threadBuffer)
+        else:
+            setattr(sys, name, stream)
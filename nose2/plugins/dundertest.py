@@ -4,6 +4,7 @@ that define a ``__test__`` attribute that evaluates to ``False``.
 """
 from unittest import TestSuite
 from nose2 import events
+from nose2.suite import LazySuite
 
 __unittest = True
 
@@ -22,8 +23,19 @@ class DunderTestFilter(events.Plugin):
         self.removeNonTests(event.suite)
 
     def removeNonTests(self, suite):
+        if isinstance(suite, LazySuite):
+            # filter tests as they are loaded, rather than loading them all
+            suite.filter(self._isTest)
+            return
         for test in list(suite):
             if not getattr(test, '__test__', True):
                 suite._tests.remove(test)
             elif isinstance(test, TestSuite):
                 self.removeNonTests(test)
+
+    def _isTest(self, test):
+        if not getattr(test, '__test__', True):
+            return False
+        if isinstance(test, TestSuite):
+            self.removeNonTests(test)
+        return True
@@ -0,0 +1,202 @@
+"""
+Find out which test modules are slow to import.
+
+When a test run takes a long time to start, the time usually goes into
+importing test modules, and the modules they import. This plugin times
+each test module discovery imports, and splits that time three ways:
+
+* the module's *own* import: running the code in it, and importing
+  the packages it is in,
+* its *nested* imports: the modules it imports, with everything those
+  import in turn. A module is only imported once, so its time is put
+  down to the first test module that imports it,
+* *loading*: the time loader plugins take to find the tests in the
+  module once it is imported.
+
+To use it, activate the plugin::
+
+  nose2 --plugin=nose2.plugins.importprofile --import-profile
+
+The slowest test modules, and their slowest nested imports, are
+reported before the test run summary. To compare one commit with the
+next, the times can also be written to a JSON file:
+
+.. code-block :: ini
+
+  [import-profile]
+  top = 10
+  report-file = import-profile.json
+
+Only modules imported by discovery are timed, not those named on the
+command line, and nested imports are only seen when they go through
+:func:`__import__` -- the ``import`` statement does, but
+:func:`importlib.import_module` does not.
+
+"""
+import logging
+import sys
+import time
+
+from six.moves import builtins
+
+from nose2 import events, util
+
+
+log = logging.getLogger(__name__)
+__unittest = True
+
+
+class ImportProfile(events.Plugin):
+
+    """Time the import of each test module"""
+
+    configSection = 'import-profile'
+    commandLineSwitch = (None, 'import-profile',
+                         'Report the test modules slowest to import')
+
+    def __init__(self):
+        self.top = self.config.as_int('top', 10)
+        self.reportFile = self.config.as_str('report-file', '')
+        self.modules = {}
+        self._stack = []
+        self._originals = {}
+        self._import = None
+
+    def createTests(self, event):
+        """Start timing test module imports"""
+        self._patch(util, 'module_from_name', self._timeImport)
+        self._patch(event.loader, 'loadTestsFromModule', self._timeLoading)
+
+    def stopTestRun(self, event):
+        """Stop timing, and write the report file"""
+        # with lazy discovery, modules are imported until the run ends
+        for name, (obj, original, own) in self._originals.items():
+            if own:
+                setattr(obj, name, original)
+            else:
+                delattr(obj, name)
+        self._originals = {}
+        if self.reportFile:
+            self.writeReport(self.reportFile)
+
+    def beforeSummaryReport(self, event):
+        """Report the slowest test module imports"""
+        if not self.modules:
+            # no test modules imported by discovery
+            return
+        records = self.slowest()
+        stream = event.stream
+        stream.writeln(util.ln("Slowest test module imports"))
+        stream.writeln("%8s %8s %8s %8s  %s" % (
+            'total', 'own', 'nested', 'loading', 'module'))
+        for record in records[:self.top]:
+            stream.writeln("%7.3fs %7.3fs %7.3fs %7.3fs  %s" % (
+                record['total'], record['own'], record['nested'],
+                record['loading'], record['module']))
+            nested = sorted(record['imports'].items(),
+                            key=lambda item: (-item[1], item[0]))
+            for name, seconds in nested[:3]:
+                stream.writeln("%26.3fs %10s%s" % (seconds, '', name))
+        stream.writeln("%s test modules imported in %.3fs" % (
+            len(records), sum(record['total'] for record in records)))
+        stream.writeln('')
+
+    def slowest(self):
+        """The records of the test modules imported, slowest first"""
+        return sorted(self.modules.values(),
+                      key=lambda record: (-record['total'], record['module']))
+
+    def writeReport(self, path):
+        """Write the times taken to ``path`` as JSON"""
+        try:
+            util.save_json(path, {'version': 1, 'modules': self.modules},
+                           indent=2, sort_keys=True)
+        except EnvironmentError:
+            log.warning("Unable to write import profile %s", path)
+
+    def _patch(self, obj, name, replacement):
+        self._originals[name] = (obj, getattr(obj, name), name in vars(obj))
+        setattr(obj, name, replacement)
+
+    def _timeImport(self, name):
+        # time util.module_from_name(name), and the imports it makes
+        moduleFromName = self._originals['module_from_name'][1]
+        if name in sys.modules or self._stack:
+            return moduleFromName(name)
+        self._import = builtins.__import__
+        builtins.__import__ = self._timeNestedImport
+        frame = _Frame(name)
+        self._stack.append(frame)
+        started = time.time()
+        try:
+            return moduleFromName(name)
+        finally:
+            total = time.time() - started
+            self._stack.pop()
+            builtins.__import__ = self._import
+            self.modules[name] = {
+                'module': name, 'total': total,
+                'own': total - frame.nested, 'nested': frame.nested,
+                'loading': 0.0, 'imports': frame.imports}
+
+    def _timeNestedImport(self, name, globals=None, locals=None, fromlist=(),
+                          level=0):
+        frame = self._stack[-1]
+        if len(self._stack) == 1 and name == frame.name and not level:
+            # module_from_name importing the test module itself
+            return self._import(name, globals, locals, fromlist, level)
+        known = len(sys.modules)
+        child = _Frame(_absolute(name, globals, level))
+        # from package import submodule: the submodule is what's imported
+        submodules = ['%s.%s' % (child.name, item) for item in fromlist or ()
+                      if item != '*']
+        submodules = [sub for sub in submodules if sub not in sys.modules]
+        self._stack.append(child)
+        started = time.time()
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.time() - started
+            self._stack.pop()
+            if len(sys.modules) > known:
+                # something was imported, not just found in sys.modules
+                frame.nested += elapsed
+                if len(self._stack) == 1:
+                    key = ', '.join(sub for sub in submodules
+                                    if sub in sys.modules) or child.name
+                    frame.imports[key] = frame.imports.get(key, 0.0) + elapsed
+
+    def _timeLoading(self, module, *args, **kwargs):
+        # time the loader plugins finding the tests in module
+        loadTestsFromModule = self._originals['loadTestsFromModule'][1]
+        started = time.time()
+        try:
+            return loadTestsFromModule(module, *args, **kwargs)
+        finally:
+            record = self.modules.get(getattr(module, '__name__', None))
+            if record is not None:
+                record['loading'] += time.time() - started
+
+
+class _Frame(object):
+    # an import in progress, and the time its nested imports took
+
+    def __init__(self, name):
+        self.name = name
+        self.nested = 0.0
+        self.imports = {}
+
+
+def _absolute(name, globals, level):
+    # the absolute name of a module imported relative to another
+    if not level or not globals:
+        return name
+    package = globals.get('__package__')
+    if not package:
+        # a package is named by __name__, a plain module's by the rest
+        package = globals.get('__name__', '')
+        if '__path__' not in globals:
+            package = package.rpartition('.')[0]
+    if level > 1:
+        package = package.rsplit('.', level - 1)[0]
+    return '%s.%s' % (package, name) if name else package
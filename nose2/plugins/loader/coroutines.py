@@ -0,0 +1,358 @@
+"""
+Load tests from coroutine functions and methods.
+
+This plugin implements :func:`loadTestsFromModule`,
+:func:`loadTestsFromTestCase`, :func:`loadTestsFromTestClass` and
+:func:`loadTestsFromName` to collect test functions and methods
+defined with ``async def``, in modules, :class:`unittest.TestCase`
+subclasses and test classes::
+
+  async def test_fetch():
+      reply = await fetch('http://localhost:8080/')
+      assert reply.status == 200
+
+Coroutine tests are run on an :mod:`asyncio` event loop that is shared
+by all of the coroutine tests of a module or class. The loop is set as
+the current event loop while those tests run, and closed when tests from
+another module or class start. Tests in subclasses of
+:class:`unittest.IsolatedAsyncioTestCase` run their own coroutines, and are
+left alone.
+
+Running coroutine tests at the same time
+----------------------------------------
+
+By default, coroutine tests run one at a time. To let the coroutine tests
+of a module or class overlap their awaits, set ``concurrency`` to the
+number of tests that may be running at once:
+
+.. code-block :: ini
+
+  [coroutines]
+  concurrency = 10
+
+Tests are still reported one at a time, in the order they were loaded,
+through the usual hooks. Coroutine test functions with ``setup`` or
+``teardown`` attributes, and coroutine methods of classes that define
+``setUp`` or ``tearDown``, always run by themselves, between their
+fixtures.
+
+"""
+import collections
+import logging
+import sys
+import threading
+import types
+import unittest
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+from nose2 import util
+from nose2.events import Plugin
+from nose2.plugins.loader.testclasses import MethodTestCase
+
+
+log = logging.getLogger(__name__)
+__unittest = True
+
+
+class Coroutines(Plugin):
+
+    """Loader plugin that loads coroutine tests"""
+    alwaysOn = True
+    configSection = 'coroutines'
+
+    def __init__(self):
+        self.concurrency = max(self.config.as_int('concurrency', 1), 1)
+        self.loops = EventLoops()
+
+    def registerInSubprocess(self, event):
+        event.pluginClasses.append(self.__class__)
+
+    def stopTestRun(self, event):
+        """Close the event loops tests ran on"""
+        self.loops.close()
+
+    def loadTestsFromModule(self, event):
+        """Load coroutine test functions from event.module"""
+        module = event.module
+        tests = []
+        for name in dir(module):
+            obj = getattr(module, name)
+            if isinstance(obj, types.FunctionType) and self._isTest(obj):
+                tests.append(self._functionTest(obj))
+        if tests:
+            event.extraTests.append(CoroutineSuite(tests))
+
+    def loadTestsFromTestCase(self, event):
+        """Load coroutine test methods from test case"""
+        testCaseClass = event.testCase
+        if util.runs_coroutines(testCaseClass):
+            return
+        tests = [self._testCaseTest(testCaseClass, name)
+                 for name in self._methodNames(testCaseClass)]
+        if tests:
+            event.extraTests.append(CoroutineSuite(tests))
+
+    def loadTestsFromTestClass(self, event):
+        """Load coroutine test methods from test class"""
+        cls = event.testCase
+        tests = [self._testClassTest(cls, name)
+                 for name in self._methodNames(cls)]
+        if tests:
+            event.extraTests.append(CoroutineSuite(tests))
+
+    def getTestCaseNames(self, event):
+        """Exclude coroutine methods from test case names"""
+        if util.runs_coroutines(event.testCase):
+            return
+        for name in filter(event.isTestMethod, dir(event.testCase)):
+            if util.iscoroutinefunction(getattr(event.testCase, name)):
+                event.excludedNames.append(name)
+
+    def getTestMethodNames(self, event):
+        return self.getTestCaseNames(event)
+
+    def loadTestsFromName(self, event):
+        """Load tests from coroutine named on command line"""
+        name = event.name
+        module = event.module
+        try:
+            result = util.test_from_name(name, module)
+        except (AttributeError, ImportError):
+            event.handled = True
+            return event.loader.failedLoadTests(name, sys.exc_info())
+        if result is None:
+            return
+
+        parent, obj, name, index = result
+        if not util.iscoroutinefunction(obj) or index is not None:
+            return
+        if isinstance(parent, type) and issubclass(parent, unittest.TestCase):
+            if util.runs_coroutines(parent):
+                return
+            test = self._testCaseTest(parent, obj.__name__)
+        elif isinstance(parent, type):
+            test = self._testClassTest(parent, obj.__name__)
+        elif isinstance(obj, types.FunctionType):
+            test = self._functionTest(obj)
+        else:
+            return
+        event.handled = True
+        return event.loader.suiteClass([test])
+
+    def _isTest(self, obj):
+        return (obj.__name__.startswith(self.session.testMethodPrefix) and
+                util.iscoroutinefunction(obj) and
+                not hasattr(obj, 'paramList') and
+                util.num_expected_args(obj) == 0)
+
+    def _methodNames(self, cls):
+        names = [name for name in dir(cls)
+                 if name.startswith(self.session.testMethodPrefix) and
+                 util.iscoroutinefunction(getattr(cls, name)) and
+                 not hasattr(getattr(cls, name), 'paramList')]
+        return sorted(names)
+
+    def _functionTest(self, obj):
+        args = {}
+        for attr, names in (('setUp', ('setUp', 'setup', 'setUpFunc')),
+                            ('tearDown',
+                             ('tearDown', 'teardown', 'tearDownFunc'))):
+            for name in names:
+                if hasattr(obj, name):
+                    args[attr] = getattr(obj, name)
+                    break
+        test = CoroutineTest(self.loops, obj.__module__, obj,
+                             self._concurrency(not args))
+        return util.transplant_class(
+            unittest.FunctionTestCase, obj.__module__)(test, **args)
+
+    def _testCaseTest(self, cls, name):
+        instance = cls(name)
+        fixtures = (cls.setUp is not unittest.TestCase.setUp or
+                    cls.tearDown is not unittest.TestCase.tearDown)
+        setattr(instance, name, CoroutineTest(
+            self.loops, cls, getattr(instance, name),
+            self._concurrency(not fixtures)))
+        return instance
+
+    def _testClassTest(self, cls, name):
+        instance = util.transplant_class(
+            MethodTestCase(cls), cls.__module__)(name)
+        fixtures = hasattr(cls, 'setUp') or hasattr(cls, 'tearDown')
+        setattr(instance.obj, name, CoroutineTest(
+            self.loops, cls, getattr(instance.obj, name),
+            self._concurrency(not fixtures)))
+        return instance
+
+    def _concurrency(self, independent):
+        if independent:
+            return self.concurrency
+        return 1
+
+
+class CoroutineTest(object):
+
+    """A coroutine test function, made callable like any other.
+
+    Calling it runs the coroutine to completion on the event loop shared
+    by tests with the same ``key``. When the test is part of a batch of
+    tests that may run at the same time, the other tests of the batch are
+    started too, and keep running whenever the loop does.
+
+    """
+
+    def __init__(self, loops, key, func, concurrency=1):
+        self.loops = loops
+        self.key = key
+        self.func = func
+        self.concurrency = concurrency
+        self.batch = None
+        self.task = None
+        for attr in ('__module__', '__name__', '__doc__'):
+            setattr(self, attr, getattr(func, attr, None))
+
+    def __call__(self):
+        loop = self.loops.get(self.key)
+        if self.task is None and self.batch is not None:
+            self.batch.start(loop, self)
+        if self.task is None:
+            self.task = loop.create_task(self.func())
+        try:
+            loop.run_until_complete(self.task)
+        finally:
+            self.task = None
+
+    def __repr__(self):
+        return '<CoroutineTest %s>' % self.__name__
+
+
+class Batch(object):
+
+    """Coroutine tests that may run at the same time"""
+
+    def __init__(self, tests):
+        self.tests = tests
+        self.waiting = collections.deque(tests)
+
+    def start(self, loop, test):
+        """Start ``test``, and as many waiting tests as may run with it"""
+        if test in self.waiting:
+            self.waiting.remove(test)
+            self._start(loop, test)
+        while self.waiting and self._running() < test.concurrency:
+            self._start(loop, self.waiting.popleft())
+
+    def stop(self, loop):
+        """Cancel tests that were started but not run"""
+        self.waiting.clear()
+        tasks = [t.task for t in self.tests if t.task is not None]
+        for test in self.tests:
+            test.task = None
+            test.batch = None
+        for task in tasks:
+            task.cancel()
+        if tasks and not loop.is_closed():
+            loop.run_until_complete(
+                asyncio.gather(*tasks, return_exceptions=True))
+
+    def _running(self):
+        return len([t for t in self.tests
+                    if t.task is not None and not t.task.done()])
+
+    def _start(self, loop, test):
+        test.task = loop.create_task(test.func())
+        test.task.add_done_callback(
+            lambda task: self.start(loop, test) if not task.cancelled()
+            else None)
+
+
+class CoroutineSuite(unittest.TestSuite):
+
+    """Suite of the coroutine tests of a module or class.
+
+    When the suite runs, its tests that may run at the same time are
+    batched together.
+
+    """
+
+    def run(self, result, debug=False):
+        batches = {}
+        for test in self:
+            coroutine = _coroutineTest(test)
+            if coroutine is not None and coroutine.concurrency > 1:
+                batches.setdefault(coroutine.key, []).append(coroutine)
+        for tests in batches.values():
+            batch = Batch(tests)
+            for test in tests:
+                test.batch = batch
+        try:
+            return super(CoroutineSuite, self).run(result, debug)
+        finally:
+            for key, tests in batches.items():
+                if tests[0].batch is not None:
+                    tests[0].batch.stop(tests[0].loops.get(key))
+
+
+class EventLoops(object):
+
+    """The event loops coroutine tests run on.
+
+    Each thread running tests has one loop at a time, for the module or
+    class of the tests it is running.
+
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._loops = set()
+
+    def get(self, key):
+        """Get the event loop for tests of ``key`` in this thread"""
+        current = getattr(self._local, 'current', None)
+        if current is not None:
+            if current[0] == key and not current[1].is_closed():
+                return current[1]
+            self._close(current[1])
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._local.current = (key, loop)
+        with self._lock:
+            self._loops.add(loop)
+        log.debug("New event loop for %s", key)
+        return loop
+
+    def close(self):
+        """Close all event loops"""
+        with self._lock:
+            loops = list(self._loops)
+        for loop in loops:
+            self._close(loop)
+        self._local.current = None
+
+    def _close(self, loop):
+        with self._lock:
+            self._loops.discard(loop)
+        if loop.is_closed():
+            return
+        shutdown = getattr(loop, 'shutdown_asyncgens', None)  # new in 3.6
+        if shutdown is not None:
+            loop.run_until_complete(shutdown())
+        loop.close()
+        asyncio.set_event_loop(None)
+
+
+def _coroutineTest(test):
+    # the CoroutineTest a loaded test case will call, if any
+    if isinstance(test, unittest.FunctionTestCase):
+        func = test._testFunc
+    elif hasattr(test, 'obj') and hasattr(test, 'method'):
+        func = getattr(test.obj, test.method, None)
+    else:
+        func = getattr(test, getattr(test, '_testMethodName', ''), None)
+    if isinstance(func, CoroutineTest):
+        return func
@@ -11,6 +11,100 @@ It also fires :func:`handleFile` for every file that it sees, and
 load tests from other kinds of files and to influence which modules
 are examined for tests.
 
+Skipping directories
+--------------------
+
+Discovery looks for tests in every package, and in every directory with
+"test" in its name. Directories that match one of the glob patterns in
+``exclude-dirs`` are skipped, along with everything under them, without
+being listed:
+
+.. code-block :: ini
+
+  [discovery]
+  exclude-dirs = .git
+                 .tox
+                 node_modules
+                 build*
+
+The patterns are matched against directory names. By default,
+``.git``, ``.hg``, ``.svn``, ``.tox``, ``.nox``, ``.venv``, ``venv``,
+``.pytest_cache``, ``node_modules`` and ``__pycache__`` are skipped;
+setting ``exclude-dirs`` replaces that list. Earlier versions of nose2
+looked for tests in these directories too, when their names contained
+"test" or they were packages. To do that again, set ``exclude-dirs`` to
+nothing:
+
+.. code-block :: ini
+
+  [discovery]
+  exclude-dirs =
+
+How many directories were listed and skipped, and how long listing them
+took, is logged at debug level.
+
+Caching directory listings
+--------------------------
+
+On large trees, or slow file systems, listing every directory and
+checking what each entry is can take a noticeable part of the test run.
+To keep the listings from one run to the next, turn on the discovery
+cache:
+
+.. code-block :: ini
+
+  [discovery]
+  cache = True
+  cache-dir = .nose2cache
+
+A directory's listing is reused for as long as the directory's
+modification time is unchanged -- that is, until an entry is added to,
+removed from or renamed in it. Each directory is still checked on every
+run, and the :func:`handleFile`, :func:`matchPath`, :func:`handleDir`
+and :func:`matchDirPath` hooks are still fired for every entry, so
+plugins see the same files they would without the cache. Changes that
+don't touch a directory's modification time, like the target of a
+symbolic link changing, are not noticed; delete the cache directory
+to start afresh.
+
+Running tests as they are loaded
+--------------------------------
+
+By default, every test module is imported before the first test runs.
+For quicker feedback from large test suites, discovery can instead hand
+over the tests of each module to be run as soon as the module is
+loaded:
+
+.. code-block :: ini
+
+  [discovery]
+  lazy = True
+
+or pass ``--lazy-discovery`` on the command line. Plugins that need to
+see every test before any test runs -- :doc:`mp`, :doc:`layers` or
+:doc:`shard`, for instance -- still get them all, and the run then
+starts once discovery is done, as it would have anyway.
+
+Compiling test modules up front
+-------------------------------
+
+On a fresh checkout, much of the time spent importing test modules goes
+into compiling them to bytecode, one after another. Discovery can first
+find the test modules it is likely to import and compile them in
+parallel, so that the imports that follow find their bytecode ready:
+
+.. code-block :: ini
+
+  [discovery]
+  precompile = True
+  precompile-processes = 4
+
+or pass ``--precompile`` on the command line. By default, as many
+processes as there are CPUs are used. The modules are still imported
+one at a time, in the main process, as importing runs the code in them.
+How long compiling took, and how much time doing it in parallel saved,
+is reported after the test run.
+
 """
 
 
@@ -21,14 +115,41 @@ are examined for tests.
 # Rights Reserved. See: http://docs.python.org/license.html
 
 from fnmatch import fnmatch
+import json
 import logging
+import multiprocessing
 import os
+import py_compile
 import sys
+import time
 
 from nose2 import events, util
+from nose2.suite import LazySuite
+
+try:
+    from importlib.util import cache_from_source
+except ImportError:
+    cache_from_source = None
+try:
+    from os import scandir
+except ImportError:
+    scandir = None
+try:
+    from time import process_time
+except ImportError:
+    from time import clock as process_time
 
 __unittest = True
 log = logging.getLogger(__name__)
+# directories changed this recently may change again without their
+# modification time showing it, on file systems with coarse timestamps
+_MTIME_SLACK = 2.0
+# directories never searched for tests, unless exclude-dirs says otherwise
+EXCLUDE_DIRS = ('.git', '.hg', '.svn', '.tox', '.nox', '.venv', 'venv',
+                '.pytest_cache', 'node_modules', '__pycache__')
+# any of these makes a directory a package, as in util.ispackage
+_INIT_FILES = ('__init__.py', '__init__.pyc', '__init__.pyo',
+               '__init__$py.class')
 
 
 class DirectoryHandler(object):
@@ -60,6 +181,22 @@ class DirectoryHandler(object):
 
 class Discoverer(object):
 
+    # a DirectoryCache, if listings are kept between runs
+    _cache = None
+    # whether discovered tests are loaded as they are run
+    lazy = False
+    # processes to compile test modules in before loading them, if any
+    precompileProcs = None
+    # what precompiling did: modules found, compiled, cpu and wall time
+    precompiled = None
+    # glob patterns for names of directories not to look in
+    excludeDirs = ()
+    # what the last discovery walk took, for the debug log
+    _dirsListed = 0
+    _dirsExcluded = 0
+    _entriesListed = 0
+    _listingTime = 0.0
+
     def loadTestsFromName(self, event):
         """Load tests from module named by event.name"""
         # turn name into path or module name
@@ -126,8 +263,16 @@ class Discoverer(object):
             return loader.suiteClass(
                 loader.failedLoadTests(self.session.startDir, sys.exc_info()))
         log.debug("_discover in %s (%s)", start_dir, top_level_dir)
-        tests = list(self._find_tests(event, start_dir, top_level_dir))
-        return loader.suiteClass(tests)
+        if (self.precompileProcs and os.path.isdir(start_dir)
+                and not sys.dont_write_bytecode):
+            self._precompile(start_dir)
+        # count only what this walk lists, not the precompiling one
+        self._resetWalk()
+        tests = self._logWalk(
+            self._find_tests(event, start_dir, top_level_dir))
+        if self.lazy:
+            return LazySuite(tests)
+        return loader.suiteClass(list(tests))
 
     def _find_tests(self, event, start, top_level):
         """Used by discovery. Yields test suites it loads."""
@@ -154,18 +299,15 @@ class Discoverer(object):
             yield test
         if dir_handler.event_handled:
             return
-        for path in os.listdir(full_path):
+        for path, kind in self._list_dir(full_path):
             entry_path = os.path.join(full_path, path)
-            if os.path.isfile(entry_path):
+            if kind == 'file':
                 for test in self._find_tests_in_file(
                     event, path, entry_path, top_level):
                     yield test
-            elif os.path.isdir(entry_path):
-                if ('test' in path.lower()
-                    or util.ispackage(entry_path)
-                    or path in self.session.libDirs):
-                    for test in self._find_tests(event, entry_path, top_level):
-                        yield test
+            elif kind == 'dir' and self._should_walk(path, entry_path):
+                for test in self._find_tests(event, entry_path, top_level):
+                    yield test
 
     def _find_tests_in_file(self, event, filename, full_path, top_level, module_name=None):
         log.debug("find in file %s (%s)", full_path, top_level)
@@ -229,19 +371,147 @@ class Discoverer(object):
                     event, full_path, top_level_dir):
                     yield test
 
+    def _precompile(self, start_dir):
+        started = time.time()
+        modules = list(self._find_modules(start_dir))
+        stale = [path for path in modules if _needs_compiling(path)]
+        procs = min(self.precompileProcs, len(stale))
+        if procs > 1:
+            pool = multiprocessing.Pool(procs)
+            try:
+                times = pool.map(_compile, stale)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            times = [_compile(path) for path in stale]
+        self.precompiled = (len(modules), len(stale), sum(times),
+                            time.time() - started, procs)
+        log.debug("Compiled %s of %s test modules in %.2fs",
+                  len(stale), len(modules), self.precompiled[3])
+
+    def _find_modules(self, full_path):
+        # the modules discovery is likely to import, without asking
+        # plugins: compiling a few too many or too few does no harm
+        pattern = self.session.testFilePattern
+        for name, kind in self._list_dir(full_path):
+            entry_path = os.path.join(full_path, name)
+            if kind == 'file':
+                if name == '__init__.py' or (
+                        util.valid_module_name(name)
+                        and self._match_path(name, entry_path, pattern)):
+                    yield entry_path
+            elif kind == 'dir' and self._should_walk(name, entry_path):
+                for path in self._find_modules(entry_path):
+                    yield path
+
+    def _should_walk(self, name, full_path):
+        # would discovery look for tests in this subdirectory?
+        if any(fnmatch(name, pattern) for pattern in self.excludeDirs):
+            log.debug("skipping excluded directory %s", full_path)
+            self._dirsExcluded += 1
+            return False
+        return ('test' in name.lower()
+                or name in self.session.libDirs
+                or self._is_package(full_path))
+
+    def _resetWalk(self):
+        self._dirsListed = 0
+        self._dirsExcluded = 0
+        self._entriesListed = 0
+        self._listingTime = 0.0
+
+    def _logWalk(self, tests):
+        # log what walking directories took, once the walk is done
+        for test in tests:
+            yield test
+        log.debug("Listed %s entries in %s directories in %.3fs, "
+                  "skipping %s excluded directories",
+                  self._entriesListed, self._dirsListed, self._listingTime,
+                  self._dirsExcluded)
+
     def _match_path(self, path, full_path, pattern):
         # override this method to use alternative matching strategy
         return fnmatch(path, pattern)
 
+    def _list_dir(self, full_path):
+        # the entries in a directory, as (name, kind) pairs
+        started = time.time()
+        if self._cache is not None:
+            entries = self._cache.listing(full_path)
+        else:
+            entries = _scan(full_path)
+        self._listingTime += time.time() - started
+        self._dirsListed += 1
+        self._entriesListed += len(entries)
+        return entries
+
+    def _is_package(self, full_path):
+        # look for the __init__ module by name: listing the directory
+        # would cost a lot more where it is big and is no package
+        if not util.IDENT_RE.match(os.path.basename(full_path)):
+            return False
+        return any(os.path.isfile(os.path.join(full_path, name))
+                   for name in _INIT_FILES)
+
 
 class DiscoveryLoader(events.Plugin, Discoverer):
     """Loader plugin that can discover tests"""
     alwaysOn = True
     configSection = 'discovery'
 
+    def __init__(self):
+        if self.config.as_bool('cache', False):
+            cacheDir = self.config.as_str('cache-dir', '.nose2cache')
+            self._cache = DirectoryCache(
+                os.path.join(os.path.abspath(cacheDir), 'discovery.json'))
+        self.lazy = self.config.as_bool('lazy', False)
+        self.addFlag(self.setLazy, None, 'lazy-discovery',
+                     "Run each module's tests as soon as it is loaded")
+        self.excludeDirs = self.config.as_list('exclude-dirs',
+                                               list(EXCLUDE_DIRS))
+        self._procs = self.config.as_int(
+            'precompile-processes', multiprocessing.cpu_count())
+        if self.config.as_bool('precompile', False):
+            self.setPrecompile(None)
+        self.addFlag(self.setPrecompile, None, 'precompile',
+                     'Compile test modules in parallel before loading them')
+
+    def setLazy(self, arg):
+        self.lazy = True
+
+    def setPrecompile(self, arg):
+        self.precompileProcs = self._procs
+
     def registerInSubprocess(self, event):
         event.pluginClasses.append(self.__class__)
 
+    def startTestRun(self, event):
+        """Save the directory listings discovery used"""
+        if self._cache is not None:
+            self._cache.save()
+
+    def stopTestRun(self, event):
+        """Save the directory listings lazy discovery used"""
+        if self._cache is not None:
+            self._cache.save()
+
+    def beforeSummaryReport(self, event):
+        """Report the time compiling test modules took"""
+        if self.precompiled is None:
+            return
+        found, compiled, cpu, wall, procs = self.precompiled
+        event.stream.writeln(util.ln("Precompiled test modules"))
+        event.stream.writeln(
+            "Compiled %s of %s test modules in %.2fs, in %s"
+            % (compiled, found, wall,
+               '%s processes' % procs if procs > 1 else 'one process'))
+        if procs > 1:
+            event.stream.writeln(
+                "Compiling them one at a time took %.2fs: %.2fs saved"
+                % (cpu, cpu - wall))
+        event.stream.writeln('')
+
     def loadTestsFromName(self, event):
         """Load tests from module named by event.name"""
         return Discoverer.loadTestsFromName(self, event)
@@ -249,3 +519,126 @@ class DiscoveryLoader(events.Plugin, Discoverer):
     def loadTestsFromNames(self, event):
         """Discover tests if no test names specified"""
         return Discoverer.loadTestsFromNames(self, event)
+
+
+class DirectoryCache(object):
+
+    """Directory listings kept from one test run to the next.
+
+    A listing is reused for as long as its directory's modification time
+    is unchanged.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.dirs = None
+        self.started = time.time()
+        self.updated = False
+
+    def listing(self, path):
+        """The entries in directory ``path``, as (name, kind) pairs"""
+        cached = self._lookup(path)
+        if cached.get('entries') is None:
+            cached['entries'] = _scan(path)
+            self._store(path, cached)
+        return cached['entries']
+
+    def _lookup(self, path):
+        # what's known of path, if it hasn't changed since
+        if self.dirs is None:
+            self.load()
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            mtime = None
+        cached = self.dirs.get(path)
+        if cached is not None and mtime is not None and (
+                cached['mtime'] == mtime):
+            return cached
+        return {'mtime': mtime}
+
+    def _store(self, path, cached):
+        mtime = cached['mtime']
+        if mtime is not None and mtime < self.started - _MTIME_SLACK:
+            self.dirs[path] = cached
+            self.updated = True
+        elif path in self.dirs:
+            del self.dirs[path]
+            self.updated = True
+
+    def load(self):
+        """Read the listings saved by an earlier run"""
+        self.dirs = {}
+        try:
+            with open(self.path) as fh:
+                data = json.load(fh)
+        except (EnvironmentError, ValueError):
+            return
+        if isinstance(data, dict) and data.get('version') == 1:
+            self.dirs = dict(data.get('dirs', {}))
+        log.debug("Loaded %s directory listings from %s",
+                  len(self.dirs), self.path)
+
+    def save(self):
+        """Save listings for the next run, if any have changed"""
+        if not self.updated:
+            return
+        try:
+            util.save_json(self.path, {'version': 1, 'dirs': self.dirs})
+        except EnvironmentError:
+            log.warning("Unable to write discovery cache %s", self.path)
+            return
+        self.updated = False
+
+
+def _scan(path):
+    # the entries in directory path, as (name, kind) pairs, using the
+    # kinds scandir reads along with the names where it can
+    if scandir is None:
+        return [(name, _kind(os.path.join(path, name)))
+                for name in os.listdir(path)]
+    entries = []
+    for entry in scandir(path):
+        try:
+            if entry.is_file():
+                kind = 'file'
+            elif entry.is_dir():
+                kind = 'dir'
+            else:
+                kind = None
+        except OSError:
+            kind = None
+        entries.append((entry.name, kind))
+    return entries
+
+
+def _kind(path):
+    if os.path.isfile(path):
+        return 'file'
+    if os.path.isdir(path):
+        return 'dir'
+    return None
+
+
+def _needs_compiling(path):
+    # is the bytecode for path missing or older than it?
+    if cache_from_source is None:
+        cached = path + 'c'
+    else:
+        cached = cache_from_source(path)
+    try:
+        return os.stat(cached).st_mtime < os.stat(path).st_mtime
+    except OSError:
+        return True
+
+
+def _compile(path):
+    # compile path to where import looks for its bytecode; returns the
+    # cpu time that took. Errors are left for the import to report.
+    started = process_time()
+    try:
+        py_compile.compile(path, doraise=True)
+    except (py_compile.PyCompileError, EnvironmentError):
+        pass
+    return process_time() - started
@@ -5,8 +5,8 @@ This plugin responds to :func:`loadTestsFromModule` by adding test
 cases for all test functions in the module to ``event.extraTests``. It
 uses ``session.testMethodPrefix`` to find test functions.
 
-Functions that are generators, have param lists, or take arguments
-are not collected.
+Functions that are generators, coroutines, have param lists, or take
+arguments are not collected.
 
 This plugin also implements :func:`loadTestsFromName` to enable loading
 tests from dotted function names passed on the command line.
@@ -88,6 +88,7 @@ class Functions(Plugin):
         parent, obj, name, index = result
         if (isinstance(obj, types.FunctionType) and not
             util.isgenerator(obj) and not
+            util.iscoroutinefunction(obj) and not
             hasattr(obj, 'paramList') and
             util.num_expected_args(obj) == 0):
             suite = event.loader.suiteClass()
@@ -136,7 +137,8 @@ class Functions(Plugin):
 
         paramList = getattr(obj, 'paramList', None)
         isGenerator = util.isgenerator(obj)
-        if paramList is not None or isGenerator:
+        isCoroutine = util.iscoroutinefunction(obj)
+        if paramList is not None or isGenerator or isCoroutine:
             return tests
         else:
             case = util.transplant_class(
@@ -67,6 +67,8 @@ class TestCaseLoader(events.Plugin):
         elif (isinstance(parent, type) and
               issubclass(parent, unittest.TestCase) and
               not util.isgenerator(obj) and
+              not (util.iscoroutinefunction(obj) and
+                   not util.runs_coroutines(parent)) and
               not hasattr(obj, 'paramList')):
             # name is a single test method
             event.extraTests.append(parent(obj.__name__))
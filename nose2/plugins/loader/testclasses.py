@@ -128,6 +128,7 @@ class TestClassLoader(events.Plugin):
         elif (isinstance(parent, type) and
               not issubclass(parent, unittest.TestCase) and
               not util.isgenerator(obj) and
+              not util.iscoroutinefunction(obj) and
               not hasattr(obj, 'paramList')):
             # name is a single test method
             event.extraTests.append(
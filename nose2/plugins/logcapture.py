@@ -6,7 +6,8 @@ This plugin implements :func:`startTestRun`, :func:`startTest`,
 :func:`stopTest`, :func:`setTestOutcome`, and :func:`outcomeDetail` to
 set up a logging configuration that captures log messages during test
 execution, and appends them to error reports for tests that fail or
-raise exceptions.
+raise exceptions. When tests run in :doc:`threads <threads>`, the
+messages logged by each test thread are kept apart.
 
 """
 import logging
@@ -54,7 +55,19 @@ class LogCapture(Plugin):
 
     def startTest(self, event):
         """Set up handler for new test"""
-        self._setupLoghandler()
+        if self.handler.threaded:
+            # the handler is already in place; setting it up again
+            # would lose what other threads are logging
+            self.handler.truncate()
+        else:
+            self._setupLoghandler()
+
+    def startThreadPool(self, event):
+        """Keep messages logged by each test thread apart"""
+        self.handler.splitByThread(True)
+
+    def stopThreadPool(self, event):
+        self.handler.splitByThread(False)
 
     def setTestOutcome(self, event):
         """Store captured log messages in ``event.metadata``"""
@@ -97,7 +110,7 @@ class LogCapture(Plugin):
 
     def _addCapturedLogs(self, event):
         format = self.handler.format
-        records = [format(r) for r in self.handler.buffer]
+        records = [format(r) for r in self.handler.records()]
         if 'logs' in event.metadata:
             event.metadata['logs'].extend(records)
         else:
@@ -152,12 +165,31 @@ class MyMemoryHandler(BufferingHandler):
         fmt = logging.Formatter(logformat, logdatefmt)
         self.setFormatter(fmt)
         self.filterset = FilterSet(filters)
+        self._threads = None
+
+    @property
+    def threaded(self):
+        return self._threads is not None
+
+    def splitByThread(self, split):
+        """Buffer messages separately for each thread that truncates"""
+        self._threads = threading.local() if split else None
+
+    def records(self):
+        """Messages logged by this thread, if it has its own buffer"""
+        buffer = getattr(self._threads, 'buffer', None)
+        if buffer is None:
+            return self.buffer
+        return buffer
 
     def flush(self):
         pass  # do nothing
 
     def truncate(self):
-        self.buffer = []
+        if self._threads is not None:
+            self._threads.buffer = []
+        else:
+            self.buffer = []
 
     def filter(self, record):
         return self.filterset.allow(record.name)
@@ -166,11 +198,15 @@ class MyMemoryHandler(BufferingHandler):
         # take a snapshot of the potentially mutable arguments
         record.msg = record.getMessage()
         record.args = {}
-        BufferingHandler.emit(self, record)
+        if self._threads is None:
+            BufferingHandler.emit(self, record)
+        else:
+            self.records().append(record)
 
     def __getstate__(self):
         state = self.__dict__.copy()
         del state['lock']
+        state['_threads'] = None
         return state
 
     def __setstate__(self, state):
@@ -1,34 +1,140 @@
 
+import argparse
+import fnmatch
+import heapq
 import logging
+import math
 import multiprocessing
 import select
+import signal
+import time
+import types
 import unittest
 import collections
+try:
+    from collections.abc import Sequence
+except ImportError:
+    from collections import Sequence
 
+import io
+import json
 import os
 import sys
+import tempfile
 import six
+from six.moves import cPickle as pickle
+try:
+    import resource
+except ImportError:
+    resource = None
+try:
+    import selectors
+except ImportError:
+    selectors = None
 
 import multiprocessing.connection as connection
 from nose2 import events, loader, result, runner, session, util
+from nose2.plugins import layers as layersPlugin
+from nose2.suite import LayerSuite
 
 log = logging.getLogger(__name__)
+_WORKER_DIED = object()
+# --processes auto settles for this much longer than the fastest schedule
+_AUTO_TOLERANCE = 0.05
+try:
+    _PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError):
+    _PAGE_SIZE = 4096
 
 
 class MultiProcess(events.Plugin):
     configSection = 'multiprocess'
 
     def __init__(self):
-        self.addArgument(self.setProcs, 'N', 'processes', '# o procs')
+        self.addArgument(self.setProcs, 'N', 'processes',
+                         '# o procs, or auto')
+        self.addFlag(self.setSimulateSchedule, None, 'simulate-schedule',
+                     'Predict how long the tests would take to run in '
+                     'different numbers of processes, without running them')
         self.testRunTimeout = self.config.as_float('test-run-timeout', 60.0)
-        self.procs = self.config.as_int(
-            'processes', multiprocessing.cpu_count())
+        self._setProcs(self.config.as_str(
+            'processes', str(multiprocessing.cpu_count())))
+        self.simulateSchedule = False
         self.setAddress(self.config.as_str('bind_address', None))
+        self.schedule = self.config.as_str('schedule', 'discovery')
+        self.timingFile = self.config.as_str('timing-file', '.nose2timings')
+        self.replicateFixtures = self.config.as_list('replicate-fixtures', [])
+        self.recordTimings = self.config.as_bool(
+            'record-timings',
+            self.schedule == 'longest-first' or bool(self.replicateFixtures))
+        self.defaultDuration = self.config.as_float('default-duration', None)
+        if self.timingFile and not os.path.isabs(self.timingFile):
+            self.timingFile = os.path.join(os.getcwd(), self.timingFile)
+        chunkSize = self.config.as_str('chunk-size', '1')
+        self.chunkSize = None if chunkSize == 'auto' else int(chunkSize)
+        self.maxChunkSize = self.config.as_int('max-chunk-size', 100)
+        self.chunkTargetTime = self.config.as_float('chunk-target-time', 0.1)
+        self.prefetch = self.config.as_int('prefetch', 0)
+        self.cacheSuites = self.config.as_bool('cache-suites', False)
+        self.maxTestsPerWorker = self.config.as_int('max-tests-per-worker', 0)
+        self.maxWorkerRSS = self.config.as_float('max-worker-rss-mb', 0)
+        self.startMethod = self.config.as_str('start-method', '')
+        self.preload = self.config.as_list('preload', [])
+        self.compactEvents = self.config.as_bool('compact-events', True)
+        self.spillSize = self.config.as_int('spill-size', 65536)
+        self.streamBatchSize = self.config.as_int('stream-batch-size', 200)
+        self.streamInterval = self.config.as_float('stream-interval', 1.0)
+        self.remoteWorkers = self.config.as_int('remote-workers', 0)
+        self.remoteAddress = self.config.as_str('remote-address', '')
+        self.authkeyFile = self.config.as_str('authkey-file', '')
+        self.remoteTimeout = self.config.as_float('remote-worker-timeout',
+                                                  60.0)
+        self.distributedDiscovery = self.config.as_bool(
+            'distributed-discovery', False)
+        self.reportWorkers = self.config.as_bool('report-workers', False)
+        self.statsFile = self.config.as_str('stats-file', '')
+        if self.statsFile and not os.path.isabs(self.statsFile):
+            self.statsFile = os.path.join(os.getcwd(), self.statsFile)
+        self._perTaskTime = None
+        self._context = multiprocessing
 
         self.cases = {}
+        self.groups = {}
+        self.taskModules = {}
+        self.durations = {}
+        self.replicas = {}
+        self.layers = {}
+        self.deferred = set()
+        self.workerStats = []
+        self.recycles = 0
+        self.simulation = None
+
+    def register(self):
+        # a bad address is a usage error, found before any test runs
+        if self.remoteWorkers and self.session is not None:
+            port = self.remoteAddress.rpartition(':')[2].strip()
+            if not (port.isdigit() and int(port)):
+                # workers couldn't know which port to connect to
+                self.session.argparse.error(
+                    "MP: remote-workers needs remote-address to give the "
+                    "port to listen on, such as 0.0.0.0:7000")
+        super(MultiProcess, self).register()
 
     def setProcs(self, num):
-        self.procs = int(num[0])  # FIXME merge n fix
+        self._setProcs(num[0])  # FIXME merge n fix
+        self.register()
+
+    def _setProcs(self, num):
+        # with 'auto', procs is the most there could be, until the tests
+        # to run are known
+        self.autoProcs = num.strip().lower() == 'auto'
+        if self.autoProcs:
+            self.procs = _cpuLimit()
+        else:
+            self.procs = int(num)
+
+    def setSimulateSchedule(self, arg):
+        self.simulateSchedule = True
         self.register()
 
     def setAddress(self, address):
@@ -60,7 +166,29 @@ class MultiProcess(events.Plugin):
                         'stopSubprocess')
 
     def startTestRun(self, event):
-        event.executeTests = self._runmp
+        if self.simulateSchedule:
+            event.executeTests = self._simulate
+        else:
+            event.executeTests = self._runmp
+
+    def handleFile(self, event):
+        """Leave importing test modules to the test processes"""
+        if not self.distributedDiscovery:
+            return
+        if not util.valid_module_name(event.name):
+            return
+        evt = events.MatchPathEvent(event.name, event.path, event.pattern)
+        result = self.session.hooks.matchPath(evt)
+        if evt.handled:
+            if not result:
+                return
+        elif not fnmatch.fnmatch(event.name, event.pattern):
+            return
+        module_name, package_path = util.name_from_path(event.path)
+        # workers have the same sys.path as this process
+        util.ensure_importable(package_path)
+        event.extraTests.append(DeferredModule(module_name))
+        event.handled = True
 
     def beforeInteraction(self, event):
         # prevent interactive plugins from running
@@ -69,55 +197,307 @@ class MultiProcess(events.Plugin):
 
     def _runmp(self, test, result):
         flat = list(self._flatten(test))
-        procs = self._startProcs(len(flat))
-
-        # send one initial task to each process
-        for proc, conn in procs:
-            if not flat:
-                break
-            caseid = flat.pop(0)
-            conn.send(caseid)
-
-        rdrs = [conn for proc, conn in procs if proc.is_alive()]
-        while flat or rdrs:
-            ready, _, _ = select.select(rdrs, [], [], self.testRunTimeout)
-            for conn in ready:
-                # XXX proc could be dead
+        if self.schedule == 'longest-first':
+            flat = self._longestFirst(flat)
+        if self.autoProcs:
+            self.procs = self._tuneProcs(flat)
+        # workers still importing deferred modules, which may yet turn
+        # up more tests to run
+        collecting = set(self.deferred)
+        procs = self._startProcs(
+            self.procs if collecting else len(flat))
+        if self.remoteWorkers:
+            procs.extend(self._acceptRemoteWorkers())
+        workers = [WorkerState(proc, conn) for proc, conn in procs]
+        # when workers cache loaded modules, keep sending each worker
+        # tests from the module it last ran, and when they keep layers
+        # set up, tests from the layer it is in; tests from a deferred
+        # module go first to the worker that imported it
+        if self.cacheSuites or self.layers or self.deferred:
+            queue = TaskQueue(flat, self._affinity)
+        else:
+            queue = TaskQueue(flat)
+        testStarts = {}
+        # workers that are still connected
+        poller = Poller()
+        # workers with nothing to do, that may yet be sent something,
+        # as an ordered set
+        idle = collections.OrderedDict()
+
+        def topUp(worker):
+            # keep the worker's queue full, or tell it to stop if
+            # there's nothing left for it to do
+            while queue and len(worker.pending) <= self.prefetch:
+                worker.module = self._dispatch(
+                    worker.conn, queue, worker.pending, len(poller),
+                    worker.module)
+            if (not queue and not worker.pending and not collecting and
+                    not worker.finished):
+                # nothing left to run - send None, the 'done' flag
+                _send(worker.conn, None)
+                worker.finished = True
+            if worker.pending or worker.finished:
+                idle.pop(worker, None)
+            else:
+                idle[worker] = None
+
+        def topUpIdle():
+            # once collecting is over, idle workers either have
+            # something to do or need telling that they never will
+            for worker in list(idle):
+                topUp(worker)
+
+        def replace():
+            proc, conn = self._startProc(self._sessionExport)
+            worker = WorkerState(proc, conn)
+            workers.append(worker)
+            poller.register(worker.conn, worker)
+            topUp(worker)
+
+        # send initial tasks to each process, a chunk at a time
+        for _ in range(self.prefetch + 1):
+            for worker in workers:
+                if queue:
+                    worker.module = self._dispatch(
+                        worker.conn, queue, worker.pending, len(workers),
+                        worker.module)
+        for worker in workers:
+            if not worker.pending and not collecting:
+                _send(worker.conn, None)
+                worker.finished = True
+            if not worker.pending and not worker.finished:
+                idle[worker] = None
+            poller.register(worker.conn, worker)
+
+        while queue or poller:
+            if not poller:
+                # every worker has gone, but there are still tests to run
+                replace()
+            ready = poller.poll(self._pollTimeout(poller))
+            if not ready:
+                # nothing to read might mean nothing is left to read
+                # from, for workers that have been quiet for too long
+                now = time.time()
+                for worker in poller.quiet(now - self.testRunTimeout):
+                    if worker.proc.is_alive():
+                        poller.heard(worker.conn, now)
+                    else:
+                        ready.append(worker)
+            for worker in ready:
                 try:
-                    remote_events = conn.recv()
-                except EOFError:
-                    # probably dead/12
-                    log.warning("Subprocess connection closed unexpectedly")
-                    continue  # XXX or die?
+                    remote_events = worker.conn.recv()
+                except (EOFError, IOError):
+                    remote_events = _WORKER_DIED
+                poller.heard(worker.conn)
+                if remote_events is _WORKER_DIED:
+                    poller.unregister(worker.conn)
+                    idle.pop(worker, None)
+                    if worker.retired:
+                        continue
+                    if worker.pending:
+                        collecting.discard(worker.pending[0][0])
+                    if self._workerDied(worker.proc, worker.pending, queue,
+                                        result, worker.streamed):
+                        # start a replacement and keep going
+                        replace()
+                    if self.deferred:
+                        topUpIdle()
+                    continue
 
                 if remote_events is None:
                     # XXX proc is done, how to mark it dead?
-                    log.debug("Conn closed %s", conn)
-                    rdrs.remove(conn)
+                    log.debug("Conn closed %s", worker.conn)
+                    poller.unregister(worker.conn)
+                    idle.pop(worker, None)
                     continue
 
-                # replay events
-                testid, events = remote_events
-                log.debug("Received results for %s", testid)
-                for (hook, event) in events:
-                    log.debug("Received %s(%s)", hook, event)
-                    self._localize(event)
-                    getattr(self.session.hooks, hook)(event)
-
-                # send a new test to the worker if there is one left
-                if not flat:
-                    # if there isn't send None - it's the 'done' flag
-                    conn.send(None)
+                if (isinstance(remote_events, dict) and
+                        remote_events.get('message') == 'collected'):
+                    # the tests in a deferred module, found by the worker
+                    # that imported it, which gets first pick of them
+                    for task in reversed(self._collected(remote_events)):
+                        queue.push(task)
+                    continue
+
+                if isinstance(remote_events, dict):
+                    # worker statistics, sent just before it exits
+                    worker.stats = remote_events
+                    if remote_events.get('recycle'):
+                        worker.retired = True
+                        idle.pop(worker, None)
+                        # it won't run anything else it was sent
+                        while worker.pending:
+                            queue.push(worker.pending.pop()[0])
+                        if queue:
+                            log.debug("Recycling subprocess %s (%s)",
+                                      worker.proc.pid,
+                                      remote_events['recycle'])
+                            self.recycles += 1
+                            replace()
+                        else:
+                            # nothing left to run: it just finished
+                            remote_events['recycle'] = None
                     continue
-                caseid = flat.pop(0)
-                conn.send(caseid)
 
-        for _, conn in procs:
-            conn.close()
+                # replay events
+                if len(remote_events) == 4:
+                    version, testid, events, done = remote_events
+                    events = _decodeEvents(version, events)
+                else:
+                    testid, events = remote_events
+                    done = True
+                if not done:
+                    # part of the results of a group still running
+                    log.debug("Received partial results for %s", testid)
+                    worker.streamed.update(
+                        event.test for hook, event in events
+                        if hook == 'stopTest')
+                    self._replay(events, testStarts, worker)
+                    continue
+                log.debug("Received results for %s", testid)
+                worker.streamed = set()
+                if worker.pending and worker.pending[0][0] == testid:
+                    # workers run their tasks in order, so a task started
+                    # when it was sent or when the previous one finished
+                    now = time.time()
+                    _, sentAt = worker.pending.popleft()
+                    self._observe(
+                        testid, now - max(sentAt, worker.lastReply))
+                    worker.lastReply = now
+                self._replay(events, testStarts, worker)
+
+                if not worker.retired:
+                    topUp(worker)
+                if testid in collecting:
+                    collecting.discard(testid)
+                    topUpIdle()
+
+        poller.close()
+        for worker in workers:
+            worker.conn.close()
         # ensure we wait until all processes are done before
         # exiting, to allow plugins running there to finalize
-        for proc, _ in procs:
-            proc.join()
+        for worker in workers:
+            worker.proc.join()
+        self.workerStats = [worker.summary() for worker in workers]
+        if self.recordTimings:
+            self._saveTimings()
+        if self.statsFile:
+            self._saveStats()
+
+    def _pollTimeout(self, poller):
+        # wait until the worker that has been quiet longest has been
+        # quiet for testRunTimeout seconds
+        if not poller:
+            return 0
+        quiet = time.time() - poller.lastHeard()
+        return max(self.testRunTimeout - quiet, 0)
+
+    def _replay(self, events, testStarts, worker=None):
+        started = time.time()
+        for (hook, event) in events:
+            log.debug("Received %s(%s)", hook, event)
+            self._recordDuration(hook, event, testStarts)
+            self._localize(event)
+            getattr(self.session.hooks, hook)(event)
+        if worker is not None:
+            worker.replayTime += time.time() - started
+
+    def _workerDied(self, proc, pending, queue, result, reported=()):
+        """Clean up after a test-running subprocess that died.
+
+        The task the worker was running is reported as an error, and any
+        tasks sent to it after that one are put back in the queue. Tests
+        in ``reported`` already have results, and are left alone.
+        Returns ``True`` if the worker should be replaced.
+
+        """
+        proc.join(self.testRunTimeout)
+        status = _describeExit(proc.exitcode)
+        if not pending:
+            log.warning("Subprocess %s exited with %s", proc.pid, status)
+            return False
+        caseid, _ = pending.popleft()
+        log.warning("Subprocess %s exited with %s while running %s",
+                    proc.pid, status, caseid)
+        # tasks sent after the one that was running never started
+        while pending:
+            queue.push(pending.pop()[0])
+        try:
+            raise RuntimeError("Test process %s exited with %s while "
+                               "running %s" % (proc.pid, status, caseid))
+        except RuntimeError:
+            exc_info = sys.exc_info()
+        for testid in self.groups.get(caseid, [caseid]):
+            if testid in reported:
+                continue
+            test = self.cases[testid]
+            result.startTest(test)
+            result.addError(test, exc_info)
+            result.stopTest(test)
+        return True
+
+    def _dispatch(self, conn, queue, pending, workers, module=None):
+        """Send the next chunk of tasks from ``queue`` to a worker.
+
+        Returns the module of the last task sent, so that the next
+        chunk for the same worker can prefer tasks from that module.
+
+        """
+        size = self._chunkSize(len(queue), workers)
+        chunk = []
+        while queue and len(chunk) < size:
+            caseid = queue.pop(module)
+            module = self._affinity(caseid)
+            chunk.append(caseid)
+        sentAt = time.time()
+        pending.extend((caseid, sentAt) for caseid in chunk)
+        chunk = [self._payload(caseid) for caseid in chunk]
+        if len(chunk) == 1:
+            _send(conn, chunk[0])
+        else:
+            _send(conn, chunk)
+        return module
+
+    def _payload(self, caseid):
+        # a share of a replicated group goes with the tests it runs, and
+        # a test in layers with the layers it needs
+        if caseid in self.deferred:
+            return (caseid, self.cases[caseid].name)
+        if caseid in self.replicas or caseid in self.layers:
+            return (caseid, self.groups.get(caseid),
+                    self.layers.get(caseid, ()))
+        return caseid
+
+    def _affinity(self, caseid):
+        # tasks that run best in a worker that just ran another task
+        # with the same affinity
+        return self.layers.get(caseid) or self.taskModules.get(caseid)
+
+    def _chunkSize(self, remaining, workers):
+        if self.chunkSize is not None:
+            return self.chunkSize
+        if self._perTaskTime is None:
+            # nothing measured yet
+            return 1
+        size = int(self.chunkTargetTime / max(self._perTaskTime, 1e-6))
+        # leave enough work in the queue to keep every worker busy to
+        # the end of the run
+        size = min(size, self.maxChunkSize, remaining // max(workers, 1))
+        return max(size, 1)
+
+    def _observe(self, caseid, elapsed):
+        """Record how long a task took to run in its worker"""
+        if caseid in self.deferred:
+            # importing a module says little about running its tests
+            return
+        if caseid in self.groups:
+            self.durations[caseid] = elapsed
+            elapsed = elapsed / max(len(self.groups[caseid]), 1)
+        if self._perTaskTime is None:
+            self._perTaskTime = elapsed
+        else:
+            self._perTaskTime = 0.8 * self._perTaskTime + 0.2 * elapsed
 
     def _prepConns(self):
         """
@@ -160,20 +540,100 @@ class MultiProcess(events.Plugin):
 
     def _startProcs(self, test_count):
         # XXX create session export
-        session_export = self._exportSession()
+        self._sessionExport = self._exportSession()
+        self._context = self._processContext()
         procs = []
         count = min(test_count, self.procs)
         log.debug("Creating %i worker processes", count)
         for i in range(0, count):
-            parent_conn, child_conn = self._prepConns()
-            proc = multiprocessing.Process(
-                target=procserver, args=(session_export, child_conn))
-            proc.daemon = True
-            proc.start()
-            parent_conn = self._acceptConns(parent_conn)
-            procs.append((proc, parent_conn))
+            procs.append(self._startProc(self._sessionExport))
         return procs
 
+    def _startProc(self, session_export):
+        parent_conn, child_conn = self._prepConns()
+        proc = self._context.Process(
+            target=procserver, args=(session_export, child_conn))
+        proc.daemon = True
+        proc.start()
+        if not isinstance(child_conn, Sequence):
+            # the worker has its own copy now; ours would keep the pipe
+            # open, and hide the worker's exit, if left open
+            child_conn.close()
+        parent_conn = self._acceptConns(parent_conn)
+        return proc, parent_conn
+
+    def _acceptRemoteWorkers(self):
+        """Wait for ``remote-workers`` nose2-worker processes to connect
+
+        Each is sent the session export, and returned with a
+        :class:`RemoteWorker` standing in for its process. Workers that
+        have not connected within ``remote-worker-timeout`` seconds are
+        not waited for.
+
+        """
+        host, _, port = self.remoteAddress.rpartition(':')
+        address = (host or '127.0.0.1', int(port or 0))
+        listener = connection.Listener(
+            address, authkey=_readAuthkey(self.authkeyFile))
+        log.info("Waiting for %s remote workers on %s:%s",
+                 self.remoteWorkers, *listener.address)
+        # remote workers don't share our working directory
+        export = dict(self._sessionExport)
+        for key in ('startDir', 'topLevelDir'):
+            if export[key]:
+                export[key] = os.path.abspath(export[key])
+        # nor our file system: files they spill output to can't be read
+        # here, so they send everything through the connection
+        export['spillSize'] = 0
+        remote = []
+        deadline = time.time() + self.remoteTimeout
+        try:
+            while len(remote) < self.remoteWorkers:
+                timeout = deadline - time.time()
+                #ick private interface
+                readable, _, _ = select.select(
+                    [listener._listener._socket], [], [], max(timeout, 0))
+                if not readable:
+                    log.warning("Only %s of %s remote workers connected",
+                                len(remote), self.remoteWorkers)
+                    break
+                try:
+                    conn = listener.accept()
+                except connection.AuthenticationError as e:
+                    log.warning("Rejected remote worker: %s", e)
+                    continue
+                conn.send(export)
+                remote.append((RemoteWorker(listener.last_accepted), conn))
+        finally:
+            listener.close()
+        return remote
+
+    def _processContext(self):
+        if not self.startMethod:
+            return multiprocessing
+        if (not hasattr(multiprocessing, 'get_context') or
+                self.startMethod not in
+                multiprocessing.get_all_start_methods()):
+            log.warning("Start method %s is not available, using the "
+                        "default", self.startMethod)
+            return multiprocessing
+        context = multiprocessing.get_context(self.startMethod)
+        if self.startMethod == 'forkserver':
+            # the fork server imports these once, and each worker forked
+            # from it starts with them already loaded
+            context.set_forkserver_preload(self._preloadModules())
+        return context
+
+    def _preloadModules(self):
+        modules = ['nose2.plugins.mp']
+        modules.extend(cls.__module__
+                       for cls in self._sessionExport['pluginClasses'])
+        if self.preload:
+            modules.extend(self.preload)
+        else:
+            modules.extend(sorted(set(self.taskModules.values())))
+        return list(collections.OrderedDict.fromkeys(modules))
+
     def _flatten(self, suite):
         # XXX
         # examine suite tests to find out if they have class
@@ -181,32 +641,303 @@ class MultiProcess(events.Plugin):
         # of test classes or modules
         # ALSO record all test cases in self.cases
         log.debug("Flattening test into list of IDs")
+        tests = []
+        for test, layers in _walk(suite):
+            if isinstance(test, DeferredModule):
+                # a module for a worker to import; its tests are
+                # scheduled once the worker reports what they are
+                task = 'collect:%s' % test.name
+                self.cases[task] = test
+                self.taskModules[task] = test.name
+                self.deferred.add(task)
+                yield task
+            else:
+                tests.append((util.test_name(test), test,
+                              test.__class__.__module__,
+                              util.fixture_group(test), layers))
+        for task in self._schedule(tests):
+            yield task
+
+    def _schedule(self, tests):
+        """Turn tests into tasks, grouping those that share fixtures.
+
+        ``tests`` are ``(testid, test, module, group, layers)`` tuples,
+        where ``group`` is the test's module or class if that has
+        fixtures, and ``layers`` the (module, name) pairs of the layers
+        it is in, outermost first.
+
+        """
         mods = {}
         classes = {}
-        stack = [suite]
-        while stack:
-            suite = stack.pop()
-            for test in suite:
-                if isinstance(test, unittest.TestSuite):
-                    stack.append(test)
-                else:
-                    testid = util.test_name(test)
-                    self.cases[testid] = test
-                    if util.has_module_fixtures(test):
-                        mods.setdefault(test.__class__.__module__, []).append(
-                            testid)
-                    elif util.has_class_fixtures(test):
-                        classes.setdefault(
-                            "%s.%s" % (test.__class__.__module__,
-                                       test.__class__.__name__),
-                            []).append(testid)
-                    else:
-                        yield testid
-
+        for testid, test, module, group, layers in tests:
+            self.cases[testid] = test
+            self.taskModules[testid] = module
+            if layers:
+                # layers, not unittest, handle the fixtures
+                self.layers[testid] = layers
+                yield testid
+            elif group is None:
+                yield testid
+            elif group == module:
+                mods.setdefault(module, []).append(testid)
+            else:
+                classes.setdefault(group, []).append(testid)
+
+        self.groups.update(classes)
+        self.groups.update(mods)
+        for cls in classes:
+            self.taskModules[cls] = cls.rsplit('.', 1)[0]
+        for mod in mods:
+            self.taskModules[mod] = mod
+        history = util.load_timings(self.timingFile) if (
+            self.replicateFixtures) else {}
         for cls in sorted(classes.keys()):
-            yield cls
+            for task in self._replicate(cls, history):
+                yield task
         for mod in sorted(mods.keys()):
-            yield mod
+            for task in self._replicate(mod, history):
+                yield task
+
+    def _collected(self, message):
+        """Schedule the tests a worker found in a deferred module"""
+        for record in message['ran']:
+            # already run where they were found
+            self.cases[record.testid] = record
+        tasks = list(self._schedule(
+            (record.testid, record, record.module, record.group,
+             record.layers) for record in message['tests']))
+        if self.schedule == 'longest-first':
+            tasks = self._longestFirst(tasks)
+        log.debug("Worker found %s tests in %s", len(message['tests']),
+                  message['collected'])
+        return tasks
+
+    def _replicate(self, group, history):
+        """Split ``group`` into shares that can run in parallel.
+
+        Only groups matching a ``replicate-fixtures`` pattern are split;
+        each share runs the group's fixtures for itself. A group is split
+        into at most one share per worker, and into fewer if its fixtures
+        take longer to run than each share's tests would.
+
+        """
+        if not any(fnmatch.fnmatch(group, pattern)
+                   for pattern in self.replicateFixtures):
+            return [group]
+        members = self.groups[group]
+        shares = min(len(members), max(self.procs + self.remoteWorkers, 1))
+        fixtureCost = self._fixtureCost(group, history)
+        if fixtureCost:
+            testCost = sum(history.get(m, 0.0) for m in members)
+            shares = min(shares, max(int(testCost / fixtureCost), 1))
+        if shares < 2:
+            return [group]
+        tasks = []
+        for i in range(shares):
+            task = '%s#%s' % (group, i + 1)
+            self.groups[task] = members[i * len(members) // shares:
+                                        (i + 1) * len(members) // shares]
+            self.taskModules[task] = self.taskModules[group]
+            self.replicas[task] = group
+            tasks.append(task)
+        log.debug("Replicating fixtures of %s in %s shares", group, shares)
+        return tasks
+
+    def _fixtureCost(self, group, history):
+        # measured when the group was last replicated, or failing that
+        # when it last ran as a whole
+        if group + '#fixtures' in history:
+            return history[group + '#fixtures']
+        members = self.groups[group]
+        if group in history and all(m in history for m in members):
+            return max(history[group] - sum(history[m] for m in members), 0)
+        return None
+
+    def _longestFirst(self, flat):
+        """Order ``flat`` so the longest tasks are dispatched first.
+
+        Durations come from the timing file written by a previous
+        run. Tasks without a recorded duration are estimated with
+        ``default-duration`` (per test, for fixture groups), which
+        defaults to the median of the recorded durations.
+
+        """
+        estimate = self._estimator(util.load_timings(self.timingFile))
+        # sorted() is stable, so ties keep their discovery order
+        ordered = sorted(flat, key=estimate, reverse=True)
+        log.debug("Longest-first schedule: %s", ordered)
+        return ordered
+
+    def _estimator(self, history):
+        """Make a function estimating how long a task takes to run"""
+        default = self.defaultDuration
+        if default is None:
+            known = sorted(history.values())
+            default = known[len(known) // 2] if known else 0.0
+
+        def estimate(item):
+            if item in history:
+                return history[item]
+            if item in self.deferred:
+                # a module a worker will import; its tests as recorded
+                prefix = self.taskModules[item] + '.'
+                return sum(duration for name, duration in history.items()
+                           if name.startswith(prefix)) or default
+            members = self.groups.get(item, [item])
+            return sum(history.get(m, default) for m in members)
+        return estimate
+
+    def _tuneProcs(self, flat):
+        """Choose how many processes to run ``flat`` in.
+
+        No more than the CPUs this process may use (its affinity mask and
+        cgroup quota) less the load already on them, and than fit in
+        available memory, given the peak resident set of workers in the
+        last run recorded in ``stats-file``. Of those, the fewest that the
+        timing history says run the tests nearly as fast as the most.
+
+        """
+        limit = max(min(self.procs, len(flat)), 1)
+        idle = _idleCPUs()
+        if idle is not None:
+            limit = max(min(limit, int(idle + 0.5)), 1)
+        workerMB = self._workerMemory()
+        availableMB = _availableMemoryMB()
+        if workerMB and availableMB is not None:
+            limit = max(min(limit, int(availableMB // workerMB)), 1)
+        history = util.load_timings(self.timingFile)
+        if history:
+            estimate = self._estimator(history)
+            durations = [estimate(task) for task in flat]
+            walls = [(_simulateSchedule(durations, n), n)
+                     for n in range(1, limit + 1)]
+            best = min(wall for wall, n in walls)
+            limit = min(n for wall, n in walls
+                        if wall <= best * (1 + _AUTO_TOLERANCE))
+        log.debug("Running tests in %s processes (%s CPUs, %s idle, "
+                  "%s MB available, %s MB per worker)", limit, self.procs,
+                  idle, availableMB, workerMB)
+        return limit
+
+    def _workerMemory(self):
+        # the most memory a worker used in the last run
+        if not self.statsFile:
+            return None
+        try:
+            with open(self.statsFile) as fh:
+                workers = json.load(fh)['workers']
+            return max(w.get('peakRSS', 0.0) for w in workers) or None
+        except (EnvironmentError, ValueError, KeyError, TypeError):
+            return None
+
+    def _simulate(self, test, result):
+        """Predict how long tests take to run in different numbers of
+        processes, from the timing history, without running them"""
+        flat = list(self._flatten(test))
+        if self.schedule == 'longest-first':
+            flat = self._longestFirst(flat)
+        history = util.load_timings(self.timingFile)
+        estimate = self._estimator(history)
+        durations = [estimate(task) for task in flat]
+        known = len([task for task in flat if task in history or all(
+            m in history for m in self.groups.get(task, [task]))])
+        limit = self.procs
+        if self.autoProcs:
+            self.procs = self._tuneProcs(flat)
+        counts = set([1, self.procs, limit])
+        n = 2
+        while n < limit:
+            counts.add(n)
+            n *= 2
+        self.simulation = {'tasks': len(flat), 'known': known,
+                           'total': sum(durations), 'walls': [
+                               (count, _simulateSchedule(durations, count))
+                               for count in sorted(counts)]}
+
+    def _recordDuration(self, hook, event, testStarts):
+        if not self.recordTimings:
+            return
+        if hook == 'startTest':
+            testStarts[event.test] = event.startTime
+        elif hook == 'stopTest' and event.test in testStarts:
+            self.durations[event.test] = (
+                event.stopTime - testStarts.pop(event.test))
+
+    def _saveTimings(self):
+        # keep the fixture cost of replicated groups, rather than the
+        # time taken by each share
+        fixtureCosts = collections.defaultdict(list)
+        for task, group in self.replicas.items():
+            members = self.groups[task]
+            if task in self.durations and all(
+                    m in self.durations for m in members):
+                fixtureCosts[group].append(max(
+                    self.durations.pop(task) -
+                    sum(self.durations[m] for m in members), 0))
+            self.durations.pop(task, None)
+        for group, costs in fixtureCosts.items():
+            self.durations[group + '#fixtures'] = sum(costs) / len(costs)
+        history = util.load_timings(self.timingFile)
+        history.update(self.durations)
+        try:
+            util.save_timings(self.timingFile, history)
+        except EnvironmentError:
+            log.warning("Unable to write timing file %s", self.timingFile)
+
+    def _saveStats(self):
+        try:
+            util.save_json(self.statsFile, {
+                'version': 1, 'recycles': self.recycles,
+                'workers': self.workerStats}, indent=1, sort_keys=True)
+        except EnvironmentError:
+            log.warning("Unable to write worker stats file %s",
+                        self.statsFile)
+
+    def beforeSummaryReport(self, event):
+        """Report worker utilization, recycling and memory use"""
+        if self.simulation:
+            self._reportSimulation(event.stream)
+        if not (self.reportWorkers or self.maxTestsPerWorker or
+                self.maxWorkerRSS):
+            return
+        busy = sum(stats['busy'] for stats in self.workerStats)
+        total = busy + sum(stats['idle'] + stats['loading']
+                           for stats in self.workerStats)
+        event.stream.writeln(util.ln("Multiprocess workers"))
+        event.stream.writeln(
+            "%s workers, %s recycled, %.1f%% busy" % (
+                len(self.workerStats), self.recycles,
+                100.0 * busy / total if total else 0.0))
+        for stats in self.workerStats:
+            event.stream.writeln(
+                "  pid %(pid)s: %(tests)s tests in %(tasks)s tasks, "
+                "peak RSS %(peakRSS).1f MB" % stats)
+            if self.reportWorkers:
+                event.stream.writeln(
+                    "    busy %(busy).2fs, idle %(idle).2fs, loading "
+                    "%(loading).2fs, replaying %(replay).2fs" % stats)
+                event.stream.writeln(
+                    "    sent %(sent)s bytes, received %(received)s bytes"
+                    % stats)
+        event.stream.writeln('')
+
+    def _reportSimulation(self, stream):
+        stream.writeln(util.ln("Simulated schedule"))
+        stream.writeln(
+            "%(tasks)s tasks, %(known)s with recorded durations, "
+            "%(total).2fs in all" % self.simulation)
+        if not self.simulation['known']:
+            stream.writeln("Without recorded durations there is nothing "
+                           "to predict; turn on record-timings and run the "
+                           "tests first")
+        stream.writeln("%9s %12s %8s" % ('processes', 'wall time', 'busy'))
+        for count, wall in self.simulation['walls']:
+            busy = self.simulation['total'] / (wall * count) if wall else 0.0
+            stream.writeln("%9s %11.2fs %7.1f%%%s" % (
+                count, wall, 100.0 * busy,
+                '  (auto)' if self.autoProcs and count == self.procs
+                else ''))
+        stream.writeln('')
 
     def _localize(self, event):
         # XXX set loader, case, result etc to local ones, if present in event
@@ -228,6 +959,18 @@ class MultiProcess(events.Plugin):
                     RuntimeError("Unable to locate test case for %s in "
                                  "main process" % event.test))._tests[0]
 
+    def _replayHooks(self):
+        # hooks that something in this process listens to; there's no
+        # point in workers sending events for any others
+        hooks = set(method for method, hook in self.session.hooks.hooks.items()
+                    if hook.plugins)
+        if self.recordTimings:
+            hooks.update(('startTest', 'stopTest'))
+        if self.streamBatchSize:
+            # tells us which tests of a group have finished
+            hooks.add('stopTest')
+        return hooks
+
     def _exportSession(self):
         # argparse isn't pickleable
         # no plugin instances
@@ -237,6 +980,17 @@ class MultiProcess(events.Plugin):
                   'startDir': self.session.startDir,
                   'topLevelDir': self.session.topLevelDir,
                   'logLevel': self.session.logLevel,
+                  'cacheSuites': self.cacheSuites,
+                  'maxTestsPerWorker': self.maxTestsPerWorker,
+                  'maxWorkerRSS': self.maxWorkerRSS,
+                  'sendStats': True,
+                  'compactEvents': self.compactEvents,
+                  'spillSize': self.spillSize,
+                  'streamBatchSize': self.streamBatchSize,
+                  'streamInterval': self.streamInterval,
+                  'replayHooks': self._replayHooks(),
+                  'layers': self.session.isPluginLoaded(
+                      'nose2.plugins.layers'),
                   # XXX classes or modules?
                   'pluginClasses': []}
         # XXX fire registerInSubprocess -- add those plugin classes
@@ -274,7 +1028,7 @@ def procserver(session_export, conn):
         plugin.register()
         rlog.debug("Registered %s in subprocess", plugin)
 
-    if isinstance(conn, collections.Sequence):
+    if isinstance(conn, Sequence):
         conn = connection.Client(conn[:2], authkey=conn[2])
 
     event = SubprocessEvent(loader_, result_, runner_, ssn.plugins, conn)
@@ -286,24 +1040,913 @@ def procserver(session_export, conn):
         return
     # receive and run tests
     executor = event.executeTests
+    if session_export.get('cacheSuites'):
+        loadTests = SuiteCache(event.loader).loadTestsFromName
+    else:
+        loadTests = event.loader.loadTestsFromName
+    # seconds spent waiting for tasks, loading their tests and running
+    # them
+    stats = {'message': 'stats', 'pid': os.getpid(), 'tests': 0,
+             'tasks': 0, 'idle': 0.0, 'loading': 0.0, 'busy': 0.0,
+             'peakRSS': 0.0, 'recycle': None}
+    maxTests = session_export.get('maxTestsPerWorker')
+    maxRSS = session_export.get('maxWorkerRSS')
+    replayHooks = session_export.get('replayHooks')
+    layers = LayerStack(ssn, event.result)
+
+    def send(recorded, done=True):
+        if session_export.get('compactEvents'):
+            conn.send((_WIRE_VERSION, testid, _encodeEvents(
+                recorded, replayHooks, session_export.get('spillSize')),
+                done))
+        else:
+            conn.send((testid, recorded))
+        stats['tests'] += len([hook for hook, _ in recorded
+                               if hook == 'startTest'])
+
+    if (session_export.get('compactEvents') and
+            session_export.get('streamBatchSize')):
+        # send results of big groups of tests back as they arrive
+        ssn.hooks.stream(lambda recorded: send(recorded, done=False),
+                         session_export['streamBatchSize'],
+                         session_export.get('streamInterval'))
+    waitStart = time.time()
     for testid in gentests(conn):
         if testid is None:
             break
-        # XXX to handle weird cases like layers, need to
-        # deal with the case that testid is something other
-        # than a simple string.
-        test = event.loader.loadTestsFromName(testid)
+        loadStart = time.time()
+        stats['idle'] += loadStart - waitStart
+        if isinstance(testid, tuple) and len(testid) == 2:
+            # a module to import, whose tests the main process hasn't
+            # seen; tests standing in for import errors are run now
+            testid, name = testid
+            tests, broken = _collect(event.loader, name,
+                                     session_export.get('layers'))
+            conn.send({'message': 'collected', 'collected': name,
+                       'tests': [TestRecord(test, path)
+                                 for test, path in tests],
+                       'ran': [TestRecord(test) for test in broken]})
+            test, path = event.loader.suiteClass(broken), ()
+        elif isinstance(testid, tuple):
+            # a share of a group whose fixtures are replicated, or a
+            # test in layers
+            testid, members, path = testid
+            test = event.loader.suiteClass(
+                [loadTests(member) for member in members or [testid]])
+        else:
+            test, path = loadTests(testid), ()
+        runStart = time.time()
+        stats['loading'] += runStart - loadStart
+        # stream the results of groups of tests, not of single tests
+        ssn.hooks.startTask(test.countTestCases() > 1)
         # xxx try/except?
         rlog.debug("Execute test %s (%s)", testid, test)
-        executor(test, event.result)
-        events = [e for e in ssn.hooks.flush()]
-        conn.send((testid, events))
+        if path or layers.stack:
+            # only tear down and set up the layers that differ
+            layers.enter(path)
+        if path:
+            layers.run(test, executor)
+        else:
+            executor(test, event.result)
+        # unittest tears down class and module fixtures at the end of
+        # each task; make sure the next task sets them up again, even
+        # if it is another share of the same group
+        event.result._previousTestClass = None
+        stats['busy'] += time.time() - runStart
+        stats['tasks'] += 1
+        send(ssn.hooks.flush())
         rlog.debug("Log for %s returned", testid)
+        waitStart = time.time()
+        if not session_export.get('sendStats'):
+            continue
+        rss = _residentSetMB()
+        stats['peakRSS'] = max(stats['peakRSS'], rss)
+        if maxTests and stats['tests'] >= maxTests:
+            stats['recycle'] = 'ran %s tests' % stats['tests']
+        elif maxRSS and rss > maxRSS:
+            stats['recycle'] = 'resident set is %.1f MB' % rss
+        if stats['recycle']:
+            rlog.debug("Recycling: %s", stats['recycle'])
+            break
+    if layers.stack:
+        layers.enter(())
+        send(ssn.hooks.flush())
+    if session_export.get('sendStats'):
+        conn.send(stats)
     conn.send(None)
     conn.close()
     ssn.hooks.stopSubprocess(event)
 
 
+def worker(argv=None):
+    """Run tests for a nose2 test run on another machine
+
+    Connects to the coordinating nose2 process at ``HOST:PORT``, and
+    runs the tests it sends until it says there are no more.
+
+    """
+    parser = argparse.ArgumentParser(
+        prog='nose2-worker',
+        description='Run tests for a multiprocess nose2 test run')
+    parser.add_argument('address', help='coordinator address, HOST:PORT')
+    parser.add_argument('--authkey-file', required=True,
+                        help='file containing the shared secret '
+                        '(the authkey-file used by the coordinator)')
+    parser.add_argument('--connect-timeout', type=float, default=60.0,
+                        help='seconds to keep trying to connect')
+    args = parser.parse_args(argv)
+    host, _, port = args.address.rpartition(':')
+    authkey = _readAuthkey(args.authkey_file)
+    deadline = time.time() + args.connect_timeout
+    while True:
+        try:
+            conn = connection.Client((host, int(port)), authkey=authkey)
+            break
+        except (IOError, OSError):
+            # the coordinator may not be listening yet
+            if time.time() > deadline:
+                raise
+            time.sleep(0.1)
+    try:
+        procserver(conn.recv(), conn)
+    finally:
+        conn.close()
+
+
+class RemoteWorker(object):
+    """Stands in for the process of a worker connected over TCP
+
+    It can't be checked on or waited for; a remote worker that dies is
+    noticed when its connection closes.
+
+    """
+    exitcode = None
+
+    def __init__(self, address):
+        self.pid = '%s:%s' % tuple(address[:2])
+        self.alive = True
+
+    def is_alive(self):
+        return self.alive
+
+    def join(self, timeout=None):
+        self.alive = False
+
+
+class LayerStack(object):
+
+    """Layers set up in a test-running subprocess.
+
+    Layers stay set up from one task to the next. Moving on to a task
+    tears down only the layers it is not in, and sets up only the
+    layers it is in that are not set up already.
+
+    """
+
+    def __init__(self, session, result):
+        self.session = session
+        self.result = result
+        self.stack = []
+        self.failed = {}
+        self.error = None
+        self.lastTest = None
+
+    def enter(self, path):
+        """Make ``path``, a list of (module, name) pairs, the layers set up"""
+        path = tuple(path)
+        common = 0
+        while (common < min(len(self.stack), len(path)) and
+               self.stack[common][0] == path[common]):
+            common += 1
+        while len(self.stack) > common:
+            suite = self.stack.pop()[1]
+            self._safeCall(self.lastTest, suite.tearDown)
+        self.error = None
+        for depth in range(common, len(path)):
+            self.error = self.failed.get(path[:depth + 1])
+            if self.error is not None:
+                return
+            module, name = path[depth]
+            suite = LayerSuite(self.session, layer=getattr(
+                util.module_from_name(module), name))
+            try:
+                suite.setUp()
+            except KeyboardInterrupt:
+                raise
+            except:
+                # every test in the layer fails, without trying again
+                self.error = self.failed[path[:depth + 1]] = sys.exc_info()
+                return
+            self.stack.append((path[depth], suite))
+
+    def run(self, test, executor):
+        """Run ``test`` in the layers entered"""
+        for case in self._cases(test):
+            if self.error is not None:
+                self.result.startTest(case)
+                self.result.addError(case, self.error)
+                self.result.stopTest(case)
+                continue
+            suite = self.stack[-1][1]
+            self._safeCall(case, suite.setUpTest, case)
+            try:
+                executor(case, self.result)
+            finally:
+                self._safeCall(case, suite.tearDownTest, case)
+            self.lastTest = case
+
+    def _safeCall(self, test, method, *args):
+        # a layer isn't a test the main process knows about, so errors
+        # in layer fixtures are reported against the nearest test
+        try:
+            method(*args)
+        except KeyboardInterrupt:
+            raise
+        except:
+            if test is not None:
+                self.result.addError(test, sys.exc_info())
+
+    def _cases(self, test):
+        if not isinstance(test, unittest.BaseTestSuite):
+            return [test]
+        return [case for t in test for case in self._cases(t)]
+
+
+class DeferredModule(unittest.TestCase):
+
+    """Stands in for a test module that a worker will import.
+
+    With ``distributed-discovery``, discovery in the main process finds
+    test modules without importing them; a worker imports each one and
+    reports the tests in it.
+
+    """
+
+    def __init__(self, name):
+        super(DeferredModule, self).__init__()
+        self.name = name
+
+    def runTest(self):
+        raise RuntimeError(
+            "Module %s can only be run in a test process" % self.name)
+
+    def id(self):
+        return self.name
+
+    def countTestCases(self):
+        return 0
+
+    def shortDescription(self):
+        return None
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.name == other.name
+
+    def __hash__(self):
+        return hash((type(self), self.name))
+
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, self.name)
+
+
+class TestRecord(unittest.TestCase):
+
+    """What the main process knows of a test found by a worker.
+
+    Only what is needed to schedule the test and to report on it: its
+    id and descriptions, its module, the module or class whose fixtures
+    it shares, if any, and the layers it is in.
+
+    """
+
+    _attrs = ('testid', 'description', 'doc', 'module', 'group', 'layers')
+
+    def __init__(self, test, layers=()):
+        super(TestRecord, self).__init__()
+        self.testid = util.test_name(test)
+        self.description = str(test)
+        self.doc = test.shortDescription()
+        self.module = test.__class__.__module__
+        self.group = util.fixture_group(test)
+        self.layers = layers
+
+    def __getstate__(self):
+        # only the record, not the TestCase machinery
+        return dict((attr, getattr(self, attr)) for attr in self._attrs)
+
+    def __setstate__(self, state):
+        super(TestRecord, self).__init__()
+        self.__dict__.update(state)
+
+    def runTest(self):
+        raise RuntimeError(
+            "Test %s can only be run in a test process" % self.testid)
+
+    def id(self):
+        return self.testid
+
+    def shortDescription(self):
+        return self.doc
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.testid == other.testid
+
+    def __hash__(self):
+        return hash((type(self), self.testid))
+
+    def __str__(self):
+        return self.description
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, self.testid)
+
+
+def _walk(suite):
+    """Yield each test in ``suite``, with the layers it is in
+
+    Layers are (module, name) pairs, outermost first.
+
+    """
+    stack = [(suite, ())]
+    while stack:
+        suite, layers = stack.pop()
+        for test in suite:
+            if isinstance(test, LayerSuite):
+                if test.layer is None:
+                    stack.append((test, layers))
+                else:
+                    stack.append((test, layers + (
+                        (test.layer.__module__, test.layer.__name__),)))
+            elif isinstance(test, unittest.TestSuite):
+                stack.append((test, layers))
+            else:
+                yield test, layers
+
+
+def _collect(loader_, name, layers=False):
+    """Import module ``name`` and find the tests in it
+
+    Returns the tests that can be loaded again by name, with the layers
+    they're in, and the tests that stand in for import or loading
+    errors, which can't. Tests are only grouped into layers if
+    ``layers`` is true, as when the main process has the layers plugin
+    loaded.
+
+    """
+    try:
+        module = util.module_from_name(name)
+    except (KeyboardInterrupt, SystemExit):
+        raise
+    except:
+        suite = loader_.failedImport(name)
+    else:
+        suite = loader_.loadTestsFromModule(module)
+    if layers and any(getattr(test, 'layer', None) is not None
+                      for test in layersPlugin.Layers.flatten_suite(suite)):
+        # group tests into layers just as the main process would have
+        suite = layersPlugin.Layers(session=loader_.session).make_suite(
+            suite, loader_.suiteClass)
+    tests, broken = [], []
+    for test, layers in _walk(suite):
+        if test.__class__.__module__ == loader.__name__:
+            broken.append(test)
+        else:
+            tests.append((test, layers))
+    return tests, broken
+
+
+class WorkerState(object):
+
+    """A test-running subprocess, as the main process keeps track of it.
+
+    .. attribute :: pending
+
+       Tasks sent to the worker but not yet reported back, with the
+       time each was sent
+
+    .. attribute :: streamed
+
+       Tests of the worker's current task it has already reported
+
+    """
+
+    def __init__(self, proc, conn):
+        self.proc = proc
+        self.conn = MeteredConnection(conn)
+        self.pending = collections.deque()
+        self.streamed = set()
+        # module of the last task sent
+        self.module = None
+        self.lastReply = 0
+        # finishing up to be recycled
+        self.retired = False
+        # told there's nothing left to run
+        self.finished = False
+        # as reported by the worker itself, if it lived to do so
+        self.stats = None
+        # seconds spent replaying the worker's events
+        self.replayTime = 0.0
+
+    def summary(self):
+        """The worker's statistics, and what they cost the main process"""
+        summary = {'pid': self.proc.pid, 'tests': 0, 'tasks': 0,
+                   'idle': 0.0, 'loading': 0.0, 'busy': 0.0,
+                   'peakRSS': 0.0, 'recycle': None}
+        summary.update(self.stats or {})
+        summary.pop('message', None)
+        summary.update(sent=self.conn.bytesSent,
+                       received=self.conn.bytesReceived,
+                       replay=self.replayTime)
+        return summary
+
+
+class MeteredConnection(object):
+
+    """Wraps a connection to a worker, counting the bytes that go over it"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.bytesSent = 0
+        self.bytesReceived = 0
+
+    def send(self, obj):
+        data = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+        self.conn.send_bytes(data)
+        self.bytesSent += len(data)
+
+    def recv(self):
+        data = self.conn.recv_bytes()
+        self.bytesReceived += len(data)
+        return pickle.loads(data)
+
+    def fileno(self):
+        return self.conn.fileno()
+
+    def close(self):
+        self.conn.close()
+
+    def __repr__(self):
+        return '<%s %r>' % (self.__class__.__name__, self.conn)
+
+
+class Poller(object):
+
+    """Connections to test-running subprocesses, to wait on together.
+
+    Uses the best :mod:`selectors` implementation for the platform
+    (epoll on Linux), so waiting costs the same however many workers
+    there are, and falls back to :func:`select.select` where
+    :mod:`selectors` is not available.
+
+    Also keeps track of when each connection was last heard from, in a
+    heap, so that finding the one quiet longest doesn't mean looking
+    at all of them.
+
+    """
+
+    def __init__(self):
+        self._registered = collections.OrderedDict()
+        if selectors is None:
+            self._selector = None
+        else:
+            self._selector = selectors.DefaultSelector()
+        self._heard = {}
+        # (time, sequence, conn) entries, some of them out of date
+        self._heardHeap = []
+        self._sequence = 0
+
+    def __len__(self):
+        return len(self._registered)
+
+    def __iter__(self):
+        return six.itervalues(self._registered)
+
+    def register(self, conn, data, heard=None):
+        """Wait on ``conn``; :meth:`poll` returns ``data`` for it"""
+        if self._selector is not None:
+            self._selector.register(conn, selectors.EVENT_READ, data)
+        self._registered[conn] = data
+        self.heard(conn, heard)
+
+    def unregister(self, conn):
+        """Stop waiting on ``conn``"""
+        if self._registered.pop(conn, None) is None:
+            return
+        del self._heard[conn]
+        if self._selector is not None:
+            self._selector.unregister(conn)
+
+    def heard(self, conn, when=None):
+        """Note that ``conn`` was heard from at ``when``, by default now"""
+        if conn not in self._registered:
+            return
+        if when is None:
+            when = time.time()
+        self._heard[conn] = when
+        self._sequence += 1
+        heapq.heappush(self._heardHeap, (when, self._sequence, conn))
+        if len(self._heardHeap) > 2 * len(self._heard) + 64:
+            # drop the out of date entries that have piled up
+            self._heardHeap = [
+                (when, self._sequence + i, conn)
+                for i, (conn, when) in enumerate(self._heard.items(), 1)]
+            self._sequence += len(self._heard)
+            heapq.heapify(self._heardHeap)
+
+    def lastHeard(self):
+        """When the connection quiet longest was last heard from"""
+        heap = self._heardHeap
+        while heap:
+            when, _, conn = heap[0]
+            if self._heard.get(conn) == when:
+                return when
+            heapq.heappop(heap)
+        return None
+
+    def quiet(self, since):
+        """The data of connections not heard from since ``since``"""
+        return [data for conn, data in self._registered.items()
+                if self._heard[conn] < since]
+
+    def poll(self, timeout=None):
+        """Return the data of connections with something to read"""
+        if self._selector is None:
+            ready, _, _ = select.select(
+                list(self._registered), [], [], timeout)
+            return [self._registered[conn] for conn in ready]
+        return [key.data for key, _ in self._selector.select(timeout)]
+
+    def close(self):
+        if self._selector is not None:
+            self._selector.close()
+        self._registered.clear()
+        self._heard.clear()
+        del self._heardHeap[:]
+
+
+class TaskQueue(object):
+
+    """Tasks waiting to be sent to test-running subprocesses.
+
+    Tasks are handed out in the order given, except that callers of
+    :meth:`pop` may ask for a task with a particular key first.
+
+    :param tasks: Task ids, in dispatch order
+    :param keyfunc: Callable returning the key for a task id, or
+                    ``None`` if tasks are not keyed
+
+    """
+
+    def __init__(self, tasks, keyfunc=None):
+        self.keyfunc = keyfunc
+        self._order = collections.deque()
+        self._byKey = {}
+        self._queued = set()
+        for task in tasks:
+            self.push(task, first=False)
+
+    def __len__(self):
+        return len(self._queued)
+
+    def push(self, task, first=True):
+        """Add a task, by default at the front of the queue"""
+        if task in self._queued:
+            return
+        self._queued.add(task)
+        if first:
+            self._order.appendleft(task)
+        else:
+            self._order.append(task)
+        if self.keyfunc is not None:
+            keyed = self._byKey.setdefault(
+                self.keyfunc(task), collections.deque())
+            if first:
+                keyed.appendleft(task)
+            else:
+                keyed.append(task)
+
+    def pop(self, key=None):
+        """Remove and return the next task, preferring tasks with ``key``"""
+        # tasks taken through one deque are left in the other, and
+        # skipped when they come up there
+        if key is not None and self.keyfunc is not None:
+            keyed = self._byKey.get(key)
+            while keyed:
+                task = keyed.popleft()
+                if task in self._queued:
+                    self._queued.remove(task)
+                    return task
+        while self._order:
+            task = self._order.popleft()
+            if task in self._queued:
+                self._queued.remove(task)
+                return task
+        raise IndexError('pop from an empty TaskQueue')
+
+
+class SuiteCache(object):
+
+    """Index of the tests loaded in a test-running subprocess.
+
+    The first time a test from a module is requested, the whole module
+    is loaded and its tests are indexed by test id. Later requests for
+    tests (or test classes) in the same module are served from that
+    index. Each test is served from the index once; the index keeps
+    only its id after that, so that the process doesn't hold on to the
+    tests it has run. Names that can't be found in the index, or that
+    take in tests already served, are loaded with
+    :meth:`loadTestsFromName` as usual.
+
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+        self.modules = {}
+
+    def loadTestsFromName(self, name):
+        """Load test, test class or module ``name``"""
+        modname, index = self._index(name)
+        if index is not None:
+            if name == modname:
+                testids = list(index)
+            elif name in index:
+                testids = [name]
+            else:
+                prefix = name + '.'
+                testids = [testid for testid in index
+                           if testid.startswith(prefix)]
+            tests = [index[testid] for testid in testids]
+            for testid in testids:
+                index[testid] = None
+            if tests and None not in tests:
+                return self.loader.suiteClass(tests)
+        return self.loader.loadTestsFromName(name)
+
+    def _index(self, name):
+        parts = name.split(':')[0].split('.')
+        modname = _loadedModuleName(parts)
+        if modname is None:
+            try:
+                util.try_import_module_from_name(parts)
+            except (KeyboardInterrupt, SystemExit):
+                raise
+            except:
+                return None, None
+            # parts now holds the longest importable name
+            modname = '.'.join(parts)
+        if modname not in self.modules:
+            index = collections.OrderedDict()
+            self._addToIndex(
+                index, self.loader.loadTestsFromModule(sys.modules[modname]))
+            self.modules[modname] = index
+        return modname, self.modules[modname]
+
+    def _addToIndex(self, index, suite):
+        for test in suite:
+            if isinstance(test, unittest.TestSuite):
+                self._addToIndex(index, test)
+            else:
+                index[util.test_name(test)] = test
+
+
+def _loadedModuleName(parts):
+    # the longest already imported module named by a prefix of parts,
+    # if the rest of parts are names in it: trying to import the whole
+    # name would fail, raising an ImportError, for each trailing part
+    for end in range(len(parts), 0, -1):
+        module = sys.modules.get('.'.join(parts[:end]))
+        if module is None:
+            continue
+        if end < len(parts):
+            attr = getattr(module, parts[end], None)
+            if attr is None or isinstance(attr, types.ModuleType):
+                # may be a submodule not yet imported
+                return None
+        return '.'.join(parts[:end])
+    return None
+
+
+# Events for the most common hooks are sent as tuples of their
+# attributes, rather than pickled Event instances. Bump the version
+# when the encoding changes.
+_WIRE_VERSION = 1
+_OUTCOME_ATTRS = ('test', 'outcome', 'exc_info', 'reason', 'expected',
+                  'shortLabel', 'longLabel')
+_COMPACT_EVENTS = {
+    'startTest': (events.StartTestEvent, ('test', 'startTime')),
+    'stopTest': (events.StopTestEvent, ('test', 'stopTime')),
+    'setTestOutcome': (events.TestOutcomeEvent, _OUTCOME_ATTRS),
+    'testOutcome': (events.TestOutcomeEvent, _OUTCOME_ATTRS),
+}
+
+
+class _SpilledValue(object):
+    # metadata value too big for the pipe, written to a file instead
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        try:
+            with io.open(self.path, encoding='utf-8') as fh:
+                return fh.read()
+        finally:
+            os.unlink(self.path)
+
+
+def _spill(value):
+    fd, path = tempfile.mkstemp(prefix='nose2-mp-', suffix='.txt')
+    with io.open(fd, 'w', encoding='utf-8') as fh:
+        fh.write(value)
+    return _SpilledValue(path)
+
+
+def _encodeEvents(recorded, hooks=None, spillSize=None):
+    """Encode recorded ``(hook, event)`` pairs for sending
+
+    Events for hooks not in ``hooks`` are dropped. Events of the common
+    types become ``(hook, attributes)`` pairs, and an event recorded for
+    more than one hook is sent once and then referred to by its
+    position. Text metadata longer than ``spillSize`` is written to a
+    temporary file.
+
+    """
+    encoded = []
+    seen = {}
+    for hook, event in recorded:
+        if hooks is not None and hook not in hooks:
+            continue
+        if id(event) in seen:
+            encoded.append((hook, seen[id(event)]))
+            continue
+        seen[id(event)] = len(encoded)
+        eventClass, attrs = _COMPACT_EVENTS.get(hook, (None, ()))
+        if type(event) is not eventClass:
+            encoded.append((hook, event))
+            continue
+        state = event.__getstate__()
+        metadata = state['metadata']
+        if spillSize and metadata:
+            metadata = dict(
+                (key, _spill(value)
+                 if isinstance(value, six.text_type) and
+                 len(value) > spillSize else value)
+                for key, value in metadata.items())
+        encoded.append((hook, tuple(state[attr] for attr in attrs) +
+                        (state['handled'], metadata)))
+    return encoded
+
+
+def _decodeEvents(version, encoded):
+    """Rebuild ``(hook, event)`` pairs from :func:`_encodeEvents`"""
+    if version != _WIRE_VERSION:
+        raise RuntimeError(
+            "Unsupported event encoding version %s" % version)
+    decoded = []
+    for hook, item in encoded:
+        if isinstance(item, int):
+            event = decoded[item][1]
+        elif isinstance(item, tuple):
+            eventClass, attrs = _COMPACT_EVENTS[hook]
+            event = eventClass.__new__(eventClass)
+            event.__dict__.update(zip(attrs, item))
+            event.handled, metadata = item[-2:]
+            event.metadata = dict(
+                (key, value.load()
+                 if isinstance(value, _SpilledValue) else value)
+                for key, value in metadata.items())
+            event.result = None
+        else:
+            event = item
+        decoded.append((hook, event))
+    return decoded
+
+
+def _readAuthkey(path):
+    if not path:
+        raise RuntimeError(
+            "Remote workers need a shared authkey-file")
+    with open(path, 'rb') as fh:
+        return fh.read().strip()
+
+
+def _send(conn, message):
+    # the worker may already have gone away; if so, that is noticed
+    # and dealt with when reading from it
+    try:
+        conn.send(message)
+    except (IOError, EOFError):
+        log.debug("Unable to send %s to %s", message, conn)
+
+
+def _residentSetMB():
+    """Resident set size of this process in MB, or 0 if not known"""
+    try:
+        with open('/proc/self/statm') as fh:
+            pages = int(fh.read().split()[1])
+        return pages * _PAGE_SIZE / (1024.0 * 1024)
+    except (EnvironmentError, ValueError, IndexError):
+        pass
+    if resource is None:
+        return 0.0
+    # not the current size, but the peak is the next best thing
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak / (1024.0 * 1024)
+    return peak / 1024.0
+
+
+def _simulateSchedule(durations, procs):
+    """How long tasks taking ``durations`` take to run in ``procs``
+    processes, each process taking the next task when it is free"""
+    free = [0.0] * max(procs, 1)
+    for duration in durations:
+        heapq.heapreplace(free, free[0] + duration)
+    return max(free)
+
+
+def _cpuCount():
+    """The number of CPUs this process may run on"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return multiprocessing.cpu_count()
+
+
+def _cpuLimit():
+    """The number of CPUs this process may use"""
+    cpus = _cpuCount()
+    quota = _cgroupQuota()
+    if quota is not None:
+        cpus = min(cpus, max(int(math.ceil(quota)), 1))
+    return cpus
+
+
+def _cgroupQuota():
+    """CPUs this process's cgroup may use, if it has a quota"""
+    try:
+        # cgroup v2
+        with open('/sys/fs/cgroup/cpu.max') as fh:
+            quota, period = fh.read().split()[:2]
+    except (EnvironmentError, ValueError):
+        try:
+            # cgroup v1
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as fh:
+                quota = fh.read().strip()
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as fh:
+                period = fh.read().strip()
+        except EnvironmentError:
+            return None
+    try:
+        quota, period = int(quota), int(period)
+    except ValueError:
+        # 'max': no quota
+        return None
+    if quota <= 0 or period <= 0:
+        return None
+    return float(quota) / period
+
+
+def _idleCPUs():
+    """CPUs this process may run on that other processes leave idle,
+    if known"""
+    try:
+        load = os.getloadavg()[0]
+    except (AttributeError, OSError):
+        return None
+    return max(_cpuCount() - load, 0.0)
+
+
+def _availableMemoryMB():
+    """Memory available for new processes in MB, if known"""
+    try:
+        with open('/proc/meminfo') as fh:
+            for line in fh:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024.0
+    except (EnvironmentError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * _PAGE_SIZE / (1024.0 * 1024)
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def _describeExit(exitcode):
+    """Describe a subprocess exit code for humans"""
+    if exitcode is None:
+        return 'unknown status'
+    if exitcode < 0:
+        for name in dir(signal):
+            if (name.startswith('SIG') and not name.startswith('SIG_')
+                    and getattr(signal, name) == -exitcode):
+                return 'signal %s' % name
+        return 'signal %s' % -exitcode
+    return 'exit code %s' % exitcode
+
+
 # test generator
 def gentests(conn):
     while True:
@@ -311,7 +1954,12 @@ def gentests(conn):
             testid = conn.recv()
             if testid is None:
                 return
-            yield testid
+            if isinstance(testid, list):
+                # a chunk of tasks
+                for caseid in testid:
+                    yield caseid
+            else:
+                yield testid
         except EOFError:
             return
 
@@ -391,6 +2039,10 @@ class RecordingHook(events.Hook):
         self.interface.log(self.method, event)
         return res
 
+    def isActive(self):
+        # every event is recorded, to be sent to the main process
+        return True
+
 
 class RecordingPluginInterface(events.PluginInterface):
     hookClass = RecordingHook
@@ -401,13 +2053,46 @@ class RecordingPluginInterface(events.PluginInterface):
     def __init__(self):
         super(RecordingPluginInterface, self).__init__()
         self.events = []
+        self._streamTo = None
+        self._streaming = False
 
     def log(self, method, event):
         self.events.append((method, event))
+        if method == 'stopTest' and self._streaming:
+            if (len(self.events) >= self._batchSize or
+                    time.time() - self._lastFlushed >= self._interval):
+                self._streamTo(self.flush())
+
+    def stream(self, callback, batchSize, interval=None):
+        """Pass recorded events to ``callback`` as tests finish
+
+        When a test stops, if at least ``batchSize`` events have been
+        recorded, or ``interval`` seconds have passed since events were
+        last flushed, the events recorded so far are flushed to
+        ``callback``.
+
+        """
+        self._streamTo = callback
+        self._batchSize = batchSize
+        self._interval = interval or float('inf')
+        self._streaming = True
+        self._lastFlushed = time.time()
+
+    def startTask(self, streamed=True):
+        """Start recording the events of a task
+
+        Its events are only streamed if ``streamed`` is true, and
+        ``interval`` is counted from now, not from the end of the last
+        task.
+
+        """
+        self._streaming = streamed and self._streamTo is not None
+        self._lastFlushed = time.time()
 
     def flush(self):
         events = self.events[:]
         self.events = []
+        self._lastFlushed = time.time()
         return events
 
     def register(self, method, plugin):
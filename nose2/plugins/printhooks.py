@@ -54,6 +54,10 @@ class NoisyHook(events.Hook):
         finally:
             _dedent()
 
+    def isActive(self):
+        # every call is printed, whether plugins listen or not
+        return True
+
 
 def _report(method, event):
     sys.stderr.write("\n%s%s: %s" % (''.join(INDENT), method, event))
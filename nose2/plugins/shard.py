@@ -0,0 +1,155 @@
+"""
+Run one shard of the test suite.
+
+To spread a test suite across several machines, run nose2 on each of
+them with the same tests and a different shard, numbered from 1::
+
+  nose2 --plugin=nose2.plugins.shard --shard 1/4
+  nose2 --plugin=nose2.plugins.shard --shard 2/4
+  ...
+
+Each run divides the loaded tests into the given number of shards and
+runs only its own. Tests that share fixtures -- all of the tests in a
+module that defines ``setUpModule`` or ``tearDownModule``, in a class
+that defines ``setUpClass`` or ``tearDownClass``, or in a
+:doc:`layer <layers>` -- always end up in the same shard.
+
+Shards are balanced by how long their tests took to run before, if a
+timing file is available, or by the number of tests in them if it is
+not. The timing file is the one the :doc:`mp <mp>` plugin writes when
+its ``record-timings`` option is on, ``.nose2timings`` by default:
+
+.. code-block :: ini
+
+  [shard]
+  timing-file = .nose2timings
+
+The same tests and the same timing file always give the same shards, so
+every machine must load the same tests with the same timing file, or
+some tests may run in more than one shard or in none.
+
+"""
+import logging
+import os
+import unittest
+
+from nose2 import events, util
+from nose2.suite import LayerSuite
+
+
+log = logging.getLogger(__name__)
+__unittest = True
+
+
+class Shard(events.Plugin):
+
+    """Run one shard of the test suite"""
+
+    configSection = 'shard'
+
+    def __init__(self):
+        self.addArgument(self.setShard, None, 'shard',
+                         'Run shard I of N (as I/N) of the test suite')
+        self.timingFile = self.config.as_str('timing-file', '.nose2timings')
+        if self.timingFile and not os.path.isabs(self.timingFile):
+            self.timingFile = os.path.join(os.getcwd(), self.timingFile)
+        self.shard = None
+        self.shards = None
+
+    def setShard(self, arg):
+        try:
+            self.shard, self.shards = parseShard(arg[0])
+        except ValueError as e:
+            self.session.argparse.error(str(e))
+        self.register()
+
+    def createdTestSuite(self, event):
+        """Keep only the tests in this shard"""
+        if self.shards is None:
+            return
+        tests = list(_walk(event.suite))
+        units = {}
+        for test, key in tests:
+            units.setdefault(key, []).append(util.test_name(test))
+        history = util.load_timings(self.timingFile) if (
+            self.timingFile) else {}
+        keep = set(partition(units, self.shards, history)[self.shard - 1])
+        _filter(event.suite, set(id(test) for test, key in tests
+                                 if key in keep))
+        log.debug("Shard %s/%s has %s of %s tests", self.shard, self.shards,
+                  event.suite.countTestCases(), len(tests))
+
+
+def parseShard(value):
+    """Parse ``value``, as ``I/N``, into shard I of N"""
+    try:
+        shard, shards = [int(part) for part in value.split('/')]
+    except ValueError:
+        shard = shards = 0
+    if not 1 <= shard <= shards:
+        raise ValueError(
+            "Shard must be given as I/N, with 1 <= I <= N, not %r" % value)
+    return shard, shards
+
+
+def partition(units, shards, history=None):
+    """Divide ``units`` into ``shards`` shards of about the same cost.
+
+    ``units`` maps the name of each unit -- a test, or a group of tests
+    that share fixtures -- to the ids of its tests. Costs come from
+    ``history``, the durations in a timing file, with tests it does not
+    have taking the median of those it does; without durations, a unit
+    costs the number of tests in it.
+
+    Units are dealt out most costly first, each to the cheapest shard so
+    far, so the result depends only on the arguments. Returns a list of
+    the names of the units in each shard.
+
+    """
+    history = history or {}
+    known = sorted(history.values())
+    default = known[len(known) // 2] if known else 1.0
+
+    def cost(key):
+        if key in history:
+            return history[key]
+        return sum(history.get(m, default) for m in units[key])
+    costs = dict((key, cost(key)) for key in units)
+    loads = [0.0] * shards
+    result = [[] for _ in range(shards)]
+    for key in sorted(units, key=lambda k: (-costs[k], k)):
+        index = loads.index(min(loads))
+        loads[index] += costs[key]
+        result[index].append(key)
+    return result
+
+
+def _walk(suite, layer=None):
+    """Yield each test in ``suite``, with the name of the unit it is in"""
+    for test in suite:
+        if isinstance(test, LayerSuite) and test.layer is not None:
+            key = layer or '%s.%s' % (test.layer.__module__,
+                                      test.layer.__name__)
+            for item in _walk(test, key):
+                yield item
+        elif isinstance(test, unittest.TestSuite):
+            for item in _walk(test, layer):
+                yield item
+        elif layer is not None:
+            yield test, layer
+        else:
+            yield test, util.fixture_group(test) or util.test_name(test)
+
+
+def _filter(suite, keep):
+    # remove tests not in keep, and the suites left empty, in place;
+    # returns whether any tests are left
+    kept = []
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            if _filter(test, keep):
+                kept.append(test)
+        elif id(test) in keep:
+            kept.append(test)
+    suite._tests[:] = kept
+    return bool(kept)
@@ -0,0 +1,588 @@
+"""
+Find tests by reading test files instead of importing them.
+
+To find the tests in a module, nose2 imports it and asks the loader
+plugins for the tests in it. This plugin reads test files with
+:mod:`ast` instead, and keeps an index of what each defines:
+:class:`unittest.TestCase` subclasses and their test methods, test
+functions, generator tests, tests parameterized with
+:func:`~nose2.tools.params` or :func:`~nose2.tools.cartesian_params`,
+test attributes and whether the module has ``setUpModule`` or
+``tearDownModule``. To use the index, activate the plugin::
+
+  nose2 --plugin=nose2.plugins.staticindex --static-index ...
+
+With ``--collect-only`` (see :doc:`collect`), tests are collected from
+the index, and their modules are never imported. Test ids, shards and
+attribute selection all work on these tests as they would on imported
+ones, but errors that importing the modules would raise are not
+reported. When tests are run, and selected with ``-A`` or ``-E`` (see
+:doc:`attrib`), test files in which no test can be selected are not
+imported.
+
+Only test files written out in full can be used from the index. A
+test file is imported as usual if it
+
+* imports names that may be tests or test cases: names starting with
+  ``test`` (in any case), or names starting with a capital letter from
+  modules outside the standard library, nose2, ``mock`` and ``six``,
+* makes tests at import time, with generators, ``load_tests``,
+  ``__test__``, ``globals()`` or ``setattr``, for instance, or with
+  definitions inside ``if`` or ``try`` blocks,
+* decorates tests with anything other than ``params``,
+  ``cartesian_params``, ``attr``, ``with_setup``, ``with_teardown``
+  and the :mod:`unittest` skip decorators, or
+* sets test attributes, or parameters, to anything other than literals.
+
+The index is kept in a file, and the entry for a test file is reused
+while the file's content is unchanged:
+
+.. code-block :: ini
+
+  [static-index]
+  index-file = .nose2cache/index.json
+
+"""
+import ast
+import hashlib
+import itertools
+import json
+import logging
+import os
+import sys
+import types
+import unittest
+from fnmatch import fnmatch
+
+import six
+from six.moves import builtins
+
+from nose2 import events, util
+from nose2.plugins import attrib, collect
+from nose2.plugins.loader.parameters import ParamsFunctionCase
+
+
+log = logging.getLogger(__name__)
+__unittest = True
+
+_DECORATORS = ('attr', 'cartesian_params', 'expectedFailure', 'params',
+               'skip', 'skipIf', 'skipUnless', 'with_setup', 'with_teardown')
+_FIXTURES = ('setUp', 'setup', 'setUpFunc',
+             'tearDown', 'teardown', 'tearDownFunc')
+_DYNAMIC_NAMES = ('__import__', 'exec', 'execfile', 'globals', 'locals',
+                  'setattr', 'vars')
+_FUNCTIONS = (ast.FunctionDef,
+              getattr(ast, 'AsyncFunctionDef', ast.FunctionDef))
+_YIELDS = (ast.Yield, getattr(ast, 'YieldFrom', ast.Yield))
+_KNOWN_MODULES = ('mock', 'nose2', 'six', 'unittest', 'unittest2')
+_TESTCASES = ('TestCase', 'IsolatedAsyncioTestCase')
+_UNITTEST = ('unittest', 'unittest2')
+
+
+class StaticIndex(events.Plugin):
+
+    """Find tests from a static index of test files"""
+
+    configSection = 'static-index'
+    commandLineSwitch = (None, 'static-index',
+                         'Find tests by reading test files, not importing '
+                         'them, where possible')
+
+    def __init__(self):
+        indexFile = self.config.as_str(
+            'index-file', os.path.join('.nose2cache', 'index.json'))
+        self.index = Index(os.path.abspath(indexFile))
+        self.collectOnly = False
+        self.selector = None
+
+    def handleArgs(self, event):
+        """Find the plugins whose work the index can do"""
+        self.collectOnly = any(
+            isinstance(plugin, collect.CollectOnly)
+            for plugin in self.session.hooks.startTestRun.plugins)
+        for plugin in self.session.plugins:
+            if isinstance(plugin, attrib.AttributeSelector) and (
+                    plugin.attribs or plugin.eval_attribs):
+                self.selector = plugin
+
+    def handleFile(self, event):
+        """Collect the tests in a test file from the index"""
+        if not (self.collectOnly or self.selector) or not self._isTestFile(
+                event):
+            return
+        entry = self.index.get(event.path, self.session.testMethodPrefix)
+        if entry is None or entry['dynamic']:
+            log.debug("Not indexed: %s (%s)", event.path,
+                      entry and entry['dynamic'])
+            return
+        name = util.name_from_path(event.path)[0]
+        module = types.ModuleType(str(name))
+        module.__file__ = event.path
+        suite = indexedTests(event.loader, name, entry)
+        filterevt = events.ModuleSuiteEvent(event.loader, module, suite)
+        if self.collectOnly:
+            event.handled = True
+            result = self.session.hooks.moduleLoadedSuite(filterevt)
+            return result or filterevt.suite
+        self.selector.moduleLoadedSuite(filterevt)
+        if not filterevt.suite.countTestCases():
+            # no test in the file can be selected; don't import it
+            event.handled = True
+
+    def startTestRun(self, event):
+        """Save the index"""
+        self.index.save()
+
+    def stopTestRun(self, event):
+        """Save files indexed while tests ran, with lazy discovery"""
+        self.index.save()
+
+    def _isTestFile(self, event):
+        # would discovery import this file?
+        if not (event.path.endswith('.py') and
+                util.valid_module_name(event.name)):
+            return False
+        evt = events.MatchPathEvent(event.name, event.path, event.pattern)
+        result = self.session.hooks.matchPath(evt)
+        if evt.handled:
+            return bool(result)
+        return fnmatch(event.name, event.pattern)
+
+
+class Index(object):
+
+    """Indexes of test files, kept from one test run to the next.
+
+    The index of a file is reused for as long as the file's content is
+    unchanged.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.files = None
+        self.updated = False
+
+    def get(self, path, prefix='test'):
+        """The index of test file ``path``, or None if it cannot be read"""
+        if self.files is None:
+            self.load()
+        try:
+            with open(path, 'rb') as fh:
+                source = fh.read()
+        except EnvironmentError:
+            return None
+        digest = hashlib.sha1(source).hexdigest()
+        cached = self.files.get(path)
+        if cached is not None and (
+                cached['hash'], cached['prefix']) == (digest, prefix):
+            return cached['index']
+        index = indexSource(source, prefix)
+        self.files[path] = {'hash': digest, 'prefix': prefix, 'index': index}
+        self.updated = True
+        return index
+
+    def load(self):
+        """Read the index saved by an earlier run"""
+        self.files = {}
+        try:
+            with open(self.path) as fh:
+                data = json.load(fh)
+        except (EnvironmentError, ValueError):
+            return
+        if isinstance(data, dict) and data.get('version') == 1:
+            self.files = dict(data.get('files', {}))
+        log.debug("Loaded index of %s files from %s",
+                  len(self.files), self.path)
+
+    def save(self):
+        """Save the index for the next run, if it has changed"""
+        if not self.updated:
+            return
+        try:
+            util.save_json(self.path, {'version': 1, 'files': self.files})
+        except EnvironmentError:
+            log.warning("Unable to write test index %s", self.path)
+            return
+        self.updated = False
+
+
+def indexSource(source, prefix='test'):
+    """Index the tests in ``source``, the content of a test file.
+
+    Returns a dict of:
+
+    ``dynamic``
+      Why the file must be imported to find its tests, or None if it
+      need not be.
+    ``fixtures``
+      Whether the module defines ``setUpModule`` or ``tearDownModule``.
+    ``classes``
+      The test case classes, as (name, class) pairs, where a class is a
+      dict of its ``attributes``, its ``tests`` and whether it has class
+      ``fixtures``.
+    ``functions``
+      The test functions.
+    ``generators``
+      The names of generator tests.
+
+    Each test is a dict of its ``name``, ``attributes``, ``doc`` and
+    ``params``, the names of the tests it is expanded into when it is
+    parameterized.
+
+    """
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, TypeError, ValueError):
+        return {'dynamic': 'cannot be parsed', 'fixtures': False,
+                'classes': [], 'functions': [], 'generators': []}
+    return _Indexer(prefix).index(tree)
+
+
+def indexedTests(loader, module, entry):
+    """Make a suite of stand-in tests for the tests in index ``entry``"""
+    functions, params = [], []
+    for test in entry['functions']:
+        func = _standIn(test['name'], test)
+        func.__module__ = module
+        if test['params'] is None:
+            case = util.transplant_class(unittest.FunctionTestCase, module)
+            functions.append(case(func))
+        else:
+            case = util.transplant_class(ParamsFunctionCase, module)
+            params.extend(case('%s.%s' % (module, name), func)
+                          for name in test['params'])
+    for test in functions + params:
+        test.moduleFixtures = entry['fixtures']
+    cases = []
+    for name, info in entry['classes']:
+        namespace = dict((key, value)
+                         for key, value in info['attributes'].items()
+                         if not key.startswith('__') or key == '__test__')
+        namespace.update(__module__=module, moduleFixtures=entry['fixtures'])
+        if info['fixtures']:
+            namespace['setUpClass'] = classmethod(_noop)
+        names = []
+        for test in info['tests']:
+            for testName in test['params'] or [test['name']]:
+                namespace[testName] = _standIn(testName, test)
+                names.append(testName)
+        cls = type(str(name), (unittest.TestCase,), namespace)
+        names.sort(key=loader.sortTestMethodsUsing)
+        cases.append(loader.suiteClass([cls(n) for n in names]))
+    return loader.suiteClass(functions + cases + params)
+
+
+class _Indexer(object):
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.dynamic = None
+        self.fixtures = False
+        self.unittest = set()
+        self.testCases = set()
+        self.classes = {}
+        self.functions = {}
+        self.generators = []
+
+    def index(self, tree):
+        self._module(tree.body)
+        classes = sorted((name, info) for name, info in self.classes.items()
+                         if info['testcase'])
+        for name, info in classes:
+            self._dynamic(info['dynamic'])
+        return {
+            'dynamic': self.dynamic,
+            'fixtures': self.fixtures,
+            'classes': [
+                (name, {'attributes': info['attributes'],
+                        'fixtures': info['fixtures'],
+                        'tests': [test for n, test in
+                                  sorted(info['tests'].items())]})
+                for name, info in classes],
+            'functions': [
+                test for name, test in sorted(self.functions.items())
+                if test.pop('args') == 0 or test['params'] is not None],
+            'generators': self.generators,
+        }
+
+    def _dynamic(self, reason, node=None):
+        if self.dynamic is None and reason is not None:
+            if node is not None:
+                reason = 'line %s: %s' % (node.lineno, reason)
+            self.dynamic = reason
+
+    def _module(self, body, conditional=False):
+        for node in body:
+            self._check(node)
+            if isinstance(node, (ast.Import, ast.ImportFrom)):
+                self._import(node)
+            elif isinstance(node, _FUNCTIONS):
+                self._function(node, conditional)
+            elif isinstance(node, ast.ClassDef):
+                self._class(node, conditional)
+            elif isinstance(node, (ast.Assign, ast.AugAssign)) or (
+                    type(node).__name__ == 'AnnAssign'):
+                self._assign(node, self.functions)
+            elif isinstance(node, ast.Delete):
+                for target in node.targets:
+                    for name in _names(target):
+                        self._unbind(name)
+            elif isinstance(node, ast.If) and _isMain(node):
+                continue
+            elif not isinstance(node, (ast.Expr, ast.Pass)):
+                for field in ('body', 'orelse', 'finalbody'):
+                    self._module(getattr(node, field, []), True)
+                for clause in (getattr(node, 'handlers', []) +
+                               getattr(node, 'cases', [])):
+                    self._module(clause.body, True)
+
+    def _check(self, node):
+        # look for code that may add tests to the module when it runs
+        for child in _walk(node):
+            if isinstance(child, ast.Name) and child.id in _DYNAMIC_NAMES:
+                self._dynamic('uses %s' % child.id, child)
+            elif isinstance(child, ast.Attribute) and (
+                    child.attr == 'createTests'):
+                self._dynamic('creates tests', child)
+            elif type(child).__name__ == 'Exec':
+                self._dynamic('uses exec', child)
+
+    def _import(self, node):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.asname is None:
+                    name = alias.name.split('.')[0]
+                    if name in _UNITTEST:
+                        self.unittest.add(name)
+                elif alias.name in _UNITTEST:
+                    self.unittest.add(alias.asname)
+            return
+        module = (node.module or '').split('.')[0]
+        known = not node.level and (
+            module in _KNOWN_MODULES or
+            module in sys.builtin_module_names or
+            module in getattr(sys, 'stdlib_module_names', ()))
+        for alias in node.names:
+            name = alias.asname or alias.name
+            if alias.name == '*':
+                self._dynamic('imports * from %s' % node.module, node)
+            elif module in _UNITTEST and not node.level:
+                if alias.name in _TESTCASES:
+                    self.testCases.add(name)
+            elif name.lower().startswith(self.prefix) or (
+                    name[:1].isupper() and not known):
+                self._dynamic('imports %s' % name, node)
+
+    def _function(self, node, conditional):
+        name = node.name
+        if name in ('setUpModule', 'tearDownModule'):
+            self.fixtures = True
+            return
+        elif name == 'load_tests':
+            self._dynamic('defines load_tests', node)
+            return
+        elif not name.startswith(self.prefix):
+            return
+        if conditional:
+            self._dynamic('defines %s conditionally' % name, node)
+        self.functions[name] = self._test(node)
+
+    def _class(self, node, conditional):
+        name = node.name
+        bases = [self._base(base) for base in node.bases]
+        if None in bases or getattr(node, 'keywords', None):
+            self._dynamic('class %s has unknown bases' % name, node)
+            return
+        info = {'testcase': False, 'attributes': {}, 'fixtures': False,
+                'tests': {}, 'runTest': None, 'dynamic': None}
+        outer, self.dynamic = self.dynamic, None
+        for base in reversed(bases):
+            if base == 'testcase':
+                info['testcase'] = True
+            elif isinstance(base, dict):
+                info['testcase'] = info['testcase'] or base['testcase']
+                info['attributes'].update(base['attributes'])
+                info['tests'].update(base['tests'])
+                info['fixtures'] = info['fixtures'] or base['fixtures']
+                info['runTest'] = base['runTest'] or info['runTest']
+                self._dynamic(base['dynamic'])
+        for decorator in node.decorator_list:
+            self._decorator(decorator, info['attributes'])
+        self._classBody(node, info)
+        if not info['tests'] and info['runTest'] is not None:
+            info['tests'] = {'runTest': info['runTest']}
+        info['dynamic'], self.dynamic = self.dynamic, outer
+        if not info['testcase'] and name.lower().startswith(self.prefix):
+            self._dynamic('test class %s' % name, node)
+        elif info['testcase'] and conditional:
+            self._dynamic('defines %s conditionally' % name, node)
+        self.classes[name] = info
+
+    def _classBody(self, node, info):
+        for stmt in node.body:
+            if isinstance(stmt, _FUNCTIONS):
+                if stmt.name in ('setUpClass', 'tearDownClass'):
+                    info['fixtures'] = True
+                elif stmt.name == 'sortTestMethodsUsing':
+                    self._dynamic('sorts its own tests', stmt)
+                elif stmt.name == 'runTest':
+                    info['runTest'] = self._test(stmt, method=True)
+                elif stmt.name.startswith(self.prefix):
+                    info['tests'][stmt.name] = self._test(stmt, method=True)
+            elif isinstance(stmt, ast.Assign):
+                for target in stmt.targets:
+                    if isinstance(target, ast.Name):
+                        info['tests'].pop(target.id, None)
+                        info['attributes'][target.id] = self._literal(
+                            stmt.value, target.id)
+                self._assign(stmt, info['tests'])
+            elif not isinstance(stmt, (ast.Expr, ast.Pass, ast.ClassDef)):
+                self._dynamic('class %s changes at import' % node.name, stmt)
+
+    def _base(self, node):
+        # 'testcase', a class defined in the module, 'other' or None
+        if isinstance(node, ast.Name):
+            if node.id in self.testCases:
+                return 'testcase'
+            if node.id in self.classes:
+                return self.classes[node.id]
+            if hasattr(builtins, node.id):
+                return 'other'
+        elif (isinstance(node, ast.Attribute) and
+              isinstance(node.value, ast.Name) and
+              node.value.id in self.unittest and node.attr in _TESTCASES):
+            return 'testcase'
+
+    def _test(self, node, method=False):
+        test = {'name': node.name, 'attributes': {}, 'params': None,
+                'doc': ast.get_docstring(node)}
+        for decorator in node.decorator_list:
+            self._decorator(decorator, test['attributes'], test)
+        if any(isinstance(child, _YIELDS)
+               for child in _walk(node, body=True)):
+            self.generators.append(node.name)
+            self._dynamic('generator test %s' % node.name, node)
+        if not isinstance(node, ast.FunctionDef) and test['attributes']:
+            self._dynamic('coroutine test %s has attributes' % node.name, node)
+        if not method:
+            args = node.args
+            test['args'] = (len(getattr(args, 'posonlyargs', [])) +
+                            len(args.args))
+        return test
+
+    def _decorator(self, node, attributes, test=None):
+        call = node if isinstance(node, ast.Call) else None
+        target = call.func if call is not None else node
+        name = getattr(target, 'id', getattr(target, 'attr', None))
+        if name not in _DECORATORS:
+            self._dynamic(
+                'decorated with %s' % (name or 'an expression'), node)
+        elif name in ('attr', 'cartesian_params', 'params') and call is None:
+            self._dynamic('decorated with %s' % name, node)
+        elif name == 'attr':
+            for arg in call.args:
+                key = self._literal(arg)
+                if not isinstance(key, six.string_types):
+                    self._dynamic('attribute name is not a string', node)
+                    continue
+                attributes[key] = True
+            for keyword in call.keywords:
+                attributes[keyword.arg] = self._literal(keyword.value)
+        elif name in ('params', 'cartesian_params') and test is not None:
+            paramList = [self._literal(arg) for arg in call.args]
+            if name == 'cartesian_params' and self.dynamic is None:
+                paramList = list(itertools.product(*paramList))
+            self._params(test, paramList)
+
+    def _assign(self, node, scope):
+        targets = getattr(node, 'targets', None) or [node.target]
+        value = node.value
+        for target in targets:
+            if isinstance(target, ast.Attribute) and (
+                    isinstance(target.value, ast.Name) and
+                    target.value.id in scope):
+                self._setAttribute(scope[target.value.id], target.attr, value)
+            elif scope is self.functions:
+                for name in _names(target):
+                    self._unbind(name)
+                    if value is not None and (
+                            name == '__test__' or
+                            name.lower().startswith(self.prefix) or
+                            name[:1].isupper()):
+                        self._literal(value, name)
+
+    def _unbind(self, name):
+        self.functions.pop(name, None)
+        self.classes.pop(name, None)
+
+    def _setAttribute(self, test, attr, value):
+        if attr in _FIXTURES:
+            return
+        if attr == 'paramList':
+            self._params(test, self._literal(value, attr))
+        elif attr == 'testGenerator':
+            self.generators.append(test['name'])
+            self._dynamic('generator test %s' % test['name'], value)
+        else:
+            test['attributes'][attr] = self._literal(value, attr)
+
+    def _params(self, test, paramList):
+        if self.dynamic is not None or paramList is None:
+            return
+        test['params'] = [
+            util.name_from_args(test['name'], index, argSet)
+            for index, argSet in enumerate(
+                arg if isinstance(arg, tuple) else (arg,)
+                for arg in paramList)]
+
+    def _literal(self, node, name=None):
+        try:
+            value = ast.literal_eval(node)
+            json.dumps(value)
+        except (TypeError, ValueError):
+            self._dynamic('%s is not a literal' % (name or 'value'), node)
+            return None
+        return value
+
+
+def _walk(node, body=False):
+    # the nodes under node that run when it does: only the decorators and
+    # defaults of functions, unless body is set for the function node
+    if isinstance(node, _FUNCTIONS + (ast.Lambda,)) and not body:
+        children = list(getattr(node, 'decorator_list', []))
+        children.extend(node.args.defaults)
+    else:
+        children = ast.iter_child_nodes(node)
+    for child in children:
+        yield child
+        for grandchild in _walk(child):
+            yield grandchild
+
+
+def _names(target):
+    if isinstance(target, ast.Name):
+        return [target.id]
+    if isinstance(target, (ast.Tuple, ast.List)):
+        return [name for elt in target.elts for name in _names(elt)]
+    return []
+
+
+def _isMain(node):
+    test = node.test
+    return (isinstance(test, ast.Compare) and
+            isinstance(test.left, ast.Name) and test.left.id == '__name__')
+
+
+def _standIn(name, test):
+    # a function that stands in for test
+    def func(*args):
+        pass
+    func.__name__ = str(name)
+    func.__doc__ = test['doc']
+    func.__dict__.update(test['attributes'])
+    return func
+
+
+def _noop(*args):
+    pass
@@ -0,0 +1,230 @@
+"""
+Run tests concurrently in a pool of threads.
+
+For suites that spend most of their time waiting -- on sockets,
+subprocesses or other services -- running tests in threads can be
+nearly as fast as running them in several processes, without the cost
+of starting processes, and without needing tests and plugins to be
+sent to them.
+
+Enable the plugin and set the number of threads with the
+:option:`--threads` option::
+
+  nose2 --plugin=nose2.plugins.threads --threads 8
+
+or in a config file::
+
+  [unittest]
+  plugins = nose2.plugins.threads
+
+  [threads]
+  always-on = True
+  threads = 8
+
+Tests that share fixtures run together, one after another, in a
+single thread: all of the tests in a module that defines
+``setUpModule`` or ``tearDownModule``, all of the tests in a class
+that defines ``setUpClass`` or ``tearDownClass``, and all of the tests
+in a :doc:`layer <layers>`. Other tests may run at the same time as
+any other test, so they must not depend on global state that other
+tests change.
+
+Results are reported as each test finishes. The output buffered by the
+:doc:`buffer <buffer>` plugin and the log messages captured by the
+:doc:`logcapture <logcapture>` plugin are kept separate for each
+thread, so each test gets only its own.
+
+This plugin and the :doc:`mp <mp>` plugin both take over running the
+tests, so only one of them can be used in a test run.
+
+"""
+import collections
+import logging
+import threading
+import unittest
+
+import six
+from six.moves import queue
+
+from nose2 import events, util
+from nose2.suite import LayerSuite
+
+log = logging.getLogger(__name__)
+__unittest = True
+
+
+class ThreadPool(events.Plugin):
+
+    """Run tests in a pool of threads"""
+
+    configSection = 'threads'
+
+    def __init__(self):
+        self.addArgument(self.setThreads, None, 'threads',
+                         'Number of threads to run tests in')
+        self.threads = self.config.as_int('threads', 4)
+        self._local = threading.local()
+
+    def setThreads(self, num):
+        self.threads = int(num[0])
+        self.register()
+
+    def pluginsLoaded(self, event):
+        self.addMethods('startThreadPool', 'stopThreadPool')
+
+    def startTestRun(self, event):
+        """Run tests in threads"""
+        event.executeTests = self._runThreaded
+
+    def beforeInteraction(self, event):
+        # prevent interactive plugins from running
+        event.handled = True
+        return False
+
+    def reportStartTest(self, event):
+        """Hold report output until the test finishes"""
+        self._holdReport(event)
+
+    def reportSuccess(self, event):
+        self._holdReport(event)
+
+    def reportError(self, event):
+        self._holdReport(event)
+
+    def reportFailure(self, event):
+        self._holdReport(event)
+
+    def reportSkip(self, event):
+        self._holdReport(event)
+
+    def reportExpectedFailure(self, event):
+        self._holdReport(event)
+
+    def reportUnexpectedSuccess(self, event):
+        self._holdReport(event)
+
+    def reportOtherOutcome(self, event):
+        self._holdReport(event)
+
+    def stopTest(self, event):
+        """Write out the report of the test that finished"""
+        self._releaseReport()
+
+    def _runThreaded(self, test, result):
+        tasks = list(self._tasks(test))
+        count = max(min(self.threads, len(tasks)), 1)
+        pending = queue.Queue()
+        for task in tasks:
+            pending.put(task)
+        event = ThreadPoolEvent(count)
+        self.session.hooks.startThreadPool(event)
+        log.debug("Running %s tasks in %s threads", len(tasks), count)
+        try:
+            threads = [
+                threading.Thread(target=self._work, args=(pending, result),
+                                 name='nose2-test-%s' % (i + 1))
+                for i in range(count)]
+            for thread in threads:
+                # don't let a hung test keep the test run from exiting
+                thread.daemon = True
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            self.session.hooks.stopThreadPool(event)
+
+    def _work(self, pending, result):
+        self._local.report = util._WritelnDecorator(six.StringIO())
+        self._local.stream = None
+        while not result.shouldStop:
+            try:
+                task = pending.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                task(TaskResult(result))
+            except Exception:
+                log.exception("Error running %s", task)
+            finally:
+                # fixture errors are reported outside of any test
+                self._releaseReport()
+
+    def _tasks(self, suite):
+        """Split ``suite`` into suites that can run at the same time"""
+        groups = {}
+        stack = collections.deque([suite])
+        while stack:
+            suite = stack.popleft()
+            for test in suite:
+                if isinstance(test, LayerSuite) and test.layer is not None:
+                    # layers handle their own fixtures
+                    yield test
+                elif isinstance(test, unittest.TestSuite):
+                    stack.append(test)
+                else:
+                    group = util.fixture_group(test)
+                    if group is None:
+                        yield self.session.testLoader.suiteClass([test])
+                    else:
+                        groups.setdefault(group, []).append(test)
+        for group in sorted(groups):
+            yield self.session.testLoader.suiteClass(groups[group])
+
+    def _holdReport(self, event):
+        # in a test thread, report output waits in the thread's buffer
+        report = getattr(self._local, 'report', None)
+        if report is None:
+            return
+        if self._local.stream is None:
+            self._local.stream = event.stream
+        event.stream = report
+
+    def _releaseReport(self):
+        report = getattr(self._local, 'report', None)
+        if report is None or self._local.stream is None:
+            return
+        output = report.getvalue()
+        if output:
+            report.truncate(0)
+            report.seek(0)
+            self._local.stream.write(output)
+            self._local.stream.flush()
+
+
+class TaskResult(object):
+
+    """The test result, as seen by the tests of one task.
+
+    Outcomes go to the shared test result, but the state unittest keeps
+    on the result to manage class and module fixtures is kept here, so
+    that tasks running at the same time don't see each other's.
+
+    """
+
+    def __init__(self, result):
+        self.result = result
+        self._testRunEntered = False
+        self._previousTestClass = None
+        self._moduleSetUpFailed = False
+
+    def __getattr__(self, attr):
+        return getattr(self.result, attr)
+
+
+class ThreadPoolEvent(events.Event):
+
+    """Event fired before and after tests are run in threads.
+
+    Plugins that keep state for the test that is running, like captured
+    output, should keep it for each thread between these events.
+
+    .. attribute :: threads
+
+       The number of threads tests are run in
+
+    """
+    _attrs = events.Event._attrs + ('threads',)
+
+    def __init__(self, threads, **kw):
+        self.threads = threads
+        super(ThreadPoolEvent, self).__init__(**kw)
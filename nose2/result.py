@@ -1,3 +1,4 @@
+import threading
 import time
 
 from nose2 import events
@@ -24,11 +25,15 @@ class PluggableTestResult(object):
 
        When ``True``, test run should stop before running another test.
 
+    Results may be reported from several threads at once; each is
+    handled in turn, hooks and all.
+
     """
 
     def __init__(self, session):
         self.session = session
         self.shouldStop = False
+        self._lock = threading.RLock()
 
     def startTest(self, test):
         """Start a test case.
@@ -36,8 +41,10 @@ class PluggableTestResult(object):
         Fires :func:`startTest` hook.
 
         """
-        event = events.StartTestEvent(test, self, time.time())
-        self.session.hooks.startTest(event)
+        with self._lock:
+            hook = self.session.hooks.startTest
+            if hook.isActive():
+                hook(events.StartTestEvent(test, self, time.time()))
 
     def stopTest(self, test):
         """Stop a test case.
@@ -45,8 +52,10 @@ class PluggableTestResult(object):
         Fires :func:`stopTest` hook.
 
         """
-        event = events.StopTestEvent(test, self, time.time())
-        self.session.hooks.stopTest(event)
+        with self._lock:
+            hook = self.session.hooks.stopTest
+            if hook.isActive():
+                hook(events.StopTestEvent(test, self, time.time()))
 
     def addError(self, test, err):
         """Test case resulted in error.
@@ -54,9 +63,7 @@ class PluggableTestResult(object):
         Fires :func:`setTestOutcome` and :func:`testOutcome` hooks.
 
         """
-        event = events.TestOutcomeEvent(test, self, ERROR, err)
-        self.session.hooks.setTestOutcome(event)
-        self.session.hooks.testOutcome(event)
+        self._outcome(test, ERROR, err)
 
     def addFailure(self, test, err):
         """Test case resulted in failure.
@@ -64,9 +71,7 @@ class PluggableTestResult(object):
         Fires :func:`setTestOutcome` and :func:`testOutcome` hooks.
 
         """
-        event = events.TestOutcomeEvent(test, self, FAIL, err)
-        self.session.hooks.setTestOutcome(event)
-        self.session.hooks.testOutcome(event)
+        self._outcome(test, FAIL, err)
 
     def addSuccess(self, test):
         """Test case resulted in success.
@@ -74,9 +79,7 @@ class PluggableTestResult(object):
         Fires :func:`setTestOutcome` and :func:`testOutcome` hooks.
 
         """
-        event = events.TestOutcomeEvent(test, self, PASS, expected=True)
-        self.session.hooks.setTestOutcome(event)
-        self.session.hooks.testOutcome(event)
+        self._outcome(test, PASS, expected=True)
 
     def addSkip(self, test, reason):
         """Test case was skipped.
@@ -84,9 +87,7 @@ class PluggableTestResult(object):
         Fires :func:`setTestOutcome` and :func:`testOutcome` hooks.
 
         """
-        event = events.TestOutcomeEvent(test, self, SKIP, reason=reason)
-        self.session.hooks.setTestOutcome(event)
-        self.session.hooks.testOutcome(event)
+        self._outcome(test, SKIP, reason=reason)
 
     def addExpectedFailure(self, test, err):
         """Test case resulted in expected failure.
@@ -94,9 +95,7 @@ class PluggableTestResult(object):
         Fires :func:`setTestOutcome` and :func:`testOutcome` hooks.
 
         """
-        event = events.TestOutcomeEvent(test, self, FAIL, err, expected=True)
-        self.session.hooks.setTestOutcome(event)
-        self.session.hooks.testOutcome(event)
+        self._outcome(test, FAIL, err, expected=True)
 
     def addUnexpectedSuccess(self, test):
         """Test case resulted in unexpected success.
@@ -104,9 +103,7 @@ class PluggableTestResult(object):
         Fires :func:`setTestOutcome` and :func:`testOutcome` hooks.
 
         """
-        event = events.TestOutcomeEvent(test, self, PASS)
-        self.session.hooks.setTestOutcome(event)
-        self.session.hooks.testOutcome(event)
+        self._outcome(test, PASS)
 
     def wasSuccessful(self):
         """Was test run successful?
@@ -130,9 +127,21 @@ class PluggableTestResult(object):
         ``event.shouldStop``.
 
         """
-        event = events.ResultStopEvent(self, True)
-        self.session.hooks.resultStop(event)
-        self.shouldStop = event.shouldStop
+        with self._lock:
+            event = events.ResultStopEvent(self, True)
+            self.session.hooks.resultStop(event)
+            self.shouldStop = event.shouldStop
+
+    def _outcome(self, test, outcome, exc_info=None, **kw):
+        # fire setTestOutcome and testOutcome, if any plugin listens
+        with self._lock:
+            setTestOutcome = self.session.hooks.setTestOutcome
+            testOutcome = self.session.hooks.testOutcome
+            if setTestOutcome.isActive() or testOutcome.isActive():
+                event = events.TestOutcomeEvent(
+                    test, self, outcome, exc_info, **kw)
+                setTestOutcome(event)
+                testOutcome(event)
 
     def __repr__(self):
         return '<%s>' % self.__class__.__name__
@@ -9,6 +9,71 @@ log = logging.getLogger(__name__)
 
 __unittest = True
 
+#
+# Lazy suite class
+#
+
+
+class LazySuite(unittest.TestSuite):
+
+    """Test suite that loads its tests as it runs them.
+
+    ``tests`` may be a generator, which is only advanced as the suite is
+    iterated, so the first tests can run before the rest are loaded.
+    Anything that uses the suite's list of tests directly, or counts them,
+    loads all of them first.
+
+    """
+
+    def __init__(self, tests=()):
+        super(LazySuite, self).__init__()
+        self._pending = iter(tests)
+        self._filters = []
+
+    @property
+    def _tests(self):
+        for test in self._loadedTests():
+            pass
+        return self._loaded
+
+    @_tests.setter
+    def _tests(self, tests):
+        self._loaded = list(tests)
+
+    def __iter__(self):
+        return self._loadedTests()
+
+    def filter(self, keep):
+        """Keep only the tests for which ``keep(test)`` is true.
+
+        Tests already loaded are filtered now, and the rest as they are
+        loaded.
+
+        """
+        self._loaded = [test for test in self._loaded if keep(test)]
+        self._filters.append(keep)
+
+    def _loadedTests(self):
+        index = 0
+        while index < len(self._loaded) or self._loadNext():
+            yield self._loaded[index]
+            index += 1
+
+    def _loadNext(self):
+        for test in self._pending:
+            if all(keep(test) for keep in self._filters):
+                self._loaded.append(test)
+                return True
+        return False
+
+    def _removeTestAtIndex(self, index):
+        # as unittest does after running a test, without loading the rest
+        test = self._loaded[index]
+        if hasattr(test, 'countTestCases'):
+            self._removed_tests += test.countTestCases()
+        self._loaded[index] = None
+
+
 #
 # Layer suite class
 #
@@ -0,0 +1,58 @@
+import asyncio
+import time
+import unittest
+
+
+START = time.time()
+
+
+async def test_sleep():
+    await asyncio.sleep(0.2)
+
+
+async def test_sleep_again():
+    await asyncio.sleep(0.2)
+
+
+async def test_fail():
+    await asyncio.sleep(0)
+    assert False, 'coroutine failed'
+
+
+async def test_loop_is_current():
+    assert asyncio.get_event_loop() is asyncio.get_running_loop()
+
+
+def test_plain():
+    pass
+
+
+class Test(unittest.TestCase):
+
+    async def test_sleep(self):
+        await asyncio.sleep(0.2)
+
+    async def test_error(self):
+        raise TypeError('coroutine error')
+
+    def test_plain(self):
+        pass
+
+
+class TestWithFixtures(unittest.TestCase):
+
+    def setUp(self):
+        self.value = 1
+
+    async def test_value(self):
+        await asyncio.sleep(0)
+        self.assertEqual(self.value, 1)
+
+
+class TestClass(object):
+
+    async def test_sleep(self):
+        await asyncio.sleep(0.2)
+
+    async def test_skip(self):
+        raise unittest.SkipTest('coroutine skipped')
@@ -0,0 +1,5 @@
+import profiled_helper
+
+
+def test_uses_helper():
+    assert profiled_helper.VALUE
@@ -0,0 +1,6 @@
+import sys
+
+
+def test_large_output():
+    sys.stdout.write('start of output\n' + 'x' * 100000 + '\nend of output\n')
+    assert False, 'failed after writing a lot'
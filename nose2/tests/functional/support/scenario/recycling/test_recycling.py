@@ -0,0 +1,10 @@
+import unittest
+
+
+class Test(unittest.TestCase):
+
+    def test_a(self):
+        pass
+
+    def test_b(self):
+        pass
@@ -0,0 +1,7 @@
+def test_gen():
+    for i in range(2):
+        yield check, i
+
+
+def check(i):
+    pass
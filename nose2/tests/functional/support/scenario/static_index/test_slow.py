@@ -0,0 +1,8 @@
+import unittest
+
+
+class Test(unittest.TestCase):
+
+    def test_slow(self):
+        pass
+    test_slow.slow = True
@@ -0,0 +1,42 @@
+import unittest
+
+from nose2.tools import cartesian_params, params
+
+
+def setUpModule():
+    pass
+
+
+class Base(unittest.TestCase):
+    tags = ['base']
+
+    def test_inherited(self):
+        """Inherited test"""
+
+
+class Test(Base):
+
+    def test_fast(self):
+        pass
+    test_fast.fast = True
+
+    @params(1, (2, 3))
+    def test_params(self, a, b=None):
+        pass
+
+    def helper(self):
+        pass
+
+
+def test_func():
+    pass
+test_func.fast = True
+
+
+@cartesian_params((1, 2), ('a',))
+def test_cartesian(num, char):
+    pass
+
+
+def test_with_arg(arg):
+    pass
@@ -0,0 +1,18 @@
+import os
+import unittest
+
+
+class Test(unittest.TestCase):
+
+    def test_1_crash(self):
+        # die without reporting back, as a crashing C extension would
+        os._exit(3)
+
+    def test_2(self):
+        pass
+
+    def test_3(self):
+        pass
+
+    def test_4(self):
+        pass
@@ -0,0 +1,18 @@
+import os
+import unittest
+
+
+class Test(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    def test_1(self):
+        pass
+
+    def test_2(self):
+        pass
+
+    def test_3_crash(self):
+        os._exit(3)
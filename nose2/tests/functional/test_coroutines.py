@@ -0,0 +1,31 @@
+import sys
+import unittest
+
+from nose2.tests._common import FunctionalTestCase, support_file
+
+
+@unittest.skipIf(sys.version_info < (3, 7), 'scenario needs python 3.7')
+class TestCoroutines(FunctionalTestCase):
+
+    def test_runs_coroutine_tests(self):
+        proc = self.runIn('scenario/coroutines', '-v')
+        self.assertTestRunOutputMatches(proc, stderr='Ran 11 tests')
+        self.assertTestRunOutputMatches(
+            proc, stderr=r'FAILED \(failures=1, errors=1, skipped=1\)')
+        self.assertTestRunOutputMatches(proc, stderr='coroutine failed')
+        self.assertTestRunOutputMatches(proc, stderr='coroutine error')
+
+    def test_runs_coroutine_tests_at_the_same_time(self):
+        proc = self.runIn(
+            'scenario/coroutines', '-v',
+            '--config=%s' % support_file('cfg', 'coroutines.cfg'))
+        self.assertTestRunOutputMatches(proc, stderr='Ran 11 tests')
+        self.assertTestRunOutputMatches(
+            proc, stderr=r'FAILED \(failures=1, errors=1, skipped=1\)')
+
+    def test_runs_coroutine_test_by_name(self):
+        proc = self.runIn(
+            'scenario/coroutines', '-v',
+            'test_coroutines.test_sleep', 'test_coroutines.Test.test_sleep')
+        self.assertTestRunOutputMatches(proc, stderr='Ran 2 tests')
+        self.assertTestRunOutputMatches(proc, stderr='OK')
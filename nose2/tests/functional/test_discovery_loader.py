@@ -74,3 +74,22 @@ class DiscoveryFunctionalTest(FunctionalTestCase):
         assert isinstance(result, self.loader.suiteClass)
         self.assertEqual(len(result._tests), 2)
         self.assertEqual(len(self.watcher.called), 1)
+
+
+class LazyDiscoveryTest(FunctionalTestCase):
+
+    def test_lazy_discovery_runs_the_same_tests(self):
+        proc = self.runIn('scenario/tests_in_package', '-v',
+                          '--lazy-discovery')
+        self.assertTestRunOutputMatches(proc, stderr='Ran 25 tests')
+
+    def test_lazy_discovery_runs_module_fixtures(self):
+        proc = self.runIn('scenario/module_fixtures', '-v',
+                          '--lazy-discovery')
+        self.assertTestRunOutputMatches(proc, stderr='Ran 5 tests')
+        self.assertTestRunOutputMatches(proc, stderr='OK')
+
+    def test_lazy_discovery_skips_dunder_test_false(self):
+        proc = self.runIn('scenario/dundertest_attribute', '-v',
+                          '--lazy-discovery')
+        self.assertTestRunOutputMatches(proc, stderr='Ran 0 tests')
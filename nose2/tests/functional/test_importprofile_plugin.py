@@ -0,0 +1,42 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+from nose2.tests._common import FunctionalTestCase
+
+
+class TestImportProfilePlugin(FunctionalTestCase):
+
+    def setUp(self):
+        super(TestImportProfilePlugin, self).setUp()
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir)
+        self.reportFile = os.path.join(workdir, 'profile.json')
+        self.cfg = os.path.join(workdir, 'profile.cfg')
+        with open(self.cfg, 'w') as fh:
+            fh.write('[import-profile]\nreport-file = %s\n' % self.reportFile)
+        for name in ('test_profiled', 'test_plain', 'profiled_helper'):
+            sys.modules.pop(name, None)
+            self.addCleanup(sys.modules.pop, name, None)
+
+    def test_reports_test_module_imports(self):
+        proc = self.runIn(
+            'scenario/import_profile', '-v', '--config=%s' % self.cfg,
+            '--plugin=nose2.plugins.importprofile', '--import-profile')
+        self.assertTestRunOutputMatches(proc, stderr='Ran 2 tests')
+        self.assertTestRunOutputMatches(
+            proc, stderr='Slowest test module imports')
+        self.assertTestRunOutputMatches(
+            proc, stderr=r'\d+\.\d+s\s+test_profiled\n\s+\d+\.\d+s\s+'
+            'profiled_helper\n')
+        self.assertTestRunOutputMatches(
+            proc, stderr='2 test modules imported in')
+        with open(self.reportFile) as fh:
+            report = json.load(fh)
+        self.assertEqual(sorted(report['modules']),
+                         ['test_plain', 'test_profiled'])
+        self.assertEqual(
+            list(report['modules']['test_profiled']['imports']),
+            ['profiled_helper'])
@@ -1,8 +1,16 @@
+import errno
+import json
+import os
+import re
+import shutil
+import socket
+import subprocess
 import sys
+import tempfile
 
-from nose2 import session
+from nose2 import session, util
 from nose2.plugins.mp import MultiProcess, procserver
-from nose2.plugins import buffer
+from nose2.plugins import buffer, mp
 from nose2.plugins.loader import discovery, testcases
 from nose2.tests._common import FunctionalTestCase, support_file, Conn
 from six.moves import queue
@@ -164,6 +172,130 @@ class TestProcserver(FunctionalTestCase):
                 for attr, val in exp_attr.items():
                     self.assertEqual(getattr(event, attr), val)
 
+    def test_dispatch_tests_from_suite_cache(self):
+        ssn = {
+            'config': self.session.config,
+            'verbosity': 1,
+            'startDir': support_file('scenario/tests_in_package'),
+            'topLevelDir': support_file('scenario/tests_in_package'),
+            'logLevel': 100,
+            'cacheSuites': True,
+            'pluginClasses': [discovery.DiscoveryLoader,
+                              testcases.TestCaseLoader]
+        }
+        conn = Conn(['pkg1.test.test_things.SomeTests.test_ok',
+                     'pkg1.test.test_things.SomeTests.test_failed',
+                     'pkg1.test.test_things.SomeTests'])
+        procserver(ssn, conn)
+
+        self.assertEqual(conn.sent[-1], None)
+        results = dict(conn.sent[:-1])
+        outcomes = [(util.test_name(event.test), event.outcome)
+                    for hook, event in
+                    results['pkg1.test.test_things.SomeTests.test_failed']
+                    if hook == 'testOutcome']
+        self.assertEqual(
+            outcomes,
+            [('pkg1.test.test_things.SomeTests.test_failed', 'failed')])
+        started = [util.test_name(event.test) for hook, event in
+                   results['pkg1.test.test_things.SomeTests']
+                   if hook == 'startTest']
+        self.assertIn('pkg1.test.test_things.SomeTests.test_ok', started)
+        self.assertIn('pkg1.test.test_things.SomeTests.test_failed', started)
+        self.assertEqual(len(started), len(set(started)))
+        self.assertTrue(all(
+            testid.startswith('pkg1.test.test_things.SomeTests.')
+            for testid in started))
+
+    def test_worker_recycles_after_max_tests(self):
+        ssn = {
+            'config': self.session.config,
+            'verbosity': 1,
+            'startDir': support_file('scenario/tests_in_package'),
+            'topLevelDir': support_file('scenario/tests_in_package'),
+            'logLevel': 100,
+            'sendStats': True,
+            'maxTestsPerWorker': 1,
+            'pluginClasses': [discovery.DiscoveryLoader,
+                              testcases.TestCaseLoader]
+        }
+        conn = Conn(['pkg1.test.test_things.SomeTests.test_ok',
+                     'pkg1.test.test_things.SomeTests.test_failed'])
+        procserver(ssn, conn)
+
+        self.assertEqual(len(conn.sent), 3)
+        self.assertEqual(conn.sent[0][0],
+                         'pkg1.test.test_things.SomeTests.test_ok')
+        stats = conn.sent[1]
+        self.assertEqual(stats['tests'], 1)
+        self.assertEqual(stats['recycle'], 'ran 1 tests')
+        self.assertEqual(conn.sent[2], None)
+
+    def test_group_results_are_streamed(self):
+        ssn = {
+            'config': self.session.config,
+            'verbosity': 1,
+            'startDir': support_file('scenario/tests_in_package'),
+            'topLevelDir': support_file('scenario/tests_in_package'),
+            'logLevel': 100,
+            'compactEvents': True,
+            'streamBatchSize': 1,
+            'pluginClasses': [discovery.DiscoveryLoader,
+                              testcases.TestCaseLoader]
+        }
+        conn = Conn(['pkg1.test.test_things.SomeTests'])
+        procserver(ssn, conn)
+
+        self.assertEqual(conn.sent[-1], None)
+        messages = conn.sent[:-1]
+        self.assertTrue(len(messages) > 2)
+        self.assertEqual([done for _, _, _, done in messages],
+                         [False] * (len(messages) - 1) + [True])
+        for version, testid, encoded, done in messages[:-1]:
+            self.assertEqual(testid, 'pkg1.test.test_things.SomeTests')
+            hooks = [hook for hook, _ in encoded]
+            self.assertEqual(hooks[-1], 'stopTest')
+            self.assertEqual(hooks.count('startTest'), 1)
+
+    def test_single_test_results_are_not_streamed(self):
+        ssn = {
+            'config': self.session.config,
+            'verbosity': 1,
+            'startDir': support_file('scenario/tests_in_package'),
+            'topLevelDir': support_file('scenario/tests_in_package'),
+            'logLevel': 100,
+            'compactEvents': True,
+            'streamBatchSize': 1,
+            'pluginClasses': [discovery.DiscoveryLoader,
+                              testcases.TestCaseLoader]
+        }
+        conn = Conn(['pkg1.test.test_things.SomeTests.test_ok'])
+        procserver(ssn, conn)
+
+        self.assertEqual(conn.sent[-1], None)
+        self.assertEqual([done for _, _, _, done in conn.sent[:-1]],
+                         [True])
+
+    def test_replicated_group_share_runs_fixtures(self):
+        ssn = {
+            'config': self.session.config,
+            'verbosity': 1,
+            'startDir': support_file('scenario/module_fixtures'),
+            'topLevelDir': support_file('scenario/module_fixtures'),
+            'logLevel': 100,
+            'pluginClasses': [discovery.DiscoveryLoader,
+                              testcases.TestCaseLoader]
+        }
+        conn = Conn([('test_mf_testcase#2', ['test_mf_testcase.Test.test_2'],
+                      ())])
+        procserver(ssn, conn)
+
+        self.assertEqual(conn.sent[-1], None)
+        testid, events = conn.sent[0]
+        self.assertEqual(testid, 'test_mf_testcase#2')
+        self.assertEqual([event.outcome for hook, event in events
+                          if hook == 'testOutcome'], ['passed'])
+
 
 class MPPluginTestRuns(FunctionalTestCase):
 
@@ -224,6 +356,315 @@ class MPPluginTestRuns(FunctionalTestCase):
         self.assertTestRunOutputMatches(proc, stderr='Ran 600 tests')
         self.assertEqual(proc.poll(), 0)
 
+    def test_batched_dispatch_stresstest(self):
+        proc = self.runIn(
+            'scenario/many_tests_batched',
+            '-v',
+            '--plugin=nose2.plugins.mp',
+            '--plugin=nose2.plugins.loader.generators',
+            '-N=2')
+        self.assertTestRunOutputMatches(proc, stderr='Ran 600 tests')
+        self.assertEqual(proc.poll(), 0)
+
+    def test_suite_cache(self):
+        proc = self.runIn(
+            'scenario/tests_in_package',
+            '-v',
+            '--config=%s' % support_file('cfg', 'mp_cache_suites.cfg'),
+            '--plugin=nose2.plugins.mp',
+            '-N=2')
+        self.assertTestRunOutputMatches(proc, stderr='Ran 25 tests')
+        self.assertEqual(proc.poll(), 1)
+
+    @unittest.skipUnless(
+        'forkserver' in getattr(multiprocessing, 'get_all_start_methods',
+                                lambda: [])(),
+        'forkserver start method not available')
+    def test_forkserver_start_method(self):
+        proc = self.runIn(
+            'scenario/tests_in_package',
+            '-v',
+            '--config=%s' % support_file('cfg', 'mp_forkserver.cfg'),
+            '--plugin=nose2.plugins.mp',
+            '-N=2')
+        self.assertTestRunOutputMatches(proc, stderr='Ran 25 tests')
+        self.assertEqual(proc.poll(), 1)
+
+    def test_replicated_fixtures(self):
+        proc = self.runIn(
+            'scenario/module_fixtures',
+            '-v',
+            '--config=%s' % support_file('cfg', 'mp_replicate_fixtures.cfg'),
+            '--plugin=nose2.plugins.mp',
+            '-N=2')
+        self.assertTestRunOutputMatches(proc, stderr='Ran 5 tests')
+        self.assertEqual(proc.poll(), 0)
+
+    def test_layers(self):
+        proc = self.runIn(
+            'scenario/layers',
+            '-v',
+            '--plugin=nose2.plugins.layers',
+            '--plugin=nose2.plugins.mp',
+            '-N=2')
+        self.assertTestRunOutputMatches(proc, stderr='Ran 8 tests')
+        self.assertEqual(proc.poll(), 0)
+
+    def test_layers_with_such(self):
+        proc = self.runIn(
+            'scenario/layers_and_non_layers',
+            '-v',
+            '--plugin=nose2.plugins.layers',
+            '--plugin=nose2.plugins.mp',
+            '-N=2')
+        self.assertTestRunOutputMatches(proc, stderr='Ran 8 tests')
+        self.assertEqual(proc.poll(), 0)
+
+    def test_worker_crash(self):
+        proc = self.runIn(
+            'scenario/worker_crash',
+            '-v',
+            '--plugin=nose2.plugins.mp',
+            '-N=1')
+        self.assertTestRunOutputMatches(proc, stderr='Ran 4 tests')
+        self.assertTestRunOutputMatches(
+            proc, stderr='exited with exit code 3 while running '
+            'test_crash.Test.test_1_crash')
+        self.assertTestRunOutputMatches(proc, stderr='errors=1')
+        self.assertEqual(proc.poll(), 1)
+
+    def test_worker_recycling(self):
+        proc = self.runIn(
+            'scenario/tests_in_package',
+            '-v',
+            '--config=%s' % support_file('cfg', 'mp_recycle.cfg'),
+            '--plugin=nose2.plugins.mp',
+            '-N=2')
+        self.assertTestRunOutputMatches(proc, stderr='Ran 25 tests')
+        self.assertTestRunOutputMatches(proc, stderr=r'workers, \d+ recycled')
+        self.assertEqual(proc.poll(), 1)
+        # only workers replaced count as recycled, not the last ones
+        workers, recycled = re.search(r'(\d+) workers, (\d+) recycled',
+                                      proc.stderr.getvalue()).groups()
+        self.assertEqual(int(workers) - 2, int(recycled))
+
+    def test_last_worker_to_reach_max_tests_is_not_recycled(self):
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir)
+        cfg = os.path.join(workdir, 'recycle.cfg')
+        with open(cfg, 'w') as fh:
+            fh.write('[multiprocess]\nmax-tests-per-worker = 1\n')
+        proc = self.runIn(
+            'scenario/recycling',
+            '--config=%s' % cfg,
+            '--plugin=nose2.plugins.mp',
+            '-N=1')
+        self.assertTestRunOutputMatches(proc, stderr='Ran 2 tests')
+        # the first worker is replaced, the second just finishes
+        self.assertTestRunOutputMatches(
+            proc, stderr=r'2 workers, 1 recycled')
+        self.assertEqual(proc.poll(), 0)
+
+    def _runWithRemoteWorker(self, scenario, *args):
+        # run scenario with one remote worker; returns both processes
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir)
+        keyfile = os.path.join(workdir, 'authkey')
+        with open(keyfile, 'w') as fh:
+            fh.write('sekrit\n')
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        cfg = os.path.join(workdir, 'remote.cfg')
+        with open(cfg, 'w') as fh:
+            fh.write('[multiprocess]\n'
+                     'remote-workers = 1\n'
+                     'remote-address = 127.0.0.1:%s\n'
+                     'authkey-file = %s\n' % (port, keyfile))
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(
+            [os.path.dirname(os.path.dirname(util.__file__))] +
+            [p for p in [env.get('PYTHONPATH')] if p])
+        worker = subprocess.Popen(
+            [sys.executable, '-c',
+             'from nose2.plugins.mp import worker; worker()',
+             '127.0.0.1:%s' % port, '--authkey-file', keyfile],
+            env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        self.addCleanup(lambda: worker.poll() is None and worker.kill())
+        proc = self.runIn(
+            scenario,
+            '-v',
+            '--config=%s' % cfg,
+            '--plugin=nose2.plugins.mp',
+            '-N=0',
+            *args)
+        return proc, worker
+
+    def test_remote_worker(self):
+        proc, worker = self._runWithRemoteWorker('scenario/tests_in_package')
+        self.assertTestRunOutputMatches(proc, stderr='Ran 25 tests')
+        self.assertTestRunOutputMatches(
+            proc, stderr=r'failures=5, errors=1, skipped=1')
+        self.assertEqual(proc.poll(), 1)
+        worker.communicate()
+        self.assertEqual(worker.returncode, 0)
+
+    def test_remote_worker_sends_large_output_through_the_connection(self):
+        # as if the worker were on another machine: files it spills
+        # output to can't be read here
+        def load(spilled):
+            os.unlink(spilled.path)
+            raise IOError(errno.ENOENT, 'No such file', spilled.path)
+        self.addCleanup(setattr, mp._SpilledValue, 'load',
+                        mp._SpilledValue.load)
+        mp._SpilledValue.load = load
+        proc, worker = self._runWithRemoteWorker(
+            'scenario/large_output', '--plugin=nose2.plugins.buffer', '-B')
+        self.assertTestRunOutputMatches(proc, stderr='Ran 1 test')
+        self.assertTestRunOutputMatches(
+            proc, stderr=r'start of output\nx{100000}\nend of output')
+        self.assertTestRunOutputMatches(proc, stderr=r'FAILED \(failures=1\)')
+        worker.communicate()
+        self.assertEqual(worker.returncode, 0)
+
+    def test_worker_crash_in_streamed_group(self):
+        proc = self.runIn(
+            'scenario/worker_crash_in_group',
+            '-v',
+            '--plugin=nose2.plugins.mp',
+            '-N=1')
+        self.assertTestRunOutputMatches(proc, stderr='Ran 3 tests')
+        self.assertTestRunOutputMatches(
+            proc, stderr='while running test_crash_in_group.Test')
+        self.assertTestRunOutputMatches(proc, stderr=r'FAILED \(errors=1\)')
+        self.assertEqual(proc.poll(), 1)
+
+    def test_worker_report(self):
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir)
+        statsFile = os.path.join(workdir, 'stats.json')
+        cfg = os.path.join(workdir, 'report.cfg')
+        with open(cfg, 'w') as fh:
+            fh.write('[multiprocess]\n'
+                     'report-workers = True\n'
+                     'stats-file = %s\n' % statsFile)
+        proc = self.runIn(
+            'scenario/tests_in_package',
+            '-v',
+            '--config=%s' % cfg,
+            '--plugin=nose2.plugins.mp',
+            '-N=2')
+        self.assertTestRunOutputMatches(proc, stderr='Ran 25 tests')
+        self.assertTestRunOutputMatches(
+            proc, stderr=r'2 workers, 0 recycled, [\d.]+% busy')
+        self.assertTestRunOutputMatches(proc, stderr=r'received \d+ bytes')
+        self.assertEqual(proc.poll(), 1)
+        with open(statsFile) as fh:
+            stats = json.load(fh)
+        self.assertEqual(sum(w['tests'] for w in stats['workers']), 25)
+
+    def test_auto_processes(self):
+        proc = self.runIn(
+            'scenario/tests_in_package',
+            '-v',
+            '--plugin=nose2.plugins.mp',
+            '--processes=auto')
+        self.assertTestRunOutputMatches(proc, stderr='Ran 25 tests')
+        self.assertEqual(proc.poll(), 1)
+
+    def test_remote_address_without_port_is_a_usage_error(self):
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir)
+        cfg = os.path.join(workdir, 'remote.cfg')
+        with open(cfg, 'w') as fh:
+            fh.write('[multiprocess]\n'
+                     'remote-workers = 1\n'
+                     'remote-address = 127.0.0.1\n')
+        proc = self.runIn(
+            'scenario/tests_in_package',
+            '--config=%s' % cfg,
+            '--plugin=nose2.plugins.mp',
+            '-N=0')
+        self.assertTestRunOutputMatches(
+            proc, stderr=r'error: MP: remote-workers needs remote-address')
+        self.assertNotIn('Traceback', proc.stderr.getvalue())
+        self.assertNotIn('Ran ', proc.stderr.getvalue())
+        self.assertEqual(proc.poll(), 1)
+
+    def test_simulate_schedule(self):
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir)
+        timings = os.path.join(workdir, 'timings')
+        cfg = os.path.join(workdir, 'simulate.cfg')
+        util.save_timings(timings, {'test_slow.TestSlow.test_ok': 2.0,
+                                    'test_slow.TestSlow.test_fail': 2.0})
+        with open(cfg, 'w') as fh:
+            fh.write('[multiprocess]\ntiming-file = %s\n' % timings)
+        proc = self.runIn(
+            'scenario/slow',
+            '-v',
+            '--config=%s' % cfg,
+            '--plugin=nose2.plugins.mp',
+            '-N=2',
+            '--simulate-schedule')
+        self.assertTestRunOutputMatches(proc, stderr='Simulated schedule')
+        self.assertTestRunOutputMatches(
+            proc, stderr=r'3 tasks, 2 with recorded durations, 6\.00s in all')
+        self.assertTestRunOutputMatches(proc, stderr=r'2 +4\.00s +75\.0%')
+        self.assertTestRunOutputMatches(proc, stderr='Ran 0 tests')
+
+    def test_distributed_discovery(self):
+        proc = self.runIn(
+            'scenario/tests_in_package',
+            '-v',
+            '--config=%s' % support_file('cfg', 'mp_distributed.cfg'),
+            '--plugin=nose2.plugins.mp',
+            '-N=2')
+        self.assertTestRunOutputMatches(proc, stderr='Ran 25 tests')
+        self.assertTestRunOutputMatches(
+            proc, stderr=r'failures=5, errors=1, skipped=1')
+        self.assertEqual(proc.poll(), 1)
+
+    def test_distributed_discovery_import_errors(self):
+        proc = self.runIn(
+            'scenario/module_import_err',
+            '-v',
+            '--config=%s' % support_file('cfg', 'mp_distributed.cfg'),
+            '--plugin=nose2.plugins.mp',
+            '-N=2')
+        self.assertTestRunOutputMatches(proc, stderr='Ran 4 tests')
+        self.assertTestRunOutputMatches(
+            proc, stderr='Failed to import test module: pkg.test_import_err')
+        self.assertTestRunOutputMatches(proc, stderr=r'FAILED \(errors=2\)')
+        self.assertEqual(proc.poll(), 1)
+
+    def test_distributed_discovery_with_layers(self):
+        proc = self.runIn(
+            'scenario/layers',
+            '-v',
+            '--config=%s' % support_file('cfg', 'mp_distributed.cfg'),
+            '--plugin=nose2.plugins.layers',
+            '--plugin=nose2.plugins.mp',
+            '-N=2')
+        self.assertTestRunOutputMatches(proc, stderr='Ran 8 tests')
+        self.assertEqual(proc.poll(), 0)
+
+    def test_distributed_discovery_without_layers(self):
+        # tests needing layers fail just as they do without the mp plugin
+        for args in ([], ['--config=%s' % support_file(
+                'cfg', 'mp_distributed.cfg')]):
+            proc = self.runIn(
+                'scenario/layers',
+                '-v',
+                '--plugin=nose2.plugins.mp',
+                '-N=2',
+                *args)
+            self.assertTestRunOutputMatches(proc, stderr='Ran 8 tests')
+            self.assertTestRunOutputMatches(
+                proc, stderr=r'FAILED \(failures=7\)')
+            self.assertEqual(proc.poll(), 1)
+
     def test_too_many_procs(self):
         # Just need to run the mp plugin with less tests than
         # processes.
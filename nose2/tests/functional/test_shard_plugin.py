@@ -0,0 +1,47 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+
+from nose2.tests._common import FunctionalTestCase
+
+
+class TestShardPlugin(FunctionalTestCase):
+
+    def _run(self, *args):
+        proc = self.runIn(
+            'scenario/tests_in_package', '-v',
+            '--plugin=nose2.plugins.shard', *args)
+        junk, err = proc.communicate()
+        return re.findall(r'Ran (\d+) tests?', err)
+
+    def test_shards_run_all_tests_between_them(self):
+        ran = [self._run('--shard=%s/3' % i) for i in range(1, 4)]
+        self.assertEqual(sum(int(r[0]) for r in ran), 25)
+
+    def test_bad_shard_is_a_usage_error(self):
+        proc = self.runIn(
+            'scenario/tests_in_package',
+            '--plugin=nose2.plugins.shard', '--shard=4/3')
+        self.assertTestRunOutputMatches(
+            proc, stderr=r'error: Shard must be given as I/N.*4/3')
+        self.assertNotIn('Traceback', proc.stderr.getvalue())
+        self.assertEqual(proc.poll(), 1)
+
+    def test_shards_are_balanced_by_timing_file(self):
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir)
+        timings = os.path.join(workdir, 'timings')
+        cfg = os.path.join(workdir, 'shard.cfg')
+        with open(timings, 'w') as fh:
+            json.dump({'version': 1, 'durations': {
+                'pkg1.test.test_things.test_func': 100.0,
+                'pkg1.test.test_things.SomeTests.test_ok': 0.1,
+                'pkg1.test.test_things.SomeTests.test_failed': 0.1}}, fh)
+        with open(cfg, 'w') as fh:
+            fh.write('[shard]\ntiming-file = %s\n' % timings)
+        ran = self._run('--config=%s' % cfg, '--shard=1/2')
+        self.assertEqual(ran, ['1'])
+        ran = self._run('--config=%s' % cfg, '--shard=2/2')
+        self.assertEqual(ran, ['24'])
@@ -0,0 +1,50 @@
+import os
+import shutil
+import sys
+import tempfile
+
+from nose2.tests._common import FunctionalTestCase
+
+
+class TestStaticIndexPlugin(FunctionalTestCase):
+
+    def setUp(self):
+        super(TestStaticIndexPlugin, self).setUp()
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir)
+        self.indexFile = os.path.join(workdir, 'index.json')
+        self.cfg = os.path.join(workdir, 'index.cfg')
+        with open(self.cfg, 'w') as fh:
+            fh.write('[static-index]\nindex-file = %s\n' % self.indexFile)
+        self.modules = ('test_static', 'test_slow', 'test_dynamic')
+        for name in self.modules:
+            sys.modules.pop(name, None)
+            self.addCleanup(sys.modules.pop, name, None)
+
+    def _run(self, *args):
+        return self.runIn(
+            'scenario/static_index', '-v', '--config=%s' % self.cfg,
+            '--plugin=nose2.plugins.staticindex', *args)
+
+    def _imported(self):
+        return [name for name in self.modules if name in sys.modules]
+
+    def test_collect_only_does_not_import_indexed_modules(self):
+        proc = self._run('--plugin=nose2.plugins.collect', '--collect-only',
+                         '--static-index')
+        self.assertTestRunOutputMatches(proc, stderr='Ran 11 tests')
+        self.assertTestRunOutputMatches(
+            proc, stderr=r'test_params:2\n2, 3 \(test_static.Test')
+        self.assertEqual(self._imported(), ['test_dynamic'])
+        assert os.path.exists(self.indexFile)
+
+    def test_collect_only_finds_the_same_tests_as_import(self):
+        proc = self._run('--plugin=nose2.plugins.collect', '--collect-only')
+        self.assertTestRunOutputMatches(proc, stderr='Ran 11 tests')
+        self.assertEqual(len(self._imported()), 3)
+
+    def test_files_without_selected_tests_are_not_imported(self):
+        proc = self._run('--plugin=nose2.plugins.attrib', '-A', 'slow',
+                         '--static-index')
+        self.assertTestRunOutputMatches(proc, stderr='Ran 1 test')
+        self.assertEqual(self._imported(), ['test_slow', 'test_dynamic'])
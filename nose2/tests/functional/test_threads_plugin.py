@@ -0,0 +1,34 @@
+from nose2.tests._common import FunctionalTestCase
+
+
+class TestThreadsPlugin(FunctionalTestCase):
+
+    def test_tests_in_package(self):
+        proc = self.runIn(
+            'scenario/tests_in_package',
+            '-v',
+            '--plugin=nose2.plugins.threads',
+            '--threads=4')
+        self.assertTestRunOutputMatches(proc, stderr='Ran 25 tests')
+        self.assertEqual(proc.poll(), 1)
+
+    def test_class_and_module_fixtures(self):
+        for scenario in ('class_fixtures', 'module_fixtures'):
+            proc = self.runIn(
+                'scenario/' + scenario,
+                '-v',
+                '--plugin=nose2.plugins.threads',
+                '--threads=4')
+            self.assertTestRunOutputMatches(proc, stderr='OK')
+            self.assertEqual(proc.poll(), 0)
+
+    def test_layers(self):
+        proc = self.runIn(
+            'scenario/layers',
+            '-v',
+            '--plugin=nose2.plugins.layers',
+            '--plugin=nose2.plugins.threads',
+            '--threads=4')
+        self.assertTestRunOutputMatches(proc, stderr='Ran 8 tests')
+        self.assertTestRunOutputMatches(proc, stderr='OK')
+        self.assertEqual(proc.poll(), 0)
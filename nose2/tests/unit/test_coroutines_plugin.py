@@ -0,0 +1,141 @@
+import sys
+import time
+import unittest
+
+from nose2 import events, loader, result, session, util
+from nose2.plugins.loader import coroutines, functions, testcases
+from nose2.tests._common import TestCase, support_file
+
+
+@unittest.skipIf(sys.version_info < (3, 5), 'coroutines need python 3.5')
+class TestCoroutinesPlugin(TestCase):
+    tags = ['unit']
+
+    def setUp(self):
+        self.session = session.Session()
+        self.loader = loader.PluggableTestLoader(self.session)
+        self.result = result.PluggableTestResult(self.session)
+        self.plugin = coroutines.Coroutines(session=self.session)
+        self.plugin.register()
+        sys.path.insert(0, support_file('scenario/coroutines'))
+        self.addCleanup(sys.path.remove, support_file('scenario/coroutines'))
+        self.addCleanup(self.plugin.loops.close)
+        import test_coroutines
+        self.module = test_coroutines
+
+    def _loadFromModule(self):
+        event = events.LoadFromModuleEvent(self.loader, self.module)
+        self.session.hooks.loadTestsFromModule(event)
+        return event.extraTests
+
+    def _run(self, test):
+        calls = []
+
+        class Watcher(events.Plugin):
+            def testOutcome(self, event):
+                calls.append((util.test_name(event.test), event.outcome))
+        Watcher(session=self.session).register()
+        test(self.result)
+        return calls
+
+    def test_functions_loader_ignores_coroutines(self):
+        plugin = functions.Functions(session=self.session)
+        event = events.LoadFromModuleEvent(self.loader, self.module)
+        plugin.loadTestsFromModule(event)
+        self.assertEqual(
+            [t._testFunc.__name__ for t in event.extraTests], ['test_plain'])
+
+    def test_loads_coroutine_functions_into_one_suite(self):
+        extra = self._loadFromModule()
+        self.assertEqual(len(extra), 1)
+        assert isinstance(extra[0], coroutines.CoroutineSuite)
+        self.assertEqual(
+            [t._testFunc.__name__ for t in extra[0]],
+            ['test_fail', 'test_loop_is_current', 'test_sleep',
+             'test_sleep_again'])
+
+    def test_coroutine_methods_are_excluded_from_test_case_names(self):
+        tcl = testcases.TestCaseLoader(session=self.session)
+        tcl.register()
+        event = events.LoadFromModuleEvent(self.loader, self.module)
+        tcl.loadTestsFromModule(event)
+        tests = list(_flatten(event.extraTests))
+        self.assertEqual(
+            sorted(t._testMethodName for t in tests
+                   if t.__class__ is self.module.Test),
+            ['test_error', 'test_plain', 'test_sleep'])
+        self.assertEqual(
+            len([t for t in tests if t._testMethodName == 'test_plain']), 1)
+
+    def test_reports_coroutine_outcomes(self):
+        calls = self._run(self._loadFromModule()[0])
+        self.assertEqual(
+            [outcome for name, outcome in calls],
+            ['failed', 'passed', 'passed', 'passed'])
+
+    def test_tests_of_a_module_share_an_event_loop(self):
+        loop = self.plugin.loops.get('test_coroutines')
+        self._run(self._loadFromModule()[0])
+        assert self.plugin.loops.get('test_coroutines') is loop
+        assert not loop.is_closed()
+        other = self.plugin.loops.get(self.module.Test)
+        assert other is not loop
+        assert loop.is_closed()
+
+    def test_runs_tests_one_at_a_time_by_default(self):
+        tests = [t for t in self._loadFromModule()[0]
+                 if t._testFunc.__name__.startswith('test_sleep')]
+        start = time.time()
+        self._run(coroutines.CoroutineSuite(tests))
+        assert time.time() - start >= 0.4
+
+    def test_runs_independent_tests_at_the_same_time(self):
+        self.plugin.concurrency = 2
+        tests = [t for t in self._loadFromModule()[0]
+                 if t._testFunc.__name__.startswith('test_sleep')]
+        start = time.time()
+        calls = self._run(coroutines.CoroutineSuite(tests))
+        assert time.time() - start < 0.4
+        self.assertEqual([outcome for name, outcome in calls],
+                         ['passed', 'passed'])
+
+    def test_tests_with_fixtures_run_by_themselves(self):
+        self.plugin.concurrency = 2
+        test = self.plugin._testCaseTest(self.module.TestWithFixtures,
+                                         'test_value')
+        self.assertEqual(test.test_value.concurrency, 1)
+        test = self.plugin._testCaseTest(self.module.Test, 'test_sleep')
+        self.assertEqual(test.test_sleep.concurrency, 2)
+
+    def test_cancels_started_tests_that_are_not_run(self):
+        self.plugin.concurrency = 2
+        tests = [t for t in self._loadFromModule()[0]
+                 if t._testFunc.__name__.startswith('test_sleep')]
+        self.result.shouldStop = False
+
+        class Stop(events.Plugin):
+            def stopTest(self, event):
+                event.result.shouldStop = True
+        Stop(session=self.session).register()
+        calls = self._run(coroutines.CoroutineSuite(tests))
+        self.assertEqual(len(calls), 1)
+        for test in tests:
+            self.assertEqual(test._testFunc.task, None)
+
+    def test_loads_coroutine_by_name(self):
+        event = events.LoadFromNameEvent(
+            self.loader, 'test_coroutines.Test.test_sleep', None)
+        suite = self.session.hooks.loadTestsFromName(event)
+        assert event.handled
+        test, = list(suite)
+        self.assertEqual(self._run(test),
+                         [('test_coroutines.Test.test_sleep', 'passed')])
+
+
+def _flatten(tests):
+    for test in tests:
+        if isinstance(test, unittest.TestSuite):
+            for t in _flatten(test):
+                yield t
+        else:
+            yield test
@@ -0,0 +1,230 @@
+import os
+import sys
+
+import six
+
+from nose2 import events, loader, session, util
+from nose2.plugins.loader import discovery
+from nose2.tests._common import TestCase, support_file
+
+
+class TestDirectoryCache(TestCase):
+    _RUN_IN_TEMP = True
+    tags = ['unit']
+
+    def setUp(self):
+        super(TestDirectoryCache, self).setUp()
+        self.cacheFile = os.path.join(self._work_dir, 'cache', 'dirs.json')
+        self.dir = os.path.join(self._work_dir, 'pkg')
+        os.mkdir(self.dir)
+        os.mkdir(os.path.join(self.dir, 'sub'))
+        for name in ('__init__.py', 'test_a.py'):
+            open(os.path.join(self.dir, name), 'w').close()
+        self._age(self.dir)
+
+    def _age(self, path, seconds=60):
+        mtime = os.stat(path).st_mtime - seconds
+        os.utime(path, (mtime, mtime))
+
+    def _listing(self, cache):
+        return sorted(tuple(entry) for entry in cache.listing(self.dir))
+
+    def test_lists_entries_with_their_kinds(self):
+        cache = discovery.DirectoryCache(self.cacheFile)
+        self.assertEqual(self._listing(cache),
+                         [('__init__.py', 'file'), ('sub', 'dir'),
+                          ('test_a.py', 'file')])
+
+    def test_listing_is_reused_while_directory_is_unchanged(self):
+        cache = discovery.DirectoryCache(self.cacheFile)
+        cache.listing(self.dir)
+        cache.save()
+        mtime = os.stat(self.dir).st_mtime
+        open(os.path.join(self.dir, 'test_b.py'), 'w').close()
+        os.utime(self.dir, (mtime, mtime))
+        cache = discovery.DirectoryCache(self.cacheFile)
+        self.assertNotIn(('test_b.py', 'file'), self._listing(cache))
+        self._age(self.dir, -30)
+        self.assertIn(('test_b.py', 'file'), self._listing(cache))
+
+    def test_recently_changed_directories_are_not_kept(self):
+        cache = discovery.DirectoryCache(self.cacheFile)
+        open(os.path.join(self.dir, 'test_b.py'), 'w').close()
+        cache.listing(self.dir)
+        cache.save()
+        assert not os.path.exists(self.cacheFile)
+
+    def test_unreadable_cache_is_ignored(self):
+        os.mkdir(os.path.dirname(self.cacheFile))
+        with open(self.cacheFile, 'w') as fh:
+            fh.write('{not json')
+        cache = discovery.DirectoryCache(self.cacheFile)
+        self.assertEqual(len(self._listing(cache)), 3)
+        cache.save()
+        cache = discovery.DirectoryCache(self.cacheFile)
+        cache.load()
+        self.assertIn(self.dir, cache.dirs)
+
+
+class TestDiscoveryCache(TestCase):
+    _RUN_IN_TEMP = True
+    tags = ['unit']
+
+    def _discover(self, cache):
+        ssn = session.Session()
+        plugin = discovery.DiscoveryLoader(session=ssn)
+        if cache:
+            plugin._cache = discovery.DirectoryCache(
+                os.path.join(self._work_dir, 'discovery.json'))
+        ssn.startDir = support_file('scenario/tests_in_package')
+        found = []
+
+        class Watcher(events.Plugin):
+            def handleFile(self, event):
+                found.append(event.path)
+        Watcher(session=ssn).register()
+        event = events.LoadFromNamesEvent(
+            loader.PluggableTestLoader(ssn), [], None)
+        ssn.hooks.loadTestsFromNames(event)
+        plugin.startTestRun(None)
+        return sorted(found)
+
+    def test_cached_discovery_sees_the_same_files(self):
+        files = self._discover(cache=False)
+        self.assertEqual(self._discover(cache=True), files)
+        self.assertEqual(self._discover(cache=True), files)
+
+
+class TestWalk(TestCase):
+    _RUN_IN_TEMP = True
+    tags = ['unit']
+
+    def setUp(self):
+        super(TestWalk, self).setUp()
+        self.session = session.Session()
+        self.plugin = discovery.DiscoveryLoader(session=self.session)
+        for name in ('pkg/__init__.py', 'pkg/test_a.py',
+                     'not-a-pkg/__init__.py', 'not-a-pkg/test_b.py',
+                     'plain/test_c.py', '.pytest_cache/test_d.py',
+                     'build_tests/test_e.py', 'unit_tests/test_f.py'):
+            path = os.path.join(self._work_dir, name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            open(path, 'w').close()
+
+    def _modules(self):
+        return sorted(
+            os.path.relpath(path, self._work_dir)
+            for path in self.plugin._find_modules(self._work_dir)
+            if not path.endswith('__init__.py'))
+
+    def test_walks_packages_and_test_directories(self):
+        self.assertEqual(self._modules(),
+                         [os.path.join('build_tests', 'test_e.py'),
+                          os.path.join('pkg', 'test_a.py'),
+                          os.path.join('unit_tests', 'test_f.py')])
+        self.assertEqual(self.plugin._dirsExcluded, 1)
+        # plain is no package, and is not listed to find that out
+        self.assertEqual(self.plugin._dirsListed, 4)
+
+    def test_exclude_dirs_prunes_whole_subtrees(self):
+        self.plugin.excludeDirs = ['build*', 'unit_*']
+        # the patterns replace the default ones
+        self.assertEqual(self._modules(),
+                         [os.path.join('.pytest_cache', 'test_d.py'),
+                          os.path.join('pkg', 'test_a.py')])
+        self.assertEqual(self.plugin._dirsExcluded, 2)
+
+    def test_big_directory_that_is_no_package_is_not_listed(self):
+        data = os.path.join(self._work_dir, 'data')
+        os.makedirs(data)
+        for i in range(50):
+            open(os.path.join(data, 'file%s.dat' % i), 'w').close()
+        self._modules()
+        self.assertEqual(self.plugin._dirsListed, 4)
+        self.assertEqual(self.plugin._entriesListed, 11)
+
+    def test_exclude_dirs_is_configurable(self):
+        ssn = session.Session()
+        ssn.config.add_section('discovery')
+        ssn.config.set('discovery', 'exclude-dirs', 'a*\nb*')
+        plugin = discovery.DiscoveryLoader(session=ssn)
+        self.assertEqual(plugin.excludeDirs, ['a*', 'b*'])
+
+    def test_empty_exclude_dirs_skips_nothing(self):
+        ssn = session.Session()
+        ssn.config.add_section('discovery')
+        ssn.config.set('discovery', 'exclude-dirs', '')
+        self.plugin = discovery.DiscoveryLoader(session=ssn)
+        self.assertEqual(len(self._modules()), 4)
+        self.assertEqual(self.plugin._dirsExcluded, 0)
+
+
+class TestPrecompile(TestCase):
+    _RUN_IN_TEMP = True
+    tags = ['unit']
+
+    def setUp(self):
+        super(TestPrecompile, self).setUp()
+        self.session = session.Session()
+        self.session.startDir = self._work_dir
+        self.plugin = discovery.DiscoveryLoader(session=self.session)
+        self.plugin.precompileProcs = 2
+        os.makedirs(os.path.join(self._work_dir, 'pkg', 'tests'))
+        for name in ('pkg/__init__.py', 'pkg/tests/__init__.py',
+                     'pkg/tests/test_a.py', 'pkg/tests/test_b.py',
+                     'pkg/tests/helpers.py', 'pkg/code.py', 'test_top.py'):
+            with open(os.path.join(self._work_dir, name), 'w') as fh:
+                fh.write('VALUE = 1\n')
+
+    def _relative(self, paths):
+        return sorted(os.path.relpath(path, self._work_dir) for path in paths)
+
+    def test_finds_the_modules_discovery_would_import(self):
+        self.assertEqual(
+            self._relative(self.plugin._find_modules(self._work_dir)),
+            [os.path.join('pkg', '__init__.py'),
+             os.path.join('pkg', 'tests', '__init__.py'),
+             os.path.join('pkg', 'tests', 'test_a.py'),
+             os.path.join('pkg', 'tests', 'test_b.py'),
+             'test_top.py'])
+
+    def test_compiles_modules_that_need_it(self):
+        modules = list(self.plugin._find_modules(self._work_dir))
+        assert all(discovery._needs_compiling(path) for path in modules)
+        self.plugin._precompile(self._work_dir)
+        assert not any(discovery._needs_compiling(path) for path in modules)
+        self.assertEqual(self.plugin.precompiled[:2], (5, 5))
+        self.plugin._precompile(self._work_dir)
+        self.assertEqual(self.plugin.precompiled[:2], (5, 0))
+
+    def test_reports_time_compiling_took(self):
+        self.plugin._precompile(self._work_dir)
+        stream = util._WritelnDecorator(six.StringIO())
+        event = events.ReportSummaryEvent(None, stream, {})
+        self.plugin.beforeSummaryReport(event)
+        output = stream.getvalue()
+        assert 'Compiled 5 of 5 test modules' in output, output
+        assert 'in 2 processes' in output, output
+        assert 'saved' in output, output
+
+    def test_walk_counts_are_per_discovery_and_leave_out_precompiling(self):
+        self.addCleanup(setattr, sys, 'dont_write_bytecode',
+                        sys.dont_write_bytecode)
+        sys.dont_write_bytecode = False
+        self.plugin._find_tests_in_file = lambda *args: iter(())
+        for _ in range(2):
+            self.plugin._discover(events.LoadFromNamesEvent(
+                loader.PluggableTestLoader(self.session), [], None))
+            self.assertEqual(self.plugin.precompiled[0], 5)
+            # the top directory, pkg and pkg/tests
+            self.assertEqual(self.plugin._dirsListed, 3)
+
+    def test_nothing_is_compiled_unless_bytecode_is_written(self):
+        self.addCleanup(setattr, sys, 'dont_write_bytecode',
+                        sys.dont_write_bytecode)
+        sys.dont_write_bytecode = True
+        self.plugin.lazy = True  # find the tests without importing them
+        self.plugin._discover(events.LoadFromNamesEvent(
+            loader.PluggableTestLoader(self.session), [], None))
+        self.assertEqual(self.plugin.precompiled, None)
@@ -1,6 +1,6 @@
 import unittest
 
-from nose2 import session
+from nose2 import session, suite
 from nose2.plugins import dundertest
 from nose2.tests._common import TestCase
 
@@ -30,3 +30,18 @@ class TestDunderTestPlugin(TestCase):
         self.suite.addTest(dummyTest)
         self.plugin.removeNonTests(self.suite)
         self.assertEqual(len(list(self.suite)), 0)
+
+    def test_lazy_suite_is_filtered_as_it_loads(self):
+        loaded = []
+
+        def tests():
+            for name in ('keep', 'drop'):
+                loaded.append(name)
+                test = self.caseClass('test_a')
+                test.__test__ = name == 'keep'
+                yield test
+        lazy = suite.LazySuite(tests())
+        self.plugin.removeNonTests(lazy)
+        self.assertEqual(loaded, [])
+        self.assertEqual(len(list(lazy)), 1)
+        self.assertEqual(loaded, ['keep', 'drop'])
@@ -0,0 +1,102 @@
+import json
+import os
+
+import six
+try:
+    from unittest import mock
+except ImportError:
+    # Python versions older than 3.3 don't have mock by default
+    import mock
+
+from nose2 import events, loader, session, util
+from nose2.plugins import importprofile
+from nose2.tests._common import TestCase
+
+
+class TestImportProfile(TestCase):
+    _RUN_IN_TEMP = True
+    tags = ['unit']
+
+    def setUp(self):
+        super(TestImportProfile, self).setUp()
+        self.session = session.Session()
+        self.plugin = importprofile.ImportProfile(session=self.session)
+        self.plugin.modules = {
+            'test_fast': self._record('test_fast', 0.1, 0.05, {'a': 0.05}),
+            'test_slow': self._record('test_slow', 2.0, 1.5,
+                                      {'b': 1.0, 'c': 0.3, 'd': 0.1,
+                                       'e': 0.1}),
+        }
+
+    def _record(self, name, total, nested, imports):
+        return {'module': name, 'total': total, 'own': total - nested,
+                'nested': nested, 'loading': 0.01, 'imports': imports}
+
+    def _report(self):
+        stream = util._WritelnDecorator(six.StringIO())
+        self.plugin.beforeSummaryReport(
+            events.ReportSummaryEvent(None, stream, {}))
+        return stream.getvalue()
+
+    def test_reports_slowest_modules_first(self):
+        self.assertEqual(
+            [record['module'] for record in self.plugin.slowest()],
+            ['test_slow', 'test_fast'])
+        report = self._report()
+        assert report.index('test_slow') < report.index('test_fast'), report
+        assert '2 test modules imported in 2.100s' in report, report
+
+    def test_reports_top_modules_and_their_slowest_imports(self):
+        self.plugin.top = 1
+        report = self._report()
+        self.assertNotIn('test_fast', report)
+        lines = [line.split()[-1] for line in report.splitlines()[2:6]]
+        self.assertEqual(lines, ['test_slow', 'b', 'c', 'd'])
+
+    def test_writes_report_file(self):
+        path = os.path.join(self._work_dir, 'profile.json')
+        self.plugin.writeReport(path)
+        with open(path) as fh:
+            report = json.load(fh)
+        self.assertEqual(report['version'], 1)
+        self.assertEqual(report['modules'], self.plugin.modules)
+
+    def test_failing_to_write_report_keeps_the_old_file(self):
+        path = os.path.join(self._work_dir, 'profile.json')
+        with open(path, 'w') as fh:
+            fh.write('{"version": 1}')
+        with mock.patch('json.dump', side_effect=IOError('disk full')):
+            self.plugin.writeReport(path)
+        with open(path) as fh:
+            self.assertEqual(fh.read(), '{"version": 1}')
+
+    def test_nothing_is_reported_when_nothing_was_timed(self):
+        self.plugin.modules = {}
+        self.assertEqual(self._report(), '')
+
+    def test_stop_test_run_restores_what_was_patched(self):
+        testLoader = loader.PluggableTestLoader(self.session)
+        moduleFromName = util.module_from_name
+        self.plugin.createTests(
+            events.CreateTestsEvent(testLoader, [], None))
+        self.assertNotEqual(util.module_from_name, moduleFromName)
+        self.plugin.stopTestRun(None)
+        self.assertEqual(util.module_from_name, moduleFromName)
+        self.assertNotIn('loadTestsFromModule', vars(testLoader))
+
+    def test_relative_imports_are_named_in_full(self):
+        globs = {'__package__': 'pkg.sub', '__name__': 'pkg.sub.mod'}
+        self.assertEqual(importprofile._absolute('x', globs, 0), 'x')
+        self.assertEqual(importprofile._absolute('x', globs, 1),
+                         'pkg.sub.x')
+        self.assertEqual(importprofile._absolute('x', globs, 2), 'pkg.x')
+        self.assertEqual(importprofile._absolute('', globs, 1), 'pkg.sub')
+
+    def test_relative_imports_without_package_are_named_in_full(self):
+        module = {'__name__': 'pkg.sub.mod'}
+        self.assertEqual(importprofile._absolute('x', module, 1),
+                         'pkg.sub.x')
+        self.assertEqual(importprofile._absolute('x', module, 2), 'pkg.x')
+        package = {'__name__': 'pkg.sub', '__path__': []}
+        self.assertEqual(importprofile._absolute('x', package, 1),
+                         'pkg.sub.x')
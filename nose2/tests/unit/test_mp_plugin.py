@@ -1,7 +1,80 @@
-from nose2 import session
-from nose2.tests._common import TestCase, Conn
+from nose2 import events, loader, session, util
+from nose2.tests._common import TestCase, Conn, support_file
 from nose2.plugins import mp
+import collections
+import json
+import multiprocessing
+import os
+import pickle
+import shutil
+import signal
 import sys
+import tempfile
+import time
+import unittest
+
+import six
+try:
+    from unittest import mock
+except ImportError:
+    # Python versions older than 3.3 don't have mock by default
+    import mock
+
+CALLS = []
+
+
+class Outer(object):
+
+    @classmethod
+    def setUp(cls):
+        CALLS.append('setUp Outer')
+
+    @classmethod
+    def tearDown(cls):
+        CALLS.append('tearDown Outer')
+
+
+class InnerA(Outer):
+
+    @classmethod
+    def setUp(cls):
+        CALLS.append('setUp InnerA')
+
+    @classmethod
+    def tearDown(cls):
+        CALLS.append('tearDown InnerA')
+
+    @classmethod
+    def testSetUp(cls):
+        CALLS.append('testSetUp InnerA')
+
+
+class InnerB(Outer):
+
+    @classmethod
+    def setUp(cls):
+        CALLS.append('setUp InnerB')
+        raise RuntimeError('no B today')
+
+
+class WithClassFixtures(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    def test_a(self):
+        """Does a thing"""
+
+
+class FakeResult(object):
+
+    # records the result methods called, and the test each was called with
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, attr):
+        return lambda test, *args: self.calls.append((attr, test))
 
 
 class TestMPPlugin(TestCase):
@@ -17,6 +90,10 @@ class TestMPPlugin(TestCase):
             res.append(x)
         self.assertEqual(res, [1, 2, 3])
 
+    def test_gentests_unpacks_chunks(self):
+        conn = Conn([1, [2, 3], 4])
+        self.assertEqual(list(mp.gentests(conn)), [1, 2, 3, 4])
+
     def test_recording_plugin_interface(self):
         rpi = mp.RecordingPluginInterface()
         # this one should record
@@ -30,6 +107,39 @@ class TestMPPlugin(TestCase):
         rpi.loadTestsFromTestCase(None)
         self.assertEqual(rpi.flush(), [('setTestOutcome', None)])
 
+    def test_recording_plugin_interface_streams_batches(self):
+        rpi = mp.RecordingPluginInterface()
+        batches = []
+        rpi.stream(batches.append, 5)
+        for _ in range(2):
+            rpi.startTest(None)
+            rpi.stopTest(None)
+        self.assertEqual(batches, [])
+        rpi.startTest(None)
+        self.assertEqual(batches, [])
+        rpi.stopTest(None)
+        self.assertEqual(len(batches), 1)
+        self.assertEqual([hook for hook, _ in batches[0]],
+                         ['startTest', 'stopTest'] * 3)
+        self.assertEqual(rpi.flush(), [])
+
+    def test_recording_plugin_interface_streams_only_tasks_asked_to(self):
+        rpi = mp.RecordingPluginInterface()
+        batches = []
+        rpi.stream(batches.append, 5, 1.0)
+        rpi.startTask(False)
+        for _ in range(5):
+            rpi.startTest(None)
+            rpi.stopTest(None)
+        self.assertEqual(batches, [])
+        rpi.flush()
+        # time spent waiting for a task doesn't count towards interval
+        rpi._lastFlushed -= 10
+        rpi.startTask()
+        rpi.startTest(None)
+        rpi.stopTest(None)
+        self.assertEqual(batches, [])
+
     def test_address(self):
         platform = sys.platform
         try:
@@ -58,3 +168,742 @@ class TestMPPlugin(TestCase):
         finally:
             sys.platform = platform
 
+    def test_remote_workers_need_a_port(self):
+        self.plugin.remoteWorkers = 2
+        with mock.patch.object(self.session.argparse, 'error',
+                               side_effect=SystemExit(2)) as error:
+            for address in ('', '0.0.0.0', '0.0.0.0:', '0.0.0.0:0'):
+                self.plugin.remoteAddress = address
+                self.assertRaises(SystemExit, self.plugin.setProcs, ['2'])
+            self.assertEqual(error.call_count, 4)
+            assert not self.plugin.registered
+            self.plugin.remoteAddress = '0.0.0.0:7000'
+            self.plugin.setProcs(['2'])
+        assert self.plugin.registered
+
+    def test_resident_set_size(self):
+        rss = mp._residentSetMB()
+        self.assertTrue(isinstance(rss, float))
+        self.assertTrue(rss >= 0)
+
+
+class TestStartMethod(TestCase):
+
+    def setUp(self):
+        self.session = session.Session()
+        self.plugin = mp.MultiProcess(session=self.session)
+        self.plugin._sessionExport = {'pluginClasses': [mp.MultiProcess]}
+        self.plugin.taskModules = {'b.T.test_1': 'b', 'a.test_1': 'a',
+                                   'b.T.test_2': 'b'}
+
+    def test_default_context(self):
+        self.assertIs(self.plugin._processContext(), multiprocessing)
+
+    def test_unknown_start_method_falls_back_to_default(self):
+        self.plugin.startMethod = 'telepathy'
+        self.assertIs(self.plugin._processContext(), multiprocessing)
+
+    def test_preloads_test_modules(self):
+        self.assertEqual(self.plugin._preloadModules(),
+                         ['nose2.plugins.mp', 'a', 'b'])
+
+    def test_preload_list_replaces_test_modules(self):
+        self.plugin.preload = ['numpy']
+        self.assertEqual(self.plugin._preloadModules(),
+                         ['nose2.plugins.mp', 'numpy'])
+
+
+class TestEventEncoding(TestCase):
+
+    def _outcomeEvent(self, **metadata):
+        return events.TestOutcomeEvent(
+            self, None, 'failed', exc_info=None, reason='why',
+            shortLabel='F', longLabel='FAIL', **metadata)
+
+    def test_round_trip(self):
+        outcome = self._outcomeEvent(stdout='hello')
+        recorded = [('startTest', events.StartTestEvent(self, None, 1.0)),
+                    ('setTestOutcome', outcome),
+                    ('testOutcome', outcome),
+                    ('stopTest', events.StopTestEvent(self, None, 2.0))]
+        decoded = mp._decodeEvents(mp._WIRE_VERSION,
+                                   mp._encodeEvents(recorded))
+        self.assertEqual([hook for hook, _ in decoded],
+                         ['startTest', 'setTestOutcome', 'testOutcome',
+                          'stopTest'])
+        start, outcome = decoded[0][1], decoded[1][1]
+        self.assertIsInstance(start, events.StartTestEvent)
+        self.assertEqual((start.test, start.startTime), (self.id(), 1.0))
+        self.assertIsInstance(outcome, events.TestOutcomeEvent)
+        self.assertEqual(
+            (outcome.outcome, outcome.reason, outcome.longLabel,
+             outcome.metadata, outcome.handled, outcome.result),
+            ('failed', 'why', 'FAIL', {'stdout': 'hello'}, False, None))
+        # one event recorded for two hooks is still one event
+        self.assertIs(decoded[2][1], outcome)
+
+    def test_other_events_are_sent_as_is(self):
+        event = events.Event()
+        encoded = mp._encodeEvents([('afterTestRun', event)])
+        self.assertEqual(encoded, [('afterTestRun', event)])
+
+    def test_unwanted_hooks_are_dropped(self):
+        outcome = self._outcomeEvent()
+        encoded = mp._encodeEvents(
+            [('startTest', events.StartTestEvent(self, None, 1.0)),
+             ('setTestOutcome', outcome), ('testOutcome', outcome)],
+            hooks=set(['testOutcome']))
+        decoded = mp._decodeEvents(mp._WIRE_VERSION, encoded)
+        self.assertEqual([hook for hook, _ in decoded], ['testOutcome'])
+        self.assertEqual(decoded[0][1].outcome, 'failed')
+
+    def test_large_metadata_is_spilled_to_a_file(self):
+        output = u'x' * 100
+        encoded = mp._encodeEvents(
+            [('testOutcome', self._outcomeEvent(stdout=output, logs=['short']))],
+            spillSize=10)
+        spilled = encoded[0][1][-1]['stdout']
+        self.assertIsInstance(spilled, mp._SpilledValue)
+        self.assertTrue(os.path.exists(spilled.path))
+        decoded = mp._decodeEvents(mp._WIRE_VERSION, encoded)
+        self.assertEqual(decoded[0][1].metadata,
+                         {'stdout': output, 'logs': ['short']})
+        self.assertFalse(os.path.exists(spilled.path))
+
+    def test_unknown_version(self):
+        self.assertRaises(RuntimeError, mp._decodeEvents, 0, [])
+
+    def test_replay_hooks(self):
+        ssn = session.Session()
+        plugin = mp.MultiProcess(session=ssn)
+        plugin.recordTimings = False
+        plugin.streamBatchSize = 0
+        plugin.register()
+        self.assertEqual(plugin._replayHooks() & set(['stopTest']), set())
+        self.assertIn('beforeSummaryReport', plugin._replayHooks())
+        plugin.recordTimings = True
+        self.assertIn('stopTest', plugin._replayHooks())
+
+
+class TestRemoteWorkers(TestCase):
+
+    def test_remote_worker_stands_in_for_process(self):
+        proc = mp.RemoteWorker(('10.0.0.2', 4321))
+        self.assertEqual(proc.pid, '10.0.0.2:4321')
+        self.assertTrue(proc.is_alive())
+        proc.join()
+        self.assertFalse(proc.is_alive())
+        self.assertEqual(proc.exitcode, None)
+
+    def test_authkey_file_is_required(self):
+        self.assertRaises(RuntimeError, mp._readAuthkey, '')
+
+
+class TestLayerStack(TestCase):
+    OUTER = (__name__, 'Outer')
+    INNER_A = (__name__, 'InnerA')
+    INNER_B = (__name__, 'InnerB')
+
+    def setUp(self):
+        del CALLS[:]
+        self.result = FakeResult()
+        self.layers = mp.LayerStack(session.Session(), self.result)
+
+    class Case(object):
+
+        def __init__(self, name):
+            self.name = name
+
+    def _run(self, name):
+        self.layers.run(self.Case(name),
+                        lambda test, result: CALLS.append(test.name))
+
+    def test_layers_stay_set_up_between_tasks(self):
+        self.layers.enter([self.OUTER, self.INNER_A])
+        self._run('test_1')
+        self.layers.enter([self.OUTER, self.INNER_A])
+        self._run('test_2')
+        self.layers.enter([self.OUTER])
+        self._run('test_3')
+        self.layers.enter([])
+        self.assertEqual(CALLS, [
+            'setUp Outer', 'setUp InnerA',
+            'testSetUp InnerA', 'test_1', 'testSetUp InnerA', 'test_2',
+            'tearDown InnerA', 'test_3', 'tearDown Outer'])
+        self.assertEqual(self.layers.stack, [])
+
+    def test_failed_layer_setup_is_reported_for_each_test(self):
+        self.layers.enter([self.OUTER, self.INNER_B])
+        self._run('test_1')
+        self.layers.enter([self.OUTER, self.INNER_B])
+        self._run('test_2')
+        self.assertEqual(CALLS, ['setUp Outer', 'setUp InnerB'])
+        self.assertEqual(
+            [test.name for call, test in self.result.calls
+             if call == 'addError'],
+            ['test_1', 'test_2'])
+        self.assertEqual(self.layers.error[1].args, ('no B today',))
+
+
+class TestBatchedDispatch(TestCase):
+
+    def setUp(self):
+        self.session = session.Session()
+        self.plugin = mp.MultiProcess(session=self.session)
+
+    def test_single_tasks_by_default(self):
+        conn = Conn([])
+        queue, pending = mp.TaskQueue(['a', 'b', 'c']), collections.deque()
+        self.plugin._dispatch(conn, queue, pending, 2)
+        self.assertEqual(conn.sent, ['a'])
+        self.assertEqual(len(queue), 2)
+        self.assertEqual([caseid for caseid, _ in pending], ['a'])
+
+    def test_fixed_chunk_size(self):
+        self.plugin.chunkSize = 2
+        conn = Conn([])
+        queue, pending = mp.TaskQueue(['a', 'b', 'c']), collections.deque()
+        self.plugin._dispatch(conn, queue, pending, 2)
+        self.plugin._dispatch(conn, queue, pending, 2)
+        self.assertEqual(conn.sent, [['a', 'b'], 'c'])
+        self.assertEqual(len(pending), 3)
+
+    def test_chunks_prefer_the_workers_module(self):
+        self.plugin.chunkSize = 2
+        self.plugin.taskModules = {'a.t1': 'a', 'b.t1': 'b', 'a.t2': 'a',
+                                   'b.t2': 'b'}
+        queue = mp.TaskQueue(['a.t1', 'b.t1', 'a.t2', 'b.t2'],
+                             self.plugin.taskModules.get)
+        conn = Conn([])
+        module = self.plugin._dispatch(
+            conn, queue, collections.deque(), 2, 'b')
+        self.assertEqual(module, 'b')
+        self.assertEqual(conn.sent, [['b.t1', 'b.t2']])
+
+    def test_auto_chunk_size_follows_task_time(self):
+        self.plugin.chunkSize = None
+        self.plugin.chunkTargetTime = 0.1
+        self.assertEqual(self.plugin._chunkSize(1000, 2), 1)
+        self.plugin._observe('a', 0.01)
+        self.assertEqual(self.plugin._chunkSize(1000, 2), 10)
+        self.plugin._observe('b', 0.11)
+        self.assertEqual(self.plugin._chunkSize(1000, 2), 3)
+
+    def test_auto_chunk_size_is_bounded(self):
+        self.plugin.chunkSize = None
+        self.plugin.maxChunkSize = 20
+        self.plugin._observe('a', 0.0)
+        self.assertEqual(self.plugin._chunkSize(1000, 2), 20)
+        # never take more than a worker's share of what is left
+        self.assertEqual(self.plugin._chunkSize(30, 2), 15)
+        self.assertEqual(self.plugin._chunkSize(1, 2), 1)
+
+
+class TestWorkerDied(TestCase):
+
+    class FakeProc(object):
+        pid = 123
+        exitcode = -11
+
+        def join(self, timeout=None):
+            pass
+
+    def setUp(self):
+        self.session = session.Session()
+        self.plugin = mp.MultiProcess(session=self.session)
+        self.plugin.cases = {'a.test_1': 'test 1', 'a.test_2': 'test 2',
+                             'b.test_1': 'test 3'}
+        self.plugin.groups = {'a': ['a.test_1', 'a.test_2']}
+
+    def test_describe_exit(self):
+        self.assertEqual(mp._describeExit(3), 'exit code 3')
+        self.assertEqual(mp._describeExit(-signal.SIGTERM), 'signal SIGTERM')
+        self.assertEqual(mp._describeExit(None), 'unknown status')
+
+    def test_running_task_is_reported_and_later_tasks_requeued(self):
+        queue = mp.TaskQueue(['c.test_1'])
+        pending = collections.deque([('a', 0), ('b.test_1', 0)])
+        res = FakeResult()
+        self.assertTrue(
+            self.plugin._workerDied(self.FakeProc(), pending, queue, res))
+        self.assertEqual(res.calls, [
+            ('startTest', 'test 1'), ('addError', 'test 1'),
+            ('stopTest', 'test 1'), ('startTest', 'test 2'),
+            ('addError', 'test 2'), ('stopTest', 'test 2')])
+        self.assertEqual([queue.pop(), queue.pop()], ['b.test_1', 'c.test_1'])
+
+    def test_reported_tests_are_not_reported_again(self):
+        pending = collections.deque([('a', 0)])
+        res = FakeResult()
+        self.assertTrue(self.plugin._workerDied(
+            self.FakeProc(), pending, mp.TaskQueue([]), res,
+            set(['a.test_1'])))
+        self.assertEqual(res.calls, [
+            ('startTest', 'test 2'), ('addError', 'test 2'),
+            ('stopTest', 'test 2')])
+
+    def test_idle_worker_is_not_replaced(self):
+        res = FakeResult()
+        self.assertFalse(self.plugin._workerDied(
+            self.FakeProc(), collections.deque(), mp.TaskQueue([]), res))
+        self.assertEqual(res.calls, [])
+
+
+class TestTaskQueue(TestCase):
+
+    def test_pops_in_order(self):
+        queue = mp.TaskQueue(['a', 'b', 'c'])
+        self.assertEqual([queue.pop() for _ in range(3)], ['a', 'b', 'c'])
+        self.assertFalse(queue)
+        self.assertRaises(IndexError, queue.pop)
+
+    def test_pop_prefers_key(self):
+        queue = mp.TaskQueue(['a.1', 'b.1', 'a.2', 'b.2'],
+                             lambda task: task.split('.')[0])
+        self.assertEqual(queue.pop('b'), 'b.1')
+        self.assertEqual(queue.pop(), 'a.1')
+        self.assertEqual(queue.pop('b'), 'b.2')
+        self.assertEqual(queue.pop('b'), 'a.2')
+        self.assertEqual(len(queue), 0)
+
+    def test_pushed_tasks_come_first(self):
+        queue = mp.TaskQueue(['a', 'b'])
+        self.assertEqual(queue.pop(), 'a')
+        queue.push('a')
+        self.assertEqual(len(queue), 2)
+        self.assertEqual([queue.pop(), queue.pop()], ['a', 'b'])
+
+
+class TestReplicatedFixtures(TestCase):
+
+    def setUp(self):
+        self.session = session.Session()
+        self.plugin = mp.MultiProcess(session=self.session)
+        self.plugin.procs = 2
+        self.plugin.replicateFixtures = ['a*']
+        self.members = ['a.test_%s' % i for i in range(5)]
+        self.plugin.groups = {'a': self.members, 'b': ['b.test_1']}
+        self.plugin.taskModules = {'a': 'a', 'b': 'b'}
+
+    def test_unmatched_group_is_not_split(self):
+        self.assertEqual(self.plugin._replicate('b', {}), ['b'])
+
+    def test_group_is_split_across_workers(self):
+        self.assertEqual(self.plugin._replicate('a', {}), ['a#1', 'a#2'])
+        self.assertEqual(self.plugin.groups['a#1'], self.members[:2])
+        self.assertEqual(self.plugin.groups['a#2'], self.members[2:])
+        self.assertEqual(self.plugin.taskModules['a#2'], 'a')
+        self.assertEqual(self.plugin.replicas['a#1'], 'a')
+
+    def test_expensive_fixtures_are_not_replicated(self):
+        history = dict((m, 1.0) for m in self.members)
+        history['a#fixtures'] = 4.0
+        self.assertEqual(self.plugin._replicate('a', history), ['a'])
+
+    def test_fixture_cost_from_whole_group(self):
+        history = dict((m, 1.0) for m in self.members)
+        history['a'] = 7.0
+        self.assertEqual(self.plugin._fixtureCost('a', history), 2.0)
+        self.assertEqual(self.plugin._fixtureCost('a', {}), None)
+
+    def test_shares_are_sent_with_their_tests(self):
+        self.plugin._replicate('a', {})
+        conn = Conn([])
+        self.plugin._dispatch(conn, mp.TaskQueue(['a#2']),
+                              collections.deque(), 2)
+        self.assertEqual(conn.sent, [('a#2', self.members[2:], ())])
+
+
+class TestLongestFirstSchedule(TestCase):
+    _RUN_IN_TEMP = True
+
+    def setUp(self):
+        super(TestLongestFirstSchedule, self).setUp()
+        self.session = session.Session()
+        self.plugin = mp.MultiProcess(session=self.session)
+        self.plugin.timingFile = os.path.join(self._work_dir, 'timings')
+
+    def test_orders_by_recorded_duration(self):
+        util.save_timings(self.plugin.timingFile,
+                          {'a.test_a': 1.0, 'a.test_b': 3.0, 'a.test_c': 2.0})
+        self.assertEqual(
+            self.plugin._longestFirst(['a.test_a', 'a.test_b', 'a.test_c']),
+            ['a.test_b', 'a.test_c', 'a.test_a'])
+
+    def test_unknown_tests_use_default_duration(self):
+        util.save_timings(self.plugin.timingFile,
+                          {'a.test_a': 1.0, 'a.test_b': 3.0})
+        self.plugin.defaultDuration = 2.0
+        self.assertEqual(
+            self.plugin._longestFirst(['a.test_a', 'a.test_b', 'a.test_new']),
+            ['a.test_b', 'a.test_new', 'a.test_a'])
+
+    def test_unknown_groups_are_estimated_from_members(self):
+        util.save_timings(self.plugin.timingFile,
+                          {'a.test_a': 1.5, 'b.T.test_1': 1.0,
+                           'b.T.test_2': 1.0})
+        self.plugin.groups['b.T'] = ['b.T.test_1', 'b.T.test_2']
+        self.assertEqual(self.plugin._longestFirst(['a.test_a', 'b.T']),
+                         ['b.T', 'a.test_a'])
+
+    def test_fixture_cost_of_replicated_groups_is_recorded(self):
+        self.plugin.recordTimings = True
+        self.plugin.groups = {'a#1': ['a.test_1'], 'a#2': ['a.test_2']}
+        self.plugin.replicas = {'a#1': 'a', 'a#2': 'a'}
+        self.plugin.durations = {'a#1': 1.5, 'a#2': 2.5, 'a.test_1': 1.0,
+                                 'a.test_2': 1.0}
+        self.plugin._saveTimings()
+        self.assertEqual(util.load_timings(self.plugin.timingFile),
+                         {'a.test_1': 1.0, 'a.test_2': 1.0,
+                          'a#fixtures': 1.0})
+
+    def test_without_history_order_is_unchanged(self):
+        flat = ['a.test_c', 'a.test_a', 'a.test_b']
+        self.assertEqual(self.plugin._longestFirst(flat), flat)
+
+    def test_durations_are_recorded_and_merged(self):
+        util.save_timings(self.plugin.timingFile, {'a.test_old': 4.0})
+        self.plugin.recordTimings = True
+        starts = {}
+        self.plugin._recordDuration(
+            'startTest', events.StartTestEvent('a.test_a', None, 10.0),
+            starts)
+        self.plugin._recordDuration(
+            'stopTest', events.StopTestEvent('a.test_a', None, 12.5), starts)
+        self.plugin._saveTimings()
+        self.assertEqual(util.load_timings(self.plugin.timingFile),
+                         {'a.test_old': 4.0, 'a.test_a': 2.5})
+
+
+class TestSuiteCache(TestCase):
+
+    def setUp(self):
+        self.loaded = []
+        cache = self
+
+        class Loader(object):
+            suiteClass = unittest.TestSuite
+
+            def loadTestsFromModule(self, module):
+                return unittest.TestSuite(
+                    [TestSuiteCache('test_each_test_is_served_once'),
+                     WithClassFixtures('test_a')])
+
+            def loadTestsFromName(self, name):
+                cache.loaded.append(name)
+                return unittest.TestSuite()
+        self.cache = mp.SuiteCache(Loader())
+        self.prefix = __name__ + '.'
+
+    def _ids(self, suite):
+        return [util.test_name(test) for test in suite]
+
+    def test_module_name_is_found_without_importing(self):
+        self.assertEqual(
+            mp._loadedModuleName(
+                (self.prefix + 'WithClassFixtures.test_a').split('.')),
+            __name__)
+        self.assertEqual(mp._loadedModuleName(['os', 'path', 'join']),
+                         'os.path')
+        # may be a module that isn't imported yet
+        self.assertIsNone(mp._loadedModuleName(['nose2', 'nose2_no_such']))
+
+    def test_each_test_is_served_once(self):
+        name = self.prefix + 'WithClassFixtures.test_a'
+        self.assertEqual(self._ids(self.cache.loadTestsFromName(name)),
+                         [name])
+        self.assertEqual(self.loaded, [])
+        self.assertEqual(self.cache.modules[__name__][name], None)
+        self.cache.loadTestsFromName(name)
+        self.assertEqual(self.loaded, [name])
+
+    def test_group_with_a_served_test_is_loaded_afresh(self):
+        self.cache.loadTestsFromName(
+            self.prefix + 'WithClassFixtures.test_a')
+        self.cache.loadTestsFromName(__name__)
+        self.assertEqual(self.loaded, [__name__])
+
+
+class TestDistributedDiscovery(TestCase):
+
+    def setUp(self):
+        self.session = session.Session()
+        self.session.testLoader = loader.PluggableTestLoader(self.session)
+        self.plugin = mp.MultiProcess(session=self.session)
+        self.plugin.distributedDiscovery = True
+
+    def _handleFile(self, name):
+        event = events.HandleFileEvent(
+            self.session.testLoader, name, os.path.join(support_file(
+                'scenario', 'tests_in_package', 'pkg1', 'test'), name),
+            'test*.py', None)
+        self.plugin.handleFile(event)
+        return event
+
+    def test_matching_modules_are_deferred(self):
+        event = self._handleFile('test_things.py')
+        self.assertTrue(event.handled)
+        self.assertEqual([str(t) for t in event.extraTests],
+                         ['pkg1.test.test_things'])
+
+    def test_other_files_are_left_alone(self):
+        event = self._handleFile('__init__.py')
+        self.assertFalse(event.handled)
+        self.assertEqual(event.extraTests, [])
+
+    def test_off_by_default(self):
+        self.plugin = mp.MultiProcess(session=session.Session())
+        self.assertFalse(self._handleFile('test_things.py').handled)
+
+    def test_deferred_modules_become_collect_tasks(self):
+        suite = unittest.TestSuite([mp.DeferredModule('pkg.test_a')])
+        self.assertEqual(list(self.plugin._flatten(suite)),
+                         ['collect:pkg.test_a'])
+        self.assertEqual(self.plugin._payload('collect:pkg.test_a'),
+                         ('collect:pkg.test_a', 'pkg.test_a'))
+
+    def test_record_survives_the_trip_from_a_worker(self):
+        record = pickle.loads(pickle.dumps(
+            mp.TestRecord(WithClassFixtures('test_a')), 2))
+        self.assertEqual(record.id(), '%s.WithClassFixtures.test_a' %
+                         __name__)
+        self.assertEqual(str(record), str(WithClassFixtures('test_a')))
+        self.assertEqual(record.shortDescription(), 'Does a thing')
+        self.assertEqual(record.group, '%s.WithClassFixtures' % __name__)
+        self.assertEqual(record, mp.TestRecord(WithClassFixtures('test_a')))
+
+    def test_collected_tests_are_grouped_by_fixtures(self):
+        record = mp.TestRecord(WithClassFixtures('test_a'))
+        tasks = self.plugin._collected({
+            'message': 'collected', 'collected': __name__,
+            'tests': [record, mp.TestRecord(self)], 'ran': []})
+        self.assertEqual(tasks, [self.id(), record.group])
+        self.assertEqual(self.plugin.groups[record.group], [record.id()])
+        self.assertIs(self.plugin.cases[record.id()], record)
+
+    def test_loading_the_plugin_module_loads_no_other_plugins(self):
+        ssn = session.Session()
+        ssn.loadPluginsFromModule(mp)
+        self.assertEqual([type(plugin) for plugin in ssn.plugins],
+                         [mp.MultiProcess])
+
+    def test_import_errors_are_run_where_they_are_found(self):
+        tests, broken = mp._collect(self.session.testLoader,
+                                    'nose2_no_such_module')
+        self.assertEqual(tests, [])
+        self.assertEqual(
+            [test.id() for test in broken],
+            ['nose2.loader.ModuleImportFailure.nose2_no_such_module'])
+
+
+class TestPoller(TestCase):
+
+    def setUp(self):
+        self.poller = mp.Poller()
+        self.pipes = [multiprocessing.Pipe() for _ in range(3)]
+        for i, (conn, _) in enumerate(self.pipes):
+            self.poller.register(conn, i)
+
+    def tearDown(self):
+        self.poller.close()
+        for conn, other in self.pipes:
+            conn.close()
+            other.close()
+
+    def test_poll_returns_data_of_ready_connections(self):
+        self.assertEqual(self.poller.poll(0), [])
+        self.pipes[1][1].send('hi')
+        self.assertEqual(self.poller.poll(1), [1])
+
+    def test_unregistered_connections_are_not_polled(self):
+        self.pipes[1][1].send('hi')
+        self.poller.unregister(self.pipes[1][0])
+        self.poller.unregister(self.pipes[1][0])
+        self.assertEqual(len(self.poller), 2)
+        self.assertEqual(list(self.poller), [0, 2])
+        self.assertEqual(self.poller.poll(0), [])
+
+    def test_select_fallback(self):
+        fallback = mp.Poller()
+        fallback._selector = None
+        fallback.register(self.pipes[0][0], 'a')
+        fallback.register(self.pipes[2][0], 'c')
+        self.pipes[2][1].send('hi')
+        self.assertEqual(fallback.poll(1), ['c'])
+
+    def test_poll_timeout_follows_quietest_worker(self):
+        plugin = mp.MultiProcess(session=session.Session())
+        plugin.testRunTimeout = 60.0
+        now = time.time()
+        poller = mp.Poller()
+        for seconds, (conn, _) in zip((5, 50), self.pipes):
+            poller.register(conn, mp.WorkerState(None, conn), now - seconds)
+        self.assertAlmostEqual(plugin._pollTimeout(poller), 10.0, places=0)
+        poller.heard(self.pipes[1][0], now - 20)
+        self.assertAlmostEqual(plugin._pollTimeout(poller), 40.0, places=0)
+        self.assertEqual(plugin._pollTimeout(mp.Poller()), 0)
+        poller.close()
+
+    def test_quiet_connections(self):
+        now = time.time()
+        self.poller.heard(self.pipes[0][0], now - 30)
+        self.poller.heard(self.pipes[2][0], now - 40)
+        self.assertEqual(self.poller.quiet(now - 20), [0, 2])
+        self.assertEqual(self.poller.lastHeard(), now - 40)
+        self.poller.unregister(self.pipes[2][0])
+        self.assertEqual(self.poller.lastHeard(), now - 30)
+
+    def test_out_of_date_entries_are_dropped(self):
+        for _ in range(1000):
+            self.poller.heard(self.pipes[1][0])
+        self.assertLess(len(self.poller._heardHeap), 100)
+        self.assertEqual(self.poller.quiet(time.time() + 1), [0, 1, 2])
+
+
+class TestWorkerStats(TestCase):
+
+    def setUp(self):
+        self.session = session.Session()
+        self.plugin = mp.MultiProcess(session=self.session)
+
+    def test_connection_counts_bytes(self):
+        parent, child = multiprocessing.Pipe()
+        metered = mp.MeteredConnection(parent)
+        metered.send('pkg.test_a')
+        self.assertEqual(child.recv(), 'pkg.test_a')
+        child.send(('pkg.test_a', []))
+        self.assertEqual(metered.recv(), ('pkg.test_a', []))
+        self.assertTrue(metered.bytesSent > 0)
+        self.assertTrue(metered.bytesReceived > metered.bytesSent)
+        metered.close()
+        child.close()
+
+    def test_summary_of_worker_that_died(self):
+        parent, child = multiprocessing.Pipe()
+        worker = mp.WorkerState(mp.RemoteWorker(('example.com', 1)), parent)
+        worker.replayTime = 0.5
+        summary = worker.summary()
+        self.assertEqual(summary['pid'], 'example.com:1')
+        self.assertEqual(summary['tests'], 0)
+        self.assertEqual(summary['replay'], 0.5)
+        self.assertNotIn('message', summary)
+        parent.close()
+        child.close()
+
+    def _report(self):
+        stream = util._WritelnDecorator(six.StringIO())
+        self.plugin.beforeSummaryReport(
+            events.ReportSummaryEvent(None, stream, {}))
+        return stream.getvalue()
+
+    def test_report_is_off_by_default(self):
+        self.assertEqual(self._report(), '')
+
+    def test_report(self):
+        self.plugin.reportWorkers = True
+        self.plugin.workerStats = [
+            {'pid': 1, 'tests': 3, 'tasks': 2, 'busy': 3.0, 'idle': 1.0,
+             'loading': 0.0, 'peakRSS': 20.0, 'replay': 0.25,
+             'sent': 100, 'received': 900}]
+        report = self._report()
+        self.assertIn('1 workers, 0 recycled, 75.0% busy', report)
+        self.assertIn('pid 1: 3 tests in 2 tasks', report)
+        self.assertIn('replaying 0.25s', report)
+        self.assertIn('sent 100 bytes, received 900 bytes', report)
+
+    def test_stats_file(self):
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir)
+        self.plugin.statsFile = os.path.join(workdir, 'stats.json')
+        self.plugin.workerStats = [{'pid': 1, 'tests': 3}]
+        self.plugin._saveStats()
+        with open(self.plugin.statsFile) as fh:
+            self.assertEqual(json.load(fh)['workers'],
+                             [{'pid': 1, 'tests': 3}])
+
+    def test_failing_to_write_stats_keeps_the_old_file(self):
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir)
+        self.plugin.statsFile = os.path.join(workdir, 'stats.json')
+        with open(self.plugin.statsFile, 'w') as fh:
+            fh.write('{"version": 1}')
+        with mock.patch('json.dump', side_effect=IOError('disk full')):
+            self.plugin._saveStats()
+        with open(self.plugin.statsFile) as fh:
+            self.assertEqual(fh.read(), '{"version": 1}')
+        self.assertEqual(os.listdir(workdir), ['stats.json'])
+
+
+class TestAutoProcesses(TestCase):
+    _RUN_IN_TEMP = True
+
+    def setUp(self):
+        super(TestAutoProcesses, self).setUp()
+        self.session = session.Session()
+        self.plugin = mp.MultiProcess(session=self.session)
+        self.plugin.timingFile = os.path.join(self._work_dir, 'timings')
+        self.plugin._setProcs('auto')
+        self.plugin.procs = 8
+        for name, value in (('_idleCPUs', None),
+                            ('_availableMemoryMB', None)):
+            patcher = mock.patch.object(mp, name, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_auto_starts_with_cpus_this_process_may_use(self):
+        self.plugin._setProcs('auto')
+        self.assertTrue(self.plugin.autoProcs)
+        self.assertEqual(self.plugin.procs, mp._cpuLimit())
+        self.assertTrue(mp._cpuLimit() <= multiprocessing.cpu_count())
+        self.plugin._setProcs('3')
+        self.assertFalse(self.plugin.autoProcs)
+        self.assertEqual(self.plugin.procs, 3)
+
+    def test_simulated_schedule(self):
+        self.assertEqual(mp._simulateSchedule([], 4), 0.0)
+        self.assertEqual(mp._simulateSchedule([3.0, 1.0, 1.0, 1.0], 1), 6.0)
+        self.assertEqual(mp._simulateSchedule([3.0, 1.0, 1.0, 1.0], 2), 3.0)
+        self.assertEqual(mp._simulateSchedule([1.0, 1.0, 1.0, 3.0], 2), 4.0)
+
+    def test_no_more_processes_than_tasks(self):
+        self.assertEqual(self.plugin._tuneProcs(['a', 'b', 'c']), 3)
+
+    def test_no_more_processes_than_idle_cpus(self):
+        with mock.patch.object(mp, '_idleCPUs', return_value=2.6):
+            self.assertEqual(self.plugin._tuneProcs(list('abcdefgh')), 3)
+        with mock.patch.object(mp, '_idleCPUs', return_value=0.0):
+            self.assertEqual(self.plugin._tuneProcs(list('abcdefgh')), 1)
+
+    def test_no_more_processes_than_fit_in_memory(self):
+        self.plugin.statsFile = os.path.join(self._work_dir, 'stats.json')
+        self.plugin.workerStats = [{'pid': 1, 'peakRSS': 100.0},
+                                   {'pid': 2, 'peakRSS': 300.0}]
+        self.plugin._saveStats()
+        with mock.patch.object(mp, '_availableMemoryMB', return_value=1000):
+            self.assertEqual(self.plugin._tuneProcs(list('abcdefgh')), 3)
+
+    def test_fewest_processes_that_are_nearly_as_fast(self):
+        util.save_timings(self.plugin.timingFile,
+                          {'a': 10.0, 'b': 5.0, 'c': 5.0, 'd': 0.1})
+        # 2 processes take 10.1s, more take 10s
+        self.assertEqual(self.plugin._tuneProcs(['a', 'b', 'c', 'd']), 2)
+
+    def test_simulate_reports_wall_times(self):
+        util.save_timings(self.plugin.timingFile,
+                          {'a.test_a': 4.0, 'a.test_b': 2.0,
+                           'a.test_c': 2.0})
+        self.plugin.autoProcs = False
+        self.plugin.procs = 2
+        suite = unittest.TestSuite()
+        with mock.patch.object(self.plugin, '_flatten',
+                               return_value=['a.test_a', 'a.test_b',
+                                             'a.test_c']):
+            self.plugin._simulate(suite, None)
+        stream = util._WritelnDecorator(six.StringIO())
+        self.plugin.beforeSummaryReport(
+            events.ReportSummaryEvent(None, stream, {}))
+        report = stream.getvalue()
+        self.assertIn('3 tasks, 3 with recorded durations, 8.00s in all',
+                      report)
+        self.assertIn('        1        8.00s   100.0%', report)
+        self.assertIn('        2        4.00s   100.0%', report)
@@ -32,3 +32,81 @@ class TestPluginApi(TestCase):
         assert self.plug in self.session.plugins
         assert self.plug in self.session.hooks.testOutcome.plugins, \
             "long opt did not register plugin"
+
+
+class TestHook(TestCase):
+
+    def setUp(self):
+        self.hook = events.Hook('testOutcome')
+        self.calls = []
+
+    def _plugin(self, name, handle=False):
+        calls = self.calls
+
+        class Plugin(object):
+            def testOutcome(self, event):
+                calls.append(name)
+                event.handled = handle
+                return name
+        return Plugin()
+
+    def test_calls_plugins_in_order_until_one_handles_the_event(self):
+        for name, handle in (('a', False), ('b', True), ('c', False)):
+            self.hook.append(self._plugin(name, handle))
+        self.assertEqual(self.hook(events.Event()), 'b')
+        self.assertEqual(self.calls, ['a', 'b'])
+
+    def test_is_active_once_a_plugin_is_added(self):
+        assert not self.hook.isActive()
+        plugin = self._plugin('a')
+        self.hook.append(plugin)
+        self.hook.append(plugin)
+        assert self.hook.isActive()
+        self.assertEqual(self.hook.plugins, [plugin])
+
+    def test_plugins_changed_in_place_are_called(self):
+        self.hook.append(self._plugin('a'))
+        self.hook(events.Event())
+        self.hook.plugins.insert(0, self._plugin('b'))
+        self.hook(events.Event())
+        self.hook.plugins.remove(self.hook.plugins[1])
+        self.hook(events.Event())
+        self.assertEqual(self.calls, ['a', 'b', 'a', 'b'])
+
+    def test_plugins_emptied_in_place_make_the_hook_inactive(self):
+        self.hook.append(self._plugin('a'))
+        del self.hook.plugins[:]
+        assert not self.hook.isActive()
+        self.hook(events.Event())
+        self.assertEqual(self.calls, [])
+
+    def test_plugin_registered_after_a_call_receives_the_next_event(self):
+        hooks = events.PluginInterface()
+        hooks.testOutcome(events.Event())
+        hooks.register('testOutcome', self._plugin('a'))
+        assert hooks.testOutcome.isActive()
+        hooks.testOutcome(events.Event())
+        self.assertEqual(self.calls, ['a'])
+
+    def test_setting_plugins_replaces_them(self):
+        self.hook.append(self._plugin('a'))
+        self.hook.plugins = [self._plugin('b')]
+        self.hook(events.Event())
+        self.assertEqual(self.calls, ['b'])
+
+    def test_plugin_added_during_a_call_is_called_next_time(self):
+        hook, late = self.hook, self._plugin('late')
+
+        class Adder(object):
+            def testOutcome(self, event):
+                hook.append(late)
+        self.hook.append(Adder())
+        self.hook(events.Event())
+        self.assertEqual(self.calls, [])
+        self.hook(events.Event())
+        self.assertEqual(self.calls, ['late'])
+
+    def test_interface_makes_each_hook_once(self):
+        hooks = events.PluginInterface()
+        assert hooks.startTest is hooks.startTest
+        self.assertEqual(list(hooks.hooks), ['startTest'])
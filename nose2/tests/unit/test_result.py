@@ -1,4 +1,4 @@
-from nose2 import result, session
+from nose2 import events, result, session
 from nose2.tests._common import TestCase
 
 
@@ -18,6 +18,29 @@ class TestPluggableTestResult(TestCase):
         self.result.addSkip(Test('test'), 'because')
         self.assertEqual(plugin.reason, 'because')
 
+    def test_no_events_are_made_for_hooks_no_plugin_listens_to(self):
+        class Test(TestCase):
+
+            def test(self):
+                pass
+        made = []
+
+        class Events(object):
+            def __getattr__(self, name):
+                return getattr(events, name)
+
+            def TestOutcomeEvent(self, *args, **kw):
+                made.append(args)
+                return events.TestOutcomeEvent(*args, **kw)
+        self.addCleanup(setattr, result, 'events', events)
+        result.events = Events()
+        self.result.addSuccess(Test('test'))
+        self.assertEqual(made, [])
+        plugin = FakePlugin()
+        self.session.hooks.register('testOutcome', plugin)
+        self.result.addSkip(Test('test'), 'because')
+        self.assertEqual(len(made), 1)
+
 
 class FakePlugin(object):
 
@@ -0,0 +1,97 @@
+import unittest
+
+from nose2 import events, session
+from nose2.plugins import shard
+from nose2.tests._common import TestCase
+
+
+class TestShardPlugin(TestCase):
+    tags = ['unit']
+
+    def setUp(self):
+        self.session = session.Session()
+        self.plugin = shard.Shard(session=self.session)
+        self.plugin.timingFile = None
+
+        class Test(unittest.TestCase):
+            def test_a(self):
+                pass
+
+            def test_b(self):
+                pass
+
+            def test_c(self):
+                pass
+
+        class Fixtures(unittest.TestCase):
+            @classmethod
+            def setUpClass(cls):
+                pass
+
+            def test_a(self):
+                pass
+
+            def test_b(self):
+                pass
+        self.case = Test
+        self.fixtures = Fixtures
+
+    def _suite(self):
+        return unittest.TestSuite([
+            unittest.TestSuite([self.case('test_a'), self.case('test_b'),
+                                self.case('test_c')]),
+            unittest.TestSuite([self.fixtures('test_a'),
+                                self.fixtures('test_b')])])
+
+    def _shard(self, arg):
+        self.plugin.setShard([arg])
+        event = events.CreatedTestSuiteEvent(self._suite())
+        self.plugin.createdTestSuite(event)
+        return [t.id() for s in event.suite for t in s]
+
+    def test_parses_shard(self):
+        self.assertEqual(shard.parseShard('2/5'), (2, 5))
+        for bad in ('0/5', '6/5', '2', '2/x', '/'):
+            self.assertRaises(ValueError, shard.parseShard, bad)
+
+    def test_shards_cover_every_test_once(self):
+        ids = []
+        for i in range(1, 4):
+            ids.extend(self._shard('%s/3' % i))
+        self.assertEqual(sorted(ids), sorted(
+            t.id() for s in self._suite() for t in s))
+
+    def test_fixture_groups_are_not_split(self):
+        for i in range(1, 5):
+            ids = [i for i in self._shard('%s/4' % i) if 'Fixtures' in i]
+            assert len(ids) in (0, 2), ids
+
+    def test_empty_suites_are_removed(self):
+        self.plugin.setShard(['1/2'])
+        event = events.CreatedTestSuiteEvent(self._suite())
+        self.plugin.createdTestSuite(event)
+        for suite in event.suite:
+            assert suite.countTestCases()
+
+    def test_balances_by_test_count_without_timings(self):
+        units = {'a': ['a'], 'b': ['b'], 'c': ['c'], 'g': ['g1', 'g2']}
+        self.assertEqual(shard.partition(units, 2), [['g', 'c'], ['a', 'b']])
+
+    def test_balances_by_duration_with_timings(self):
+        units = {'a': ['a'], 'b': ['b'], 'c': ['c'], 'g': ['g1', 'g2']}
+        history = {'a': 5.0, 'b': 1.0, 'c': 1.0, 'g1': 1.0, 'g2': 1.0}
+        self.assertEqual(shard.partition(units, 2, history),
+                         [['a'], ['g', 'b', 'c']])
+
+    def test_uses_recorded_group_duration(self):
+        units = {'a': ['a'], 'g': ['g1', 'g2']}
+        history = {'a': 1.0, 'g': 10.0, 'g1': 0.1, 'g2': 0.1}
+        self.assertEqual(shard.partition(units, 3, history),
+                         [['g'], ['a'], []])
+
+    def test_partition_does_not_depend_on_order(self):
+        units = dict(('t%s' % i, ['t%s' % i]) for i in range(20))
+        history = dict(('t%s' % i, float(i % 4)) for i in range(20))
+        first = shard.partition(units, 3, history)
+        units = dict(reversed(list(units.items())))
+        self.assertEqual(shard.partition(units, 3, history), first)
@@ -0,0 +1,247 @@
+import os
+import textwrap
+
+from nose2 import loader, session, util
+from nose2.plugins import staticindex
+from nose2.tests._common import TestCase
+
+
+def index(source):
+    return staticindex.indexSource(textwrap.dedent(source))
+
+
+class TestIndexSource(TestCase):
+    tags = ['unit']
+
+    def test_indexes_test_cases_and_functions(self):
+        entry = index("""
+            import unittest
+
+            def setUpModule():
+                pass
+
+            class Base(unittest.TestCase):
+                tags = ['base']
+
+                def test_a(self):
+                    '''Test a'''
+
+            class Test(Base):
+                @classmethod
+                def setUpClass(cls):
+                    pass
+
+                def test_b(self):
+                    pass
+
+                def helper(self):
+                    pass
+
+            def test_func():
+                pass
+
+            def test_with_arg(arg):
+                pass
+            """)
+        self.assertEqual(entry['dynamic'], None)
+        assert entry['fixtures']
+        self.assertEqual([name for name, info in entry['classes']],
+                         ['Base', 'Test'])
+        base, test = [info for name, info in entry['classes']]
+        self.assertEqual([t['name'] for t in test['tests']],
+                         ['test_a', 'test_b'])
+        self.assertEqual(test['attributes'], {'tags': ['base']})
+        self.assertEqual(base['tests'][0]['doc'], 'Test a')
+        assert test['fixtures']
+        assert not base['fixtures']
+        self.assertEqual([t['name'] for t in entry['functions']],
+                         ['test_func'])
+
+    def test_records_attributes(self):
+        entry = index("""
+            from nose2.tools import params
+
+            @attr('slow', speed=3)
+            def test_a():
+                pass
+            test_a.tags = ['a', 'b']
+            test_a.setup = setup
+            """)
+        self.assertEqual(entry['dynamic'], None)
+        self.assertEqual(entry['functions'][0]['attributes'],
+                         {'slow': True, 'speed': 3, 'tags': ['a', 'b']})
+
+    def test_expands_parameters(self):
+        entry = index("""
+            import unittest
+            from nose2.tools import cartesian_params, params
+
+            class Test(unittest.TestCase):
+                @params(1, (2, 3))
+                def test_p(self, a, b=None):
+                    pass
+
+            @cartesian_params((1, 2), ('a',))
+            def test_c(num, char):
+                pass
+
+            def test_l(a):
+                pass
+            test_l.paramList = ('x',)
+            """)
+        self.assertEqual(entry['dynamic'], None)
+        self.assertEqual(
+            entry['classes'][0][1]['tests'][0]['params'],
+            [util.name_from_args('test_p', 0, (1,)),
+             util.name_from_args('test_p', 1, (2, 3))])
+        self.assertEqual(
+            [t['params'] for t in entry['functions']],
+            [[util.name_from_args('test_c', 0, (1, 'a')),
+              util.name_from_args('test_c', 1, (2, 'a'))],
+             [util.name_from_args('test_l', 0, ('x',))]])
+
+    def test_dynamic_modules_must_be_imported(self):
+        sources = [
+            "from helpers import SomeTests",
+            "from helpers import test_shared",
+            "from helpers import *",
+            "def test_gen():\n    yield check, 1",
+            "def load_tests(loader, tests, pattern):\n    return tests",
+            "globals()['test_x'] = lambda: None",
+            "test_x = make_test()",
+            "class Test(Base):\n    pass",
+            "class TestThings(object):\n    pass",
+            "@patch('os.getcwd')\ndef test_x(getcwd):\n    pass",
+            "def test_x():\n    pass\ntest_x.value = compute()",
+            "import sys\nif sys.platform == 'win32':\n"
+            "    def test_x():\n        pass",
+        ]
+        for source in sources:
+            entry = staticindex.indexSource(source)
+            assert entry['dynamic'], source
+
+    def test_records_generators(self):
+        entry = index("""
+            def test_gen():
+                yield check, 1
+
+            def test_gen_func():
+                def inner():
+                    yield 1
+                return inner
+            """)
+        self.assertEqual(entry['generators'], ['test_gen'])
+        self.assertEqual(entry['dynamic'], 'line 2: generator test test_gen')
+
+    def test_deleted_and_rebound_names_are_not_tests(self):
+        entry = index("""
+            import unittest
+
+            class Base(unittest.TestCase):
+                def test_a(self):
+                    pass
+
+            class Test(Base):
+                pass
+
+            def test_b():
+                pass
+
+            del Base
+            test_b = None
+            """)
+        self.assertEqual(entry['dynamic'], None)
+        self.assertEqual([name for name, info in entry['classes']], ['Test'])
+        self.assertEqual(entry['functions'], [])
+
+    def test_unparseable_source_is_dynamic(self):
+        assert staticindex.indexSource('def (:')['dynamic']
+
+
+class TestIndexedTests(TestCase):
+    tags = ['unit']
+
+    def setUp(self):
+        self.loader = loader.PluggableTestLoader(session.Session())
+
+    def _names(self, suite):
+        names = []
+        for test in suite:
+            if isinstance(test, self.loader.suiteClass):
+                names.extend(self._names(test))
+            else:
+                names.append(util.test_name(test))
+        return names
+
+    def test_stand_ins_look_like_loaded_tests(self):
+        entry = index("""
+            import unittest
+
+            def tearDownModule():
+                pass
+
+            class Test(unittest.TestCase):
+                flag = True
+
+                def test_b(self):
+                    pass
+                test_b.slow = 1
+
+                def test_a(self):
+                    pass
+
+            def test_f():
+                pass
+            test_f.slow = 1
+
+            @params(1)
+            def test_p(a):
+                pass
+            """)
+        suite = staticindex.indexedTests(self.loader, 'unimported', entry)
+        self.assertEqual(self._names(suite),
+                         ['unimported.test_f', 'unimported.Test.test_a',
+                          'unimported.Test.test_b', 'unimported.test_p:1'])
+        function, case, params = list(suite)
+        self.assertEqual(function._testFunc.slow, 1)
+        test_a, test_b = list(case)
+        assert test_a.flag
+        self.assertEqual(test_b.test_b.slow, 1)
+        assert util.has_module_fixtures(test_a)
+        assert util.has_module_fixtures(function)
+        assert not util.has_class_fixtures(test_a)
+
+
+class TestIndex(TestCase):
+    _RUN_IN_TEMP = True
+    tags = ['unit']
+
+    def setUp(self):
+        super(TestIndex, self).setUp()
+        self.path = os.path.join(self._work_dir, 'test_mod.py')
+        self.indexFile = os.path.join(self._work_dir, 'cache', 'index.json')
+        self._write('def test_a():\n    pass\n')
+
+    def _write(self, source):
+        with open(self.path, 'w') as fh:
+            fh.write(source)
+
+    def _functions(self, index):
+        return [t['name'] for t in index.get(self.path)['functions']]
+
+    def test_index_is_reused_while_file_is_unchanged(self):
+        index = staticindex.Index(self.indexFile)
+        self.assertEqual(self._functions(index), ['test_a'])
+        index.save()
+        index = staticindex.Index(self.indexFile)
+        index.load()
+        self.assertEqual(list(index.files), [self.path])
+        self.assertEqual(self._functions(index), ['test_a'])
+        assert not index.updated
+        self._write('def test_b():\n    pass\n')
+        self.assertEqual(self._functions(index), ['test_b'])
+        assert index.updated
+
+    def test_missing_file_has_no_index(self):
+        index = staticindex.Index(self.indexFile)
+        self.assertEqual(index.get(self.path + 'x'), None)
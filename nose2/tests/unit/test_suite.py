@@ -0,0 +1,58 @@
+import unittest
+
+from nose2 import suite
+from nose2.tests._common import TestCase
+
+
+class TestLazySuite(TestCase):
+    tags = ['unit']
+
+    def setUp(self):
+        self.loaded = []
+
+        class Test(unittest.TestCase):
+            def test(self):
+                pass
+        self.caseClass = Test
+
+    def _tests(self, count):
+        for num in range(count):
+            self.loaded.append(num)
+            test = self.caseClass('test')
+            test.num = num
+            yield test
+
+    def test_tests_are_loaded_as_the_suite_is_iterated(self):
+        lazy = suite.LazySuite(self._tests(3))
+        self.assertEqual(self.loaded, [])
+        tests = iter(lazy)
+        self.assertEqual(next(tests).num, 0)
+        self.assertEqual(self.loaded, [0])
+        self.assertEqual([test.num for test in lazy], [0, 1, 2])
+
+    def test_tests_run_before_the_rest_are_loaded(self):
+        lazy = suite.LazySuite(self._tests(3))
+        seen = []
+        self.caseClass.test = lambda test: seen.append(list(self.loaded))
+        result = unittest.TestResult()
+        lazy.run(result)
+        self.assertEqual(result.testsRun, 3)
+        self.assertEqual(seen, [[0], [0, 1], [0, 1, 2]])
+
+    def test_counting_tests_loads_them_all(self):
+        lazy = suite.LazySuite(self._tests(3))
+        self.assertEqual(lazy.countTestCases(), 3)
+        self.assertEqual(self.loaded, [0, 1, 2])
+        self.assertEqual(len(lazy._tests), 3)
+
+    def test_filter_applies_to_loaded_and_pending_tests(self):
+        lazy = suite.LazySuite(self._tests(4))
+        next(iter(lazy))
+        lazy.filter(lambda test: test.num % 2)
+        self.assertEqual(self.loaded, [0])
+        self.assertEqual([test.num for test in lazy], [1, 3])
+
+    def test_tests_can_be_added(self):
+        lazy = suite.LazySuite(self._tests(1))
+        lazy.addTest(self.caseClass('test'))
+        self.assertEqual(len(list(lazy)), 2)
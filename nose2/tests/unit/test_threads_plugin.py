@@ -0,0 +1,254 @@
+import logging
+import sys
+import threading
+import unittest
+
+import six
+
+from nose2 import events, loader, result, session, util
+from nose2.plugins import buffer, logcapture
+from nose2.plugins.threads import ThreadPool, ThreadPoolEvent
+from nose2.tests._common import TestCase
+
+
+class Watcher(events.Plugin):
+
+    def __init__(self):
+        self.events = []
+
+    def testOutcome(self, event):
+        self.events.append(event)
+
+
+class TestThreadPool(TestCase):
+    tags = ['unit']
+
+    def setUp(self):
+        self.session = session.Session()
+        self.session.testLoader = loader.PluggableTestLoader(self.session)
+        self.result = result.PluggableTestResult(self.session)
+        self.plugin = ThreadPool(session=self.session)
+        self.plugin.pluginsLoaded(events.PluginsLoadedEvent([self.plugin]))
+        self.plugin.register()
+        self.watcher = Watcher(session=self.session)
+        self.watcher.register()
+
+    def _suite(self, *tests):
+        return unittest.TestSuite(tests)
+
+    def test_tests_without_fixtures_are_separate_tasks(self):
+        class Test(unittest.TestCase):
+            def test_a(self):
+                pass
+
+            def test_b(self):
+                pass
+        tasks = list(self.plugin._tasks(
+            self._suite(self._suite(Test('test_a'), Test('test_b')))))
+        self.assertEqual([t.countTestCases() for t in tasks], [1, 1])
+
+    def test_tests_with_class_fixtures_are_one_task(self):
+        class Test(unittest.TestCase):
+            @classmethod
+            def setUpClass(cls):
+                pass
+
+            def test_a(self):
+                pass
+
+            def test_b(self):
+                pass
+
+        class Other(unittest.TestCase):
+            def test_c(self):
+                pass
+        tasks = list(self.plugin._tasks(self._suite(
+            self._suite(Test('test_a')),
+            self._suite(Other('test_c'), Test('test_b')))))
+        self.assertEqual([t.countTestCases() for t in tasks], [1, 2])
+        self.assertEqual([t._testMethodName for t in tasks[1]],
+                         ['test_a', 'test_b'])
+
+    def test_tests_with_module_fixtures_are_one_task(self):
+        module = type(sys)('nose2_threads_fixtures')
+        module.setUpModule = lambda: None
+        sys.modules[module.__name__] = module
+        self.addCleanup(sys.modules.pop, module.__name__)
+
+        class Test(unittest.TestCase):
+            @classmethod
+            def setUpClass(cls):
+                pass
+
+            def test_a(self):
+                pass
+
+            def test_b(self):
+                pass
+
+        class Other(unittest.TestCase):
+            def test_c(self):
+                pass
+        Test.__module__ = Other.__module__ = module.__name__
+        tasks = list(self.plugin._tasks(self._suite(
+            self._suite(Test('test_a'), Other('test_c')),
+            self._suite(Test('test_b')))))
+        self.assertEqual([t.countTestCases() for t in tasks], [3])
+
+    def test_runs_tests_in_threads(self):
+        names = set()
+
+        class Test(unittest.TestCase):
+            def test_a(self):
+                names.add(threading.current_thread().name)
+
+            def test_b(self):
+                names.add(threading.current_thread().name)
+
+            def test_c(self):
+                self.fail('c')
+        self.plugin.threads = 2
+        self.plugin._runThreaded(
+            self._suite(Test('test_a'), Test('test_b'), Test('test_c')),
+            self.result)
+        self.assertEqual(len(self.watcher.events), 3)
+        self.assertEqual(
+            sorted(e.outcome for e in self.watcher.events),
+            ['failed', 'passed', 'passed'])
+        for name in names:
+            assert name.startswith('nose2-test-'), name
+
+    def test_fires_thread_pool_hooks(self):
+        class Hooks(events.Plugin):
+            def __init__(self):
+                self.called = []
+
+            def startThreadPool(self, event):
+                self.called.append(('start', event.threads))
+
+            def stopThreadPool(self, event):
+                self.called.append(('stop', event.threads))
+        hooks = Hooks(session=self.session)
+        hooks.register()
+
+        class Test(unittest.TestCase):
+            def test_a(self):
+                pass
+        self.plugin.threads = 8
+        self.plugin._runThreaded(self._suite(Test('test_a')), self.result)
+        self.assertEqual(hooks.called, [('start', 1), ('stop', 1)])
+
+    def test_class_fixture_state_is_kept_per_task(self):
+        calls = []
+
+        class Test(unittest.TestCase):
+            @classmethod
+            def setUpClass(cls):
+                calls.append('setUpClass')
+
+            @classmethod
+            def tearDownClass(cls):
+                calls.append('tearDownClass')
+
+            def test_a(self):
+                calls.append('a')
+
+            def test_b(self):
+                calls.append('b')
+        self.plugin._runThreaded(
+            self._suite(Test('test_a'), Test('test_b')), self.result)
+        self.assertEqual(calls, ['setUpClass', 'a', 'b', 'tearDownClass'])
+
+    def test_holds_report_output_until_test_stops(self):
+        stream = util._WritelnDecorator(six.StringIO())
+        self.plugin._local.report = util._WritelnDecorator(six.StringIO())
+        self.plugin._local.stream = None
+        event = events.ReportTestEvent(events.Event(), stream)
+        self.plugin.reportStartTest(event)
+        event.stream.write('test_a ... ')
+        self.plugin.reportSuccess(event)
+        event.stream.writeln('ok')
+        self.assertEqual(stream.getvalue(), '')
+        self.plugin.stopTest(events.StopTestEvent(None, None, None))
+        self.assertEqual(stream.getvalue(), 'test_a ... ok\n')
+
+    def test_report_output_outside_test_threads_is_not_held(self):
+        stream = util._WritelnDecorator(six.StringIO())
+        event = events.ReportTestEvent(events.Event(), stream)
+        self.plugin.reportSuccess(event)
+        assert event.stream is stream
+
+
+class TestCaptureInThreads(TestCase):
+    tags = ['unit']
+
+    def setUp(self):
+        self.session = session.Session()
+        self.result = result.PluggableTestResult(self.session)
+        self.watcher = Watcher(session=self.session)
+        self.watcher.register()
+        self.event = ThreadPoolEvent(2)
+        barrier = threading.Event()
+        self.log = logging.getLogger('nose2.tests.threads')
+
+        class Test(unittest.TestCase):
+            def test_a(self):
+                sys.stdout.write('out a')
+                Test.log.debug('log a')
+                barrier.wait(5)
+                self.fail('a')
+
+            def test_b(self):
+                sys.stdout.write('out b')
+                Test.log.debug('log b')
+                barrier.set()
+                self.fail('b')
+        Test.log = self.log
+        self.case = Test
+
+    def _run(self, *names):
+        threads = [threading.Thread(target=self.case(name), args=(self.result,))
+                   for name in names]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return dict((e.test._testMethodName, e) for e in self.watcher.events)
+
+    def _detail(self, event):
+        evt = events.OutcomeDetailEvent(event)
+        self.session.hooks.outcomeDetail(evt)
+        return ''.join(evt.extraDetail)
+
+    def test_buffer_keeps_output_per_thread(self):
+        plugin = buffer.OutputBufferPlugin(session=self.session)
+        plugin.register()
+        out = sys.stdout
+        plugin.startThreadPool(self.event)
+        try:
+            outcomes = self._run('test_a', 'test_b')
+        finally:
+            plugin.stopThreadPool(self.event)
+        assert sys.stdout is out
+        stdout = outcomes['test_a'].metadata['stdout']
+        assert 'out a' in stdout, stdout
+        assert 'out b' not in stdout, stdout
+        stdout = outcomes['test_b'].metadata['stdout']
+        assert 'out b' in stdout, stdout
+        assert 'out a' not in stdout, stdout
+
+    def test_logcapture_keeps_records_per_thread(self):
+        plugin = logcapture.LogCapture(session=self.session)
+        plugin.register()
+        plugin.startThreadPool(self.event)
+        plugin.startTestRun(None)
+        try:
+            outcomes = self._run('test_a', 'test_b')
+        finally:
+            plugin.stopThreadPool(self.event)
+        detail = self._detail(outcomes['test_a'])
+        assert 'log a' in detail, detail
+        assert 'log b' not in detail, detail
+        detail = self._detail(outcomes['test_b'])
+        assert 'log b' in detail, detail
+        assert 'log a' not in detail, detail
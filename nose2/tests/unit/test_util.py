@@ -14,3 +14,20 @@ class UtilTests(TestCase):
         self.assertNotIn(test_dir, sys.path)
         util.ensure_importable(test_dir)
         self.assertEqual(test_dir, sys.path[0])
+
+    def test_timings_round_trip(self):
+        path = os.path.join(self._work_dir, 'timings')
+        util.save_timings(path, {'a.test_a': 1.5})
+        self.assertEqual(util.load_timings(path), {'a.test_a': 1.5})
+
+    def test_timings_replace_the_file_whole(self):
+        path = os.path.join(self._work_dir, 'timings')
+        with open(path, 'w') as fh:
+            fh.write('x' * 1000)
+        util.save_timings(path, {'a.test_a': 1.5})
+        self.assertEqual(util.load_timings(path), {'a.test_a': 1.5})
+        self.assertEqual(os.listdir(self._work_dir), ['timings'])
+
+    def test_missing_timing_file_is_empty(self):
+        self.assertEqual(
+            util.load_timings(os.path.join(self._work_dir, 'nope')), {})
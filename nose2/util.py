@@ -4,12 +4,15 @@
 # unittest2 is Copyright (c) 2001-2010 Python Software Foundation; All
 # Rights Reserved. See: http://docs.python.org/license.html
 
+import json
 import logging
 import os
 import types
 import re
 import sys
+import tempfile
 import traceback
+import unittest
 import platform
 import six
 import inspect
@@ -225,13 +228,26 @@ def isgenerator(obj):
             or getattr(obj, 'testGenerator', None) is not None)
 
 
+def iscoroutinefunction(obj):
+    """Is this object a coroutine function (``async def``)?"""
+    check = getattr(inspect, 'iscoroutinefunction', None)  # new in 3.5
+    return check is not None and check(obj)
+
+
+def runs_coroutines(cls):
+    """Does this test case class run its own coroutine test methods?"""
+    base = getattr(unittest, 'IsolatedAsyncioTestCase', None)  # new in 3.8
+    return base is not None and issubclass(cls, base)
+
+
 def has_module_fixtures(test):
     """Does this test live in a module with module fixtures?"""
     modname = test.__class__.__module__
     try:
         mod = sys.modules[modname]
     except KeyError:
-        return
+        # tests collected without importing their module say so themselves
+        return getattr(test, 'moduleFixtures', None)
     return hasattr(mod, 'setUpModule') or hasattr(mod, 'tearDownModule')
 
 
@@ -251,6 +267,21 @@ def has_class_fixtures(test):
     return has_class_setups or has_class_teardowns
 
 
+def fixture_group(test):
+    """The name of the module or class whose fixtures ``test`` shares
+
+    Returns ``None`` if the test is in neither a module with module
+    fixtures nor a class with class fixtures.
+
+    """
+    module = test.__class__.__module__
+    if has_module_fixtures(test):
+        return module
+    if has_class_fixtures(test):
+        return "%s.%s" % (module, test.__class__.__name__)
+    return None
+
+
 def safe_decode(string):
     """Safely decode a byte string into unicode"""
     if string is None:
@@ -330,6 +361,55 @@ def transplant_class(cls, module):
     return C
 
 
+def load_timings(path):
+    """Load recorded test durations from ``path``
+
+    Returns a dict mapping test ids (and fixture group names) to
+    durations in seconds. A missing or unreadable file results in
+    an empty dict.
+
+    """
+    try:
+        with open(path) as fh:
+            data = json.load(fh)
+    except (EnvironmentError, ValueError):
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return dict(data.get('durations', {}))
+
+
+def save_timings(path, durations):
+    """Write test durations to ``path`` in the format read by
+    :func:`load_timings`"""
+    save_json(path, {'version': 1, 'durations': durations},
+              indent=1, sort_keys=True)
+
+
+def save_json(path, data, indent=None, sort_keys=False):
+    """Write ``data`` to ``path`` as JSON, creating its directory if needed.
+
+    The file is written under another name and then renamed, so a reader
+    never sees it half-written. Raises :exc:`EnvironmentError` if it cannot
+    be written. ``indent`` and ``sort_keys`` are passed to
+    :func:`json.dump`.
+
+    """
+    dirname = os.path.dirname(path)
+    if dirname and not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    fd, tmp = tempfile.mkstemp(dir=dirname or None)
+    try:
+        with os.fdopen(fd, 'w') as fh:
+            json.dump(data, fh, indent=indent, sort_keys=sort_keys)
+        if os.path.exists(path) and sys.platform == 'win32':
+            os.remove(path)
+        os.rename(tmp, path)
+    except EnvironmentError:
+        os.remove(tmp)
+        raise
+
+
 def parse_log_level(lvl):
     """Return numeric log level given a string"""
     try:
@@ -8,7 +8,7 @@ VERSION = open('nose2/_version.py').readlines()[-1].split()[-1].strip('"\'')
 PACKAGES = ['nose2', 'nose2.plugins', 'nose2.plugins.loader',
             'nose2.tests', 'nose2.tests.functional', 'nose2.tests.unit',
             'nose2.tools']
-SCRIPTS = ['bin/nose2']
+SCRIPTS = ['bin/nose2', 'bin/nose2-worker']
 DESCRIPTION = 'nose2 is the next generation of nicer testing for Python'
 URL = 'https://github.com/nose-devs/nose2'
 LONG_DESCRIPTION = open(
@@ -89,6 +89,7 @@ else:
         'console_scripts': [
             '%s = nose2:discover' % SCRIPT1,
             '%s = nose2:discover' % SCRIPT2,
+            'nose2-worker = nose2.plugins.mp:worker',
         ],
     }
     params['install_requires'] = parse_requirements('requirements.txt')